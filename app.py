@@ -1,67 +1,249 @@
 import os
+import atexit
 import json
 import git
 import sys
 import re
-from flask import Flask, jsonify, render_template, url_for, flash, redirect, request, session, g, request
+from flask import Flask, jsonify, render_template, url_for, flash, redirect, request, g, has_app_context, request
+from flask import session as request_session
+from werkzeug.local import LocalProxy
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_behind_proxy import FlaskBehindProxy
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy.exc import SQLAlchemyError
 from flask_login import LoginManager, login_user, logout_user, current_user, login_required
 from forms import RegistrationForm, LoginForm
 from functools import wraps
 import socketio
 from dotenv import load_dotenv
-from openai import OpenAI
 import openai
 from email.message import EmailMessage
-from db import db, Users, Events, Meets, Emails, History, ChatResponse
+from db import db, Users, Events, Meets, Emails, History, ChatResponse, format_datetime
+from database import database_url, engine_options, install_sqlite_pragmas, upgrade_schema
+from classifier import IntentClassifier
+from jobs import JobQueue
+from gevent import get_hub
+from google_clients import GoogleClientCache
+from token_refresher import TokenRefresher, expires_within, refresh_token_json
+from search import install_search_index, search_candidates
+from resolver import resolve_candidate
+from calendar_batch import MAX_BATCH_SIZE, execute_batch, is_bulk_prompt, reconcile, resolve_operation_times
+from calendar_sync import sync_calendar
+from gmail_drafts import draft_link, sync_drafts, execute_batch as execute_draft_batch, reconcile as reconcile_drafts
+from prompt_cache import cache_key, make_prompt_cache
+from json_stream import JSONFieldStream
+from llm_gateway import LLMGateway
+from history_writer import HistoryBuffer, HistoryWriter, write_buffers
+from dashboard import DashboardCache, dashboard_data, dashboard_version, track_versions, watch_changes
+from socket_queue import make_client_manager
+from reply_channel import ReplyChannel
+from google_identity import fetch_identity, identity_stale, sender_address
+from prompts import PromptTemplate
+from schemas import PAYLOAD_SCHEMAS, EmailPayload, EventPayload, MeetingPayload, merge_repair, repair_messages, \
+    strict_schema, validate_payload
+from dates import overlay_when, parse_change, parse_when, simple_title
+from relative_time import END_SPEC, START_SPEC, TIME_INSTRUCTIONS, resolve_times, to_spec
 import logging
+import time
 
 # Google Imports
 import datetime
 from datetime import datetime, timedelta
 from tzlocal import get_localzone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import uuid
 import base64
 import os.path
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from google.apps import meet_v2
 
+
+
+def current_session():
+    # Prompt jobs run in an app context with their copy of the socket session in g
+    return g.session if has_app_context() and 'session' in g else request_session
+
+
+session = LocalProxy(current_session)
+
 # Flask App setup
 app = Flask(__name__)
+load_dotenv()
+# Message queue for Socket.IO (redis://...), so an emit from any worker reaches
+# clients connected to the others. Unset for a single process. Redis' listener
+# blocks unless gevent is monkey patched, which gunicorn's gevent workers do.
+app.config['SOCKETIO_MESSAGE_QUEUE'] = os.getenv('SOCKETIO_MESSAGE_QUEUE')
 socketio = SocketIO(app,
                     logger=True,
                     engineio_logger=True,
-                    cors_allowed_origins="*"
+                    cors_allowed_origins="*",
+                    client_manager=make_client_manager(app.config['SOCKETIO_MESSAGE_QUEUE'])
                     )
-load_dotenv()
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 proxied = FlaskBehindProxy(app)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'default_secret_key')
 
-# Database setup
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///plan-it.db'
+# Local intent classifier setup (LLM is only asked below this confidence)
+app.config['INTENT_CONFIDENCE_THRESHOLD'] = float(os.getenv('INTENT_CONFIDENCE_THRESHOLD', 0.8))
+app.config['INTENT_TRAINING_ROWS'] = int(os.getenv('INTENT_TRAINING_ROWS', 500))
+app.config['INTENT_RETRAIN_EVERY'] = int(os.getenv('INTENT_RETRAIN_EVERY', 25))
+# Number of prompts processed concurrently across all users
+app.config['PROMPT_WORKERS'] = int(os.getenv('PROMPT_WORKERS', 4))
+# Background OAuth token refresh (seconds)
+app.config['TOKEN_REFRESH_ENABLED'] = os.getenv('TOKEN_REFRESH_ENABLED', 'true').lower() == 'true'
+app.config['TOKEN_REFRESH_WINDOW'] = int(os.getenv('TOKEN_REFRESH_WINDOW', 300))
+app.config['TOKEN_REFRESH_INTERVAL'] = int(os.getenv('TOKEN_REFRESH_INTERVAL', 60))
+app.config['TOKEN_REFRESH_CONCURRENCY'] = int(os.getenv('TOKEN_REFRESH_CONCURRENCY', 4))
+# Run the token refresher and Google sync loops in this process. Turn off on the web
+# workers when more than one runs, and run them once with `python worker.py`
+app.config['BACKGROUND_TASKS'] = os.getenv('BACKGROUND_TASKS', 'true').lower() == 'true'
+# Overrides Google's OAuth token endpoint, e.g. with a local fake
+app.config['TOKEN_URI'] = os.getenv('TOKEN_URI')
+# Classify and fill create payloads in a single LLM call when the local classifier misses
+app.config['COMBINED_CREATE_MODE'] = os.getenv('COMBINED_CREATE_MODE', 'true').lower() == 'true'
+# Keep Events/Meets mirrored from Google Calendar with incremental syncs (seconds)
+app.config['CALENDAR_SYNC_ENABLED'] = os.getenv('CALENDAR_SYNC_ENABLED', 'true').lower() == 'true'
+app.config['CALENDAR_SYNC_INTERVAL'] = int(os.getenv('CALENDAR_SYNC_INTERVAL', 900))
+# Mirror each user's Gmail drafts into Emails on the same interval
+app.config['DRAFT_SYNC_ENABLED'] = os.getenv('DRAFT_SYNC_ENABLED', 'true').lower() == 'true'
+# Structured LLM responses cached by normalized prompt, in process or shared through Redis
+app.config['PROMPT_CACHE_SIZE'] = int(os.getenv('PROMPT_CACHE_SIZE', 1024))
+app.config['PROMPT_CACHE_TTL'] = int(os.getenv('PROMPT_CACHE_TTL', 86400))
+app.config['PROMPT_CACHE_REDIS_URL'] = os.getenv('PROMPT_CACHE_REDIS_URL')
+# Push drafts to the client token by token instead of waiting for the full response
+app.config['STREAM_RESPONSES'] = os.getenv('STREAM_RESPONSES', 'true').lower() == 'true'
+# Send the payload schemas as strict json_schema response formats, needs a model with structured outputs
+# (gpt-4o-mini and later). Answers are validated and repaired locally either way.
+app.config['STRUCTURED_OUTPUTS'] = os.getenv('STRUCTURED_OUTPUTS', 'false').lower() == 'true'
+# Tokens of per-call context (current event, candidates) allowed after each static prompt prefix
+app.config['PROMPT_CONTEXT_BUDGET'] = int(os.getenv('PROMPT_CONTEXT_BUDGET', 1000))
+# LLM gateway: concurrent calls overall and per user, timeout (seconds) and retries on 429/5xx
+app.config['LLM_MAX_CONCURRENCY'] = int(os.getenv('LLM_MAX_CONCURRENCY', 16))
+app.config['LLM_USER_CONCURRENCY'] = int(os.getenv('LLM_USER_CONCURRENCY', 2))
+app.config['LLM_TIMEOUT'] = float(os.getenv('LLM_TIMEOUT', 30))
+app.config['LLM_MAX_RETRIES'] = int(os.getenv('LLM_MAX_RETRIES', 3))
+app.config['LLM_HTTP2'] = os.getenv('LLM_HTTP2', 'true').lower() == 'true'
+# Chat history is written once per prompt, or batched across prompts every interval (seconds)
+app.config['HISTORY_WRITE_BEHIND'] = os.getenv('HISTORY_WRITE_BEHIND', 'false').lower() == 'true'
+app.config['HISTORY_FLUSH_INTERVAL'] = float(os.getenv('HISTORY_FLUSH_INTERVAL', 1.0))
+# Histories per /chat-history page, and the most a client may ask for
+app.config['CHAT_HISTORY_PAGE_SIZE'] = int(os.getenv('CHAT_HISTORY_PAGE_SIZE', 20))
+app.config['CHAT_HISTORY_MAX_PAGE_SIZE'] = int(os.getenv('CHAT_HISTORY_MAX_PAGE_SIZE', 100))
+# Seconds a user's dashboard stays cached when nothing of theirs changes
+app.config['DASHBOARD_CACHE_TTL'] = int(os.getenv('DASHBOARD_CACHE_TTL', 60))
+
+# Database setup, SQLite file by default or any SQLAlchemy URL in DATABASE_URL
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url(os.getenv('DATABASE_URL'))
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 app.config["SQLALCHEMY_ECHO"] = False
-migrate = Migrate(app, db)
+# Milliseconds a SQLite writer waits for the lock, and how often it fsyncs
+app.config['SQLITE_BUSY_TIMEOUT'] = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))
+app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+    app.config['SQLALCHEMY_DATABASE_URI'],
+    pool_size=int(os.getenv('DB_POOL_SIZE', 5)),
+    max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 10)),
+    pool_recycle=int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', 30)),
+    busy_timeout=app.config['SQLITE_BUSY_TIMEOUT'],
+)
+# Migrate and install the search index on startup, turn off to run `flask --app app init-db`
+# once as a release step instead, e.g. with several workers
+app.config['AUTO_MIGRATE'] = os.getenv('AUTO_MIGRATE', 'true').lower() == 'true'
+MIGRATIONS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+migrate = Migrate(app, db, directory=MIGRATIONS_DIRECTORY, render_as_batch=True)
 db.init_app(app)
+
+
+def init_database():
+    upgrade_schema(db, MIGRATIONS_DIRECTORY)
+    install_search_index(db.engine)
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Runs pending migrations and installs the search index."""
+    init_database()
+
+
 with app.app_context():
-    db.create_all()
+    # WAL, busy_timeout and synchronous=NORMAL for SQLite, before anything connects
+    install_sqlite_pragmas(db.engine,
+                           busy_timeout=app.config['SQLITE_BUSY_TIMEOUT'],
+                           synchronous=app.config['SQLITE_SYNCHRONOUS'])
+    if app.config['AUTO_MIGRATE']:
+        init_database()
+
+intent_classifier = IntentClassifier(threshold=app.config['INTENT_CONFIDENCE_THRESHOLD'])
+prompt_cache = make_prompt_cache(app.config['PROMPT_CACHE_REDIS_URL'], maxsize=app.config['PROMPT_CACHE_SIZE'],
+                                 ttl=app.config['PROMPT_CACHE_TTL'])
+dashboard_cache = DashboardCache(ttl=app.config['DASHBOARD_CACHE_TTL'])
+
+
+def user_room(user_id):
+    # Every socket of a logged in user joins this, e.g. open dashboards
+    return f"user:{user_id}"
+
+
+def publish_dashboard_changes(changes):
+    """
+    Drops the cached dashboards of the users whose events, meets or drafts
+    just changed and pushes the diffs to their open pages.
+    """
+    dashboard_cache.invalidate(changes)
+    for user_id, diffs in changes.items():
+        socketio.emit('dashboard-diff', diffs, to=user_room(user_id))
+
+
+watch_changes(db.session, publish_dashboard_changes)
+track_versions(db.session)
+
+
+def training_prompts():
+    with app.app_context():
+        rows = History.query.with_entities(History.user_prompt) \
+            .order_by(History.id.desc()).limit(app.config['INTENT_TRAINING_ROWS']).all()
+        return {row.user_prompt for row in rows}
+
+
+def train_intent_classifier(prompts):
+    try:
+        count = intent_classifier.fit(prompts)
+        app.logger.debug(f'Intent classifier trained on {count} examples')
+    except Exception as e:
+        print(f"Intent classifier training failed: {e}", file=sys.stderr)
+
+
+def run_in_thread(fn, *args):
+    """
+    Runs CPU-bound work in an OS thread. Under gevent a background task is a
+    greenlet that doesn't yield while it computes, stalling every socket of
+    the worker, a thread only shares the interpreter with it.
+    """
+    if socketio.async_mode == 'gevent':
+        return get_hub().threadpool.spawn(fn, *args)
+    return socketio.start_background_task(fn, *args)
 
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-# ChatGPT API Setup
-client = OpenAI(
-    api_key=OPENAI_API_KEY,
-)
+# ChatGPT API Setup, every LLM call goes through this one pooled client
+llm = LLMGateway(api_key=OPENAI_API_KEY,
+                 max_concurrency=app.config['LLM_MAX_CONCURRENCY'],
+                 user_concurrency=app.config['LLM_USER_CONCURRENCY'],
+                 timeout=app.config['LLM_TIMEOUT'],
+                 max_retries=app.config['LLM_MAX_RETRIES'],
+                 http2=app.config['LLM_HTTP2'],
+                 create_queue=socketio.server.eio.create_queue,
+                 sleep=socketio.sleep)
+
+# Built Google API clients and credentials, shared across requests
+google_clients = GoogleClientCache(maxsize=int(os.getenv('GOOGLE_CLIENT_CACHE_SIZE', 256)))
 
 SCOPES = [
     'https://www.googleapis.com/auth/calendar',
@@ -139,11 +321,24 @@ def logout():
 @app.route('/chat-history', methods=['GET'])
 @login_required
 def get_chat_history():
+    """
+    One page of chat history, newest first. Pass the returned
+    next_before_id as before_id to get the page before it; it is null
+    once there is nothing older.
+    """
     user_id = session.get('user_id')
     if user_id:
-        history = History.query.filter_by(user_id=user_id).order_by(History.id.desc()).limit(20).all()
-        serialized_history = [h.serialize() for h in history]
-        return jsonify(serialized_history)
+        limit = request.args.get('limit', app.config['CHAT_HISTORY_PAGE_SIZE'], type=int)
+        limit = max(1, min(limit, app.config['CHAT_HISTORY_MAX_PAGE_SIZE']))
+        before_id = request.args.get('before_id', type=int)
+        # One extra row tells us whether there is another page
+        history = History.page(user_id, before_id, limit + 1)
+        has_more = len(history) > limit
+        history = history[:limit]
+        return jsonify({
+            "history": [h.serialize() for h in history],
+            "next_before_id": history[-1].id if has_more else None,
+        })
     else:
         return jsonify({"error": "User not authenticated"})
     
@@ -163,6 +358,25 @@ def clear_history():
     else:
         return jsonify({"error": "User not authenticated"})
 
+@app.route('/intent-stats', methods=['GET'])
+@login_required
+def get_intent_stats():
+    report = intent_classifier.report()
+    report['prompt_cache'] = prompt_cache.stats
+    report['llm'] = llm.stats()
+    report['dashboard_cache'] = dashboard_cache.stats
+    return jsonify(report)
+
+
+@app.route('/sync', methods=['POST'])
+@login_required
+def sync():
+    user_id = session['user_id']
+    full = request.args.get('full', 'false').lower() == 'true'
+    job = prompt_jobs.submit(user_id, sync_user, user_id, full)
+    return jsonify(job.serialize()), 202
+
+
 @app.route('/')
 @app.route('/home')
 def home():
@@ -177,17 +391,48 @@ def chat():
     return render_template('chat.html')
 
 
+def cached_dashboard(user_id):
+    """
+    (etag, body) of the user's dashboard, built on a cache miss.
+    """
+    # Read first, a commit while the dashboard is built then only costs a rebuild
+    version = dashboard_version(user_id)
+    entry = dashboard_cache.get(user_id, version)
+    if entry is None:
+        entry = dashboard_cache.set(user_id, dashboard_data(user_id), version)
+    return entry
+
+
 @app.route('/dashboard')
 @login_required
 def dashboard():
     try:
-        events_list = Events.query.filter_by(user_id=session['user_id']).order_by(Events.start).limit(10).all()
-        meets_list = Meets.query.filter_by(user_id=session['user_id']).order_by(Meets.start).limit(10).all()
-        emails_list = Emails.query.filter_by(user_id=session['user_id']).limit(10).all()
-        return render_template('dashboard.html', events=events_list, meets=meets_list, emails=emails_list)
-    except Exception as e:
-        # Exception as the exception makes debugging really difficult. Avoid using them plz
+        etag, body = cached_dashboard(session['user_id'])
+    except SQLAlchemyError as e:
         print(f"Error fetching data from database: {e}", file=sys.stderr)
+        flash('Could not load your dashboard, please try again.', 'danger')
+        return render_template('dashboard.html', events=[], meets=[], emails=[], data=None, etag='')
+    data = json.loads(body)
+    return render_template('dashboard.html', events=data['events'], meets=data['meets'], emails=data['drafts'],
+                           data=data, etag=etag)
+
+
+@app.route('/api/dashboard', methods=['GET'])
+@login_required
+def dashboard_api():
+    """
+    Upcoming events, meets and drafts in one response. Send the ETag back
+    in If-None-Match to get a 304 while nothing has changed.
+    """
+    try:
+        etag, body = cached_dashboard(session['user_id'])
+    except SQLAlchemyError as e:
+        print(f"Error fetching data from database: {e}", file=sys.stderr)
+        return jsonify({"error": "Could not load dashboard"}), 500
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 
 @app.route('/voice')
@@ -196,29 +441,86 @@ def voice():
 
 
 #history stuff dont change:
+def write_history(buffers):
+    with app.app_context():
+        write_buffers(db.session, buffers)
+
+
+history_writer = HistoryWriter(write_history,
+                               write_behind=app.config['HISTORY_WRITE_BEHIND'],
+                               interval=app.config['HISTORY_FLUSH_INTERVAL'],
+                               create_queue=socketio.server.eio.create_queue,
+                               start_task=socketio.start_background_task)
+# Don't lose queued history on shutdown
+atexit.register(history_writer.flush)
+
+
 def create_history_entry(user_id, user_prompt):
-    history_entry = History(user_id=user_id, user_prompt=user_prompt)
-    db.session.add(history_entry)
-    db.session.commit()
-    session['history_id'] = history_entry.id
-    return history_entry.id
+    # Buffered on the prompt job, written when the prompt is done
+    g.history = HistoryBuffer(user_id, user_prompt)
+    return g.history
+
+def add_chat_response_to_history(response):
+    history = g.get('history')
+    if history is not None:
+        history.add(response)
+        return
 
-def add_chat_response_to_history(history_id, response):
-    history_entry = History.query.get(history_id)
+    # Outside a prompt job (e.g. email approval), attach to the user's latest prompt.
+    # Its buffer was handed to the writer when the job ended, wait until it is written
+    history_writer.flush()
+    history_entry = History.query.filter_by(user_id=session.get('user_id')).order_by(History.id.desc()).first()
     if history_entry:
         history_entry.add_chat_response(history_entry.user_id, response)
         db.session.commit()
     else:
-        print(f"No history entry found with id {history_id}")
+        print(f"No history entry found for user {session.get('user_id')}", file=sys.stderr)
 
 @socketio.on('connect')
-def handle_new_connection():
+def handle_new_connection(auth=None):
     print('Client connected.')
     session['socket_id'] = request.sid
     join_room(session['socket_id'])
+    if session.get('user_id'):
+        join_room(user_room(session['user_id']))
+    # The browser reports its zone, prompts like "tomorrow at 9" are read in it
+    time_zone = (auth or {}).get('timeZone')
+    if valid_time_zone(time_zone):
+        session['time_zone'] = time_zone
+        if session.get('user_id'):
+            store_time_zone(session['user_id'], time_zone)
     emit('status', {'msg': 'Connected to server'})
 
 
+def valid_time_zone(name) -> bool:
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        return False
+
+
+def store_time_zone(user_id, time_zone):
+    user = db.session.get(Users, user_id)
+    if user and user.time_zone != time_zone:
+        user.time_zone = time_zone
+        db.session.commit()
+
+
+def user_time_zone() -> str:
+    """
+    The zone the user's prompts are read in: the connected browser's, the
+    last one stored for the user, then the server's.
+    """
+    if 'time_zone' not in g:
+        time_zone = session.get('time_zone')
+        if not time_zone and session.get('user_id'):
+            user = db.session.get(Users, session['user_id'])
+            time_zone = user.time_zone if user else None
+        g.time_zone = time_zone or str(get_localzone())
+    return g.time_zone
+
+
 @socketio.on('disconnect')
 def handle_disconnect():
     print('Client disconnected')
@@ -239,8 +541,50 @@ def get_user_token(uid):
 def save_user_token(uid, creds):
     user = Users.query.filter_by(id=uid).first()
     if user:
-        user.token = creds.to_json()
+        token = creds.to_json()
+        stale = identity_stale(user, token)
+        user.token = token
         db.session.commit()
+        # Drop services built from the old token
+        google_clients.store_credentials(uid, creds)
+        # A new grant may be for another Google account, plain refreshes keep it
+        if stale:
+            store_google_identity(user, creds)
+
+
+# Fetch the Google account's address and name once and keep them on the user
+def store_google_identity(user, creds):
+    try:
+        identity = fetch_identity(google_clients.service(user.id, "gmail", "v1", creds))
+    except Exception as e:
+        print(f"Failed to fetch Google account identity: {e}", file=sys.stderr)
+        return None
+    user.google_email = identity['email']
+    user.google_name = identity['name']
+    db.session.commit()
+    return identity
+
+
+# Get the user's credentials, refreshed if expired. None if they never linked Google
+def get_user_credentials(user_id):
+    # Reuse the parsed credentials across prompts, only hit the db on a miss or when
+    # they are about to expire, the refresher in another process may have a new token
+    creds = google_clients.get_credentials(user_id)
+    if creds is None or expires_within(creds, app.config['TOKEN_REFRESH_WINDOW']):
+        stored = get_user_token(user_id)
+        if stored and (creds is None or stored.token != creds.token):
+            creds = stored
+            google_clients.store_credentials(user_id, creds)
+
+    if creds and not creds.valid and creds.expired and creds.refresh_token:
+        try:
+            creds.refresh(Request())
+            save_user_token(user_id, creds)
+        except Exception as e:
+            print(f"Failed to refresh credentials: {e}")
+            raise
+
+    return creds
 
 
 def get_google_service():
@@ -248,36 +592,102 @@ def get_google_service():
     if not user_id:
         raise ValueError("User ID is not set in the session.")
 
-    creds = get_user_token(user_id)
+    creds = get_user_credentials(user_id)
 
     if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-
-                creds.refresh(Request())
-                save_user_token(user_id, creds)
-            except Exception as e:
-                print(f"Failed to refresh credentials: {e}")
-                raise
-        else:
-            try:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    "credentials.json", SCOPES
-                )
-                creds = flow.run_local_server(port=8080)
-                save_user_token(user_id, creds)
-            except Exception as e:
-                print(f"Failed to create new credentials: {e}")
-                raise
+        try:
+            flow = InstalledAppFlow.from_client_secrets_file(
+                "credentials.json", SCOPES
+            )
+            creds = flow.run_local_server(port=8080)
+            save_user_token(user_id, creds)
+        except Exception as e:
+            print(f"Failed to create new credentials: {e}")
+            raise
 
     return creds
 
 
+def load_stored_tokens():
+    with app.app_context():
+        return Users.query.with_entities(Users.id, Users.token).filter(Users.token.isnot(None)).all()
+
+
+def refresh_stored_token(uid):
+    with app.app_context():
+        user = Users.query.filter_by(id=uid).first()
+        if user and user.token:
+            save_user_token(uid, refresh_token_json(user.token, app.config['TOKEN_URI']))
+
+
+# Refresh tokens in the background shortly before they expire
+token_refresher = TokenRefresher(
+    load_tokens=load_stored_tokens,
+    refresh_user=refresh_stored_token,
+    queue=JobQueue(workers=app.config['TOKEN_REFRESH_CONCURRENCY'],
+                   start_task=socketio.start_background_task,
+                   create_queue=socketio.server.eio.create_queue),
+    window=app.config['TOKEN_REFRESH_WINDOW'],
+    interval=app.config['TOKEN_REFRESH_INTERVAL'],
+    sleep=socketio.sleep
+)
+
+
+# Mirror each user's calendar into Events/Meets, full once then incremental
+def sync_user_calendar(uid, full=False):
+    with app.app_context():
+        creds = get_user_credentials(uid)
+        if not creds or not creds.valid:
+            print(f"No valid Google credentials to sync user {uid}", file=sys.stderr)
+            return None
+        service = google_clients.service(uid, "calendar", "v3", creds)
+        user = db.session.get(Users, uid)
+        time_zone = (user.time_zone if user else None) or str(get_localzone())
+        return sync_calendar(db.session, service, uid, full=full, time_zone=time_zone)
+
+
+# Mirror each user's Drafts folder into Emails, full once then from the mailbox history
+def sync_user_drafts(uid, full=False):
+    with app.app_context():
+        creds = get_user_credentials(uid)
+        if not creds or not creds.valid:
+            print(f"No valid Google credentials to sync user {uid}", file=sys.stderr)
+            return None
+        service = google_clients.service(uid, "gmail", "v1", creds)
+        return sync_drafts(db.session, service, uid, full=full)
+
+
+def sync_user(uid, full=False):
+    return {"calendar": sync_user_calendar(uid, full), "drafts": sync_user_drafts(uid, full)}
+
+
+def google_sync_loop():
+    while True:
+        socketio.sleep(app.config['CALENDAR_SYNC_INTERVAL'])
+        # Runs on the prompt queue so a sync never overlaps the same user's prompt
+        for uid, _ in load_stored_tokens():
+            if app.config['CALENDAR_SYNC_ENABLED']:
+                prompt_jobs.submit(uid, sync_user_calendar, uid)
+            if app.config['DRAFT_SYNC_ENABLED']:
+                prompt_jobs.submit(uid, sync_user_drafts, uid)
+
+
+def start_background_tasks():
+    if app.config['TOKEN_REFRESH_ENABLED']:
+        socketio.start_background_task(token_refresher.run)
+    if app.config['CALENDAR_SYNC_ENABLED'] or app.config['DRAFT_SYNC_ENABLED']:
+        socketio.start_background_task(google_sync_loop)
+
+
+if app.config['BACKGROUND_TASKS']:
+    start_background_tasks()
+
+
 def google_setup():
     if not hasattr(g, 'service'):
         try:
             creds = get_google_service()
-            g.service = build("calendar", "v3", credentials=creds)
+            g.service = google_clients.service(session['user_id'], "calendar", "v3", creds)
         except Exception as e:
             print(f"Failed to set up Google Calendar service: {e}")
 
@@ -286,40 +696,53 @@ def gmail_setup():
     if not hasattr(g, 'email'):
         try:
             creds = get_google_service()
-            g.email = build("gmail", "v1", credentials=creds)
+            g.email = google_clients.service(session['user_id'], "gmail", "v1", creds)
         except Exception as e:
             print(f"Failed to set up Gmail service: {e}")
 
 
-def determine_query_type(message: str):
+QUERY_TYPE_INSTRUCTIONS = """
+You are an assistant that determines if a message is related to either Google Calendar, Google Meet, or Gmail.
+Return a json response as {"event_type": , "mode": } where type is gcal, gmeet, or gmail.
+If the type is gcal or gmeet, the mode can be create, update, or remove. For email, the mode can be create or send.
+If the user is asking to "write" or "create" an email, the mode is create, not send.
+If you are not sure, return {"event_type": "unknown", "mode": "unknown"} exactly.
+""".strip()
+
+
+def format_system_instructions_for_query_and_payload() -> str:
+    # One request for both the classification and the create payload
+    return QUERY_AND_PAYLOAD_PROMPT.render(sender_name=sender_name())
+
+
+def determine_query_type(message: str, include_payload: bool = False):
     app.logger.debug('Determine query accessed')
 
+    # Each process trains its own model on its first prompt, the rules answer meanwhile
+    if intent_classifier.first_fit_due():
+        run_in_thread(train_intent_classifier, training_prompts())
+
+    # Local fast-path, only fall back to the LLM when not confident
+    local_result = intent_classifier.classify(message)
+    if local_result is not None:
+        return local_result
+
     result = {"event_type": "unknown", "mode": "unknown"}  # Default result
+    start = time.perf_counter()
+
+    if include_payload:
+        system_instructions = format_system_instructions_for_query_and_payload()
+    else:
+        system_instructions = QUERY_TYPE_INSTRUCTIONS
 
     try:
-        # Ideally we remove the creation part and make it global itf
-        client = OpenAI(api_key=OPENAI_API_KEY)
         # Make API request
-        completion = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system",
-                 "content": """You are an assistant that determines if a message is related to either Google Calendar,
-                             Google Meet, or Gmail. Return a json response as {'event_type': , 
-                             'mode': } where type is gcal, gmeet, or gmail. If the type is gcal or gmeet, the mode
-                             can be create, update, or remove. For email, the mode can be create or send. For email, 
-                             If the user is asking to "write" or "create" an email, the mode is create, not send.
-                             If you are not sure, return <{"event_type": "unknown", "mode": "unknown"}> without <>
-                             exactly.
-                             """},
-                {"role": "user", "content": f"The message is the following: {message}"}
-            ]
-        )
+        response_content = llm.chat([
+            {"role": "system", "content": system_instructions},
+            {"role": "user", "content": f"The message is the following: {message}"}
+        ], user_id=session.get('user_id'), label='query_type', json_mode=True)
 
-        # Check if choices are present and valid
-        if completion.choices and len(completion.choices) > 0:
-            response_content = completion.choices[0].message.content
+        if response_content:
             result = json.loads(response_content)
 
     except json.JSONDecodeError as e:
@@ -330,24 +753,60 @@ def determine_query_type(message: str):
     except Exception as e:
         print(f"Unexpected error: {e}", file=sys.stderr)
 
+    intent_classifier.record_fallback(message, result, time.perf_counter() - start)
+
+    # Only create flows can use the payload, drop it for everything else
+    payload = result.pop('payload', None)
+    if isinstance(payload, dict) and result.get('mode') == 'create':
+        # An invalid payload is dropped, the create flow then asks for it on its own
+        schema = PAYLOAD_SCHEMAS.get(result.get('event_type'))
+        payload, errors = validate_payload(schema, payload) if schema else (None, {})
+        if payload and not payload.get('error'):
+            result['payload'] = payload
+
+    if intent_classifier.retrain_due(app.config['INTENT_RETRAIN_EVERY']):
+        run_in_thread(train_intent_classifier, training_prompts())
+
     return result
 
 
-def gpt_format_json(system_instructions: str, input_string: str):
+def gpt_format_json(system_instructions: str, input_string: str, cache: bool = True, on_delta=None, schema=None):
+    """
+    on_delta(path, text) is called with what each string field gained
+    while the response streams in, when streaming is enabled. With a
+    schema (a schemas.Payload model) the answer is validated, and the
+    fields that fail are asked for again in one repair call.
+    """
     app.logger.debug('GPT format accessed')
+
+    # Instructions don't depend on the clock, so repeated prompts can skip the API
+    key = cache_key(system_instructions, input_string)
+    if cache:
+        cached = prompt_cache.get(key)
+        if cached is not None:
+            return cached
+
+    messages = [
+        {"role": "system",
+         "content": system_instructions},
+        {"role": "user", "content": f"String from user: {input_string}"}
+    ]
+    # Token usage and latency are tracked per intent, e.g. format_gcal_update
+    prompt_dict = session.get('prompt_dictionary') or {}
+    label = f"format_{prompt_dict['event_type']}_{prompt_dict['mode']}" if 'mode' in prompt_dict else 'format'
+    json_schema = strict_schema(schema) if schema is not None and app.config['STRUCTURED_OUTPUTS'] else None
     try:
         # Make API request
-        completion = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system",
-                 "content": system_instructions},
-                {"role": "user", "content": f"String from user: {input_string}"}
-            ]
-        )
-
-        response = completion.choices[0].message.content
+        if on_delta is not None and app.config['STREAM_RESPONSES']:
+            parser = JSONFieldStream()
+            for content in llm.stream(messages, user_id=session.get('user_id'), label=label, json_mode=True,
+                                      json_schema=json_schema):
+                for path, text in parser.feed(content).items():
+                    on_delta(path, text)
+            response = parser.text()
+        else:
+            response = llm.chat(messages, user_id=session.get('user_id'), label=label, json_mode=True,
+                                json_schema=json_schema)
 
         '''
         # Ensure the response is a JSON string
@@ -359,110 +818,185 @@ def gpt_format_json(system_instructions: str, input_string: str):
 
         '''
 
-        return json.loads(response)
+        if schema is None:
+            result = json.loads(response)
+        else:
+            result = validated_payload(schema, messages, response, label)
+        if cache and isinstance(result, dict) and not result.get('error'):
+            prompt_cache.set(key, result)
+        return result
     except Exception as e:
         print(f"Error processing message: {e}")
         return None
 
 
-def extract_keywords(prompt):
-    completion = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": """You are an assistant who can find a prompt's keywords which
-                                        will be used to query a database. Be generous with the amount of key words.
-                                        In your response, separate keywords with a comma."""},
-            {"role": "user", "content": f'This is the prompt: {prompt}'}
-        ]
-    )
-    response = completion.choices[0].message.content
-
-    keywords = [keyword.strip() for keyword in response.split(',')]
-    return keywords
+def validated_payload(schema, messages: list, response: str, label: str):
+    """
+    The validated answer, or None. Only the invalid fields are requested
+    again, once, instead of rerunning the whole prompt.
+    """
+    try:
+        result = json.loads(response)
+    except (TypeError, json.JSONDecodeError):
+        result = None
+    payload, errors = validate_payload(schema, result)
+    if not errors:
+        return payload
+
+    print(f"Invalid {label} fields {errors}, asking for a repair", file=sys.stderr)
+    repaired = json.loads(llm.chat(repair_messages(messages, response, errors), user_id=session.get('user_id'),
+                                   label=f"{label}_repair", json_mode=True))
+    payload, errors = validate_payload(schema, merge_repair(result, repaired, errors))
+    if errors:
+        print(f"Invalid {label} fields after repair {errors}", file=sys.stderr)
+    return payload
 
 
 def find_event_id(prompt, list):
-    completion = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": """You are an assistant who can determine a specific event based on a prompt. 
-                                        Return only the value of the event_id from the event list closest to the prompt whose title 
-                                        matches closest to the calendar event the prompt is trying to access. 
-                                        If none match return 'invalid'."""},
-            {"role": "user", "content": f'This is the prompt: {prompt}. This is the list: {list}'}
-        ]
-    )
-    event_id = completion.choices[0].message.content
+    event_id = llm.chat([
+        {"role": "system", "content": """You are an assistant who can determine a specific event based on a prompt. 
+                                    Return only the value of the event_id from the event list closest to the prompt whose title 
+                                    matches closest to the calendar event the prompt is trying to access. 
+                                    If none match return 'invalid'."""},
+        {"role": "user", "content": f'This is the prompt: {prompt}. This is the list: {list}'}
+    ], user_id=session.get('user_id'), label='find_event_id')
     return event_id
 
 
 def find_meeting_id(prompt, list):
-    completion = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": """You are an assistant who can determine a specific meeting based on a prompt. 
-                                        Return only the value of the meet_id from the meeting list whose title 
-                                        matches closest to the meeting the prompt is trying to access. If none match return 'invalid'."""},
-            {"role": "user", "content": f'This is the prompt: {prompt}. This is the list: {list}'}
-        ]
-    )
-    meeting_id = completion.choices[0].message.content
+    meeting_id = llm.chat([
+        {"role": "system", "content": """You are an assistant who can determine a specific meeting based on a prompt. 
+                                    Return only the value of the meet_id from the meeting list whose title 
+                                    matches closest to the meeting the prompt is trying to access. If none match return 'invalid'."""},
+        {"role": "user", "content": f'This is the prompt: {prompt}. This is the list: {list}'}
+    ], user_id=session.get('user_id'), label='find_meeting_id')
     return meeting_id
 
 
 def find_email_id(prompt, list):
-    completion = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": """You are an assistant who can determine a specific email based on a prompt. 
-                                        Return only the value of the email_id from the email list whose title 
-                                        matches closest to the email the prompt is trying to access.
-                                        If none match return 'invalid'."""},
-            {"role": "user", "content": f'This is the prompt: {prompt}. This is the list: {list}'}
-        ]
-    )
-    email_id = completion.choices[0].message.content
+    email_id = llm.chat([
+        {"role": "system", "content": """You are an assistant who can determine a specific email based on a prompt. 
+                                    Return only the value of the email_id from the email list whose title 
+                                    matches closest to the email the prompt is trying to access.
+                                    If none match return 'invalid'."""},
+        {"role": "user", "content": f'This is the prompt: {prompt}. This is the list: {list}'}
+    ], user_id=session.get('user_id'), label='find_email_id')
     return email_id
 
 
+def emit_job_status(job):
+    # Background jobs (e.g. syncs) have no socket to report to
+    if job.room:
+        socketio.emit('job-status', job.serialize(), to=job.room)
+
+
+prompt_jobs = JobQueue(workers=app.config['PROMPT_WORKERS'],
+                       start_task=socketio.start_background_task,
+                       create_queue=socketio.server.eio.create_queue,
+                       on_status=emit_job_status)
+
+
 # noinspection PyPackageRequirements
 @socketio.on('user_prompt')
 def handle_user_prompt(prompt):
     app.logger.debug('Handle user prompt accessed')
-    # add in prompt to dictionary directly
-    # saves time on the gpt call in determine_query_type
-    create_history_entry(session['user_id'], prompt)
-    prompt_dictionary = determine_query_type(prompt)
+
+    # Hand the pipeline to the worker pool so this handler returns right away,
+    # prompts from the same user still run one at a time in order
+    job = prompt_jobs.submit(session['user_id'], run_prompt_job, dict(session), prompt, request.sid,
+                             room=request.sid)
+    return {'job_id': job.id, 'status': job.status}
+
+
+def run_prompt_job(session_data, prompt, room=None):
+    # Workers run outside of the socket request: the handlers below read the
+    # copy of the socket session through session, and reply to room
+    with app.app_context():
+        g.session = dict(session_data)
+        g.room = room
+        create_history_entry(session['user_id'], prompt)
+        try:
+            return process_user_prompt(prompt)
+        finally:
+            history_writer.submit(g.history)
+
+
+def reply_channel():
+    """
+    The current request's ReplyChannel: the room of the socket the prompt
+    came from (g.room in prompt jobs, the connection's socket_id in socket
+    handlers).
+    """
+    if 'reply' not in g:
+        g.reply = ReplyChannel(socketio.emit, g.get('room') or session.get('socket_id'))
+    return g.reply
+
+
+def reply(event, data=None):
+    # Every handler answers through this, never with a broadcast
+    return reply_channel().send(event, data)
+
+
+def stream_to_client(event, stream_id, fields=None):
+    """
+    on_delta callback for gpt_format_json that forwards streamed fields
+    (all of them, or only those under fields) to the user's socket.
+    """
+    def on_delta(path, text):
+        if fields is None or path.split('.')[0] in fields:
+            reply(event, {'stream_id': stream_id, 'field': path, 'delta': text})
+            # Yield so the chunk goes out before we block on the next read
+            socketio.sleep(0)
+    return on_delta
+
+
+def process_user_prompt(prompt):
+    prompt_dictionary = determine_query_type(prompt, include_payload=app.config['COMBINED_CREATE_MODE'])
 
     print(prompt_dictionary)
 
-    if prompt_dictionary == {"event_type": "unknown", "mode": "unknown"}:
-        add_chat_response_to_history(session['history_id'], f'''To use Plan-it, specify a service, action, and the corresponding details. 
+    if prompt_dictionary.get('event_type', 'unknown') == 'unknown':
+        add_chat_response_to_history(f'''To use Plan-it, specify a service, action, and the corresponding details. 
                                     Ex: I want to create an appointment in my calendar for tomorrow at 9am. ''')
-        socketio.emit('receiver',
-                      {'message': 'To use Plan-it, specify a service, action, and the corresponding details. '
-                                  'Ex: I want to create an appointment in my calendar for tomorrow at 9am. '})
+        reply('receiver',
+              {'message': 'To use Plan-it, specify a service, action, and the corresponding details. '
+                          'Ex: I want to create an appointment in my calendar for tomorrow at 9am. '})
         return
 
     prompt_dictionary['prompt'] = prompt
 
-    # make the prompt_dictionary a session variable (global to the flask session)
-    session['prompt_dictionary'] = prompt_dictionary
-
     # determine the event type and mode
     event_type = prompt_dictionary['event_type'].lower()
     mode = prompt_dictionary['mode'].lower()
+
+    # "cancel all my standups" becomes one batch instead of one prompt per event
+    if event_type in ("gcal", "gmeet") and mode in ("update", "remove") and is_bulk_prompt(prompt):
+        mode = "bulk"
+        prompt_dictionary['mode'] = mode
+    # Same for "send all my drafts to the team"
+    if event_type == "gmail" and mode in ("send", "delete") and is_bulk_prompt(prompt):
+        prompt_dictionary['action'] = mode
+        mode = "bulk"
+        prompt_dictionary['mode'] = mode
     print(mode)
 
+    # make the prompt_dictionary a session variable (global to the flask session)
+    session['prompt_dictionary'] = prompt_dictionary
+
     # TRY eval(f"{event_type}_{mode}()")
     try:
-        google_setup()
-        gmail_setup()
+        # Only build the client this intent needs
+        if event_type == "gmail":
+            gmail_setup()
+        else:
+            google_setup()
 
         # Send success message to chat reciever-end
         print(f"Event Type: {event_type}, Mode: {mode}")
         user_mode = mode.capitalize()
-        if mode != "send":
+        if mode == "bulk":
+            user_mode = "Batch process"
+        elif mode != "send":
             user_mode = mode[:-1]
         if event_type == "gmeet":
             user_event = "Google Meeting"
@@ -472,8 +1006,8 @@ def handle_user_prompt(prompt):
             user_event = "Gmail draft"
 
 
-        add_chat_response_to_history(session['history_id'], f"Sure thing! {user_mode}ing your {user_event}...")
-        socketio.emit('receiver', {'message': f"Sure thing! Activating {mode} mode to process your {user_event} at light speed..."})
+        add_chat_response_to_history(f"Sure thing! {user_mode}ing your {user_event}...")
+        reply('receiver', {'message': f"Sure thing! Activating {mode} mode to process your {user_event} at light speed..."})
 
         success_message = eval(f"{event_type}_{mode}()")
 
@@ -482,10 +1016,10 @@ def handle_user_prompt(prompt):
     except Exception as e:
         failure_message = """Please try again. The program only works for GCal -> (Create, Update, and Remove),
               GMeet -> (Create, Update, or Remove), or Gmail -> (Create, Send, and Delete)"""
-        print("Exception thrown in handle_user_prompt at bottom try-catch",
+        print("Exception thrown in process_user_prompt at bottom try-catch",
               file=sys.stderr)
-        add_chat_response_to_history(session['history_id'], failure_message)
-        socketio.emit('receiver', {'message': failure_message})
+        add_chat_response_to_history(failure_message)
+        reply('receiver', {'message': failure_message})
         print(f"Error: {e}", file=sys.stderr)
         return failure_message
 
@@ -522,45 +1056,51 @@ def remove_event(service, event_id):
     ).execute()
 
 
-def format_system_instructions_for_event(query_type_dict: dict, content_dict: dict = None) -> str:
-    timeZone = get_localzone()
-    current_datetime = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
-
-    summary = content_dict.get('summary') if content_dict else '<summary_here>'
-    description = content_dict.get(
-        'description') if content_dict else '<extra specifications, locations, and descriptions here>'
-    start = content_dict.get(
-        'start') if content_dict else f'start time default {current_datetime}-04:00'
-    end = content_dict.get(
-        'end') if content_dict else f'end time default {current_datetime}-04:00'
-
-    format_instruction = f"""
-    You are an assistant that {query_type_dict.get('mode')}s a Google Calendar event using a sample JSON..
-    {'Update only the specified information from user message, leave the rest' if query_type_dict.get('mode') == 'update' else ''}
-    Ensure the summary and description are professional and informative. Use default start/end times if none are provided.
-    Default start time is {datetime.now().strftime("%Y-%m-%dT%H:%M:%S") + "-04:00"}.
-    Set the end time to 30 minutes after the start time if no end time is provided. 
-    Default description should be the same as the summary/title. If there isnt enough 
-    information to fill the dictionary, return {{'error': 'invalid'}}
-    Current dateTime: {datetime.now()}
-
-    event = {{
-        "summary": "{summary}",
-        "description": "{description}",
-        "start": {{
-            "dateTime": "{start}",
-            "timeZone": "{timeZone}"
-        }},
-        "end": {{
-            "dateTime": "{end}",
-            "timeZone": "{timeZone}"
-        }},
-        "reminders": {{
-            "useDefault": True
-        }}
-    }}
+EVENT_PROMPT = PromptTemplate('event', f"""
+    You are an assistant that creates or updates a Google Calendar event from the user message.
+    The mode is in the context. When updating, the context also holds the event's current fields:
+    change only what the user message asks for and keep the rest.
+    Ensure the summary and description are professional and informative.
+    Default description should be the same as the summary.
+    {TIME_INSTRUCTIONS}
+    If there isn't enough information to fill the event, return {{"error": "invalid"}}.
+    Return the event as json:
+    {{"summary": "<summary>", "description": "<extra specifications, locations, and descriptions>",
+    "start": {START_SPEC}, "end": {END_SPEC}, "reminders": {{"useDefault": true}}}}
+    """, budget=app.config['PROMPT_CONTEXT_BUDGET'])
+
+
+def current_fields(content_dict: dict, fields: tuple) -> dict:
+    # Only what the model may change, with times as specs, not the whole serialized row
+    if not content_dict:
+        return {}
+    current = {field: content_dict.get(field) for field in fields}
+    for key in ('start', 'end'):
+        current[key] = to_spec(content_dict.get(key), user_time_zone())
+    return current
+
+
+def apply_prompt_times(event_data: dict, prompt: str, current=None) -> dict:
+    """
+    Resolves the payload's times in the user's zone, with the dates and
+    times read locally from the prompt taking precedence over the LLM's.
+    current is the Events/Meets row being updated: only the new time the
+    prompt names is read then, and the row's length is kept when only the
+    start moves.
     """
-    return format_instruction.strip()
+    time_zone = user_time_zone()
+    now = datetime.now(ZoneInfo(time_zone))
+    when = parse_when(prompt, now) if current is None else parse_change(prompt, now)
+    if when:
+        duration = int((current.end - current.start).total_seconds() // 60) \
+            if current is not None and current.start and current.end else None
+        event_data = overlay_when(event_data, when, time_zone, duration)
+    return resolve_times(event_data, time_zone)
+
+
+def format_system_instructions_for_event(query_type_dict: dict, content_dict: dict = None) -> str:
+    return EVENT_PROMPT.render(mode=query_type_dict.get('mode'),
+                               **current_fields(content_dict, ('summary', 'description')))
 
 
 # Create a calendar event
@@ -574,12 +1114,31 @@ def gcal_create():
 
     if hasattr(format_instruction, 'error'):
         print("Not enough info. Please try again")
-        add_chat_response_to_history(session['history_id'], 'Not enough information. Please try again')
-        socketio.emit('receiver', {'message': 'Not enough information. Please try again'})
+        add_chat_response_to_history('Not enough information. Please try again')
+        reply('receiver', {'message': 'Not enough information. Please try again'})
         return
 
-        # GPT response as JSON
-    event_data = gpt_format_json(format_instruction, prompt_dict['prompt'])
+    # Dates and times are read locally. A simple prompt ("add standup tomorrow at 9am")
+    # also gets its title locally and skips the LLM
+    time_zone = user_time_zone()
+    when = parse_when(prompt_dict['prompt'], datetime.now(ZoneInfo(time_zone)))
+    title = simple_title(prompt_dict['prompt'], when) if when and (when['time'] or when['moment']) else None
+
+    # GPT response as JSON, unless it came back with the classification
+    stream_id = str(uuid.uuid4())
+    if prompt_dict.get('payload') or not title:
+        event_data = prompt_dict.get('payload') or gpt_format_json(
+            format_instruction, prompt_dict['prompt'], schema=EventPayload,
+            on_delta=stream_to_client('receiver-chunk', stream_id, ('summary', 'description')))
+    else:
+        event_data = {"summary": title, "description": title, "reminders": {"useDefault": True}}
+    if not event_data or event_data.get('error'):
+        print("Not enough information, Please try again")
+        add_chat_response_to_history('Not enough information, Please try again')
+        reply('receiver', {'message': 'Not enough information, Please try again'})
+        return
+
+    event_data = apply_prompt_times(event_data, prompt_dict['prompt'])
 
     event = create_event(g.service, event_data)
 
@@ -600,18 +1159,18 @@ def gcal_create():
     except Exception as e:
         db_failure_message = f"Error creating event in db. Try again?"
         print(db_failure_message, file=sys.stderr)
-        add_chat_response_to_history(session['history_id'], db_failure_message)
-        socketio.emit('receiver', {'message': db_failure_message})
+        add_chat_response_to_history(db_failure_message)
+        reply('receiver', {'message': db_failure_message})
 
     event_description = f"""Event Created! Check your Google Calendar to confirm!\n
     Event Details:
     Title: {new_event.title}
     Description: {new_event.description}
-    Start Time: {new_event.start}
-    End Time: {new_event.end}
+    Start Time: {format_datetime(new_event.start)}
+    End Time: {format_datetime(new_event.end)}
     """
-    add_chat_response_to_history(session['history_id'], event_description)
-    socketio.emit('receiver', {'message': event_description})
+    add_chat_response_to_history(event_description)
+    reply('receiver', {'message': event_description, 'stream_id': stream_id})
     print("event created!")
 
 
@@ -620,49 +1179,44 @@ def gcal_update():
     user_prompt = session['prompt_dictionary']['prompt']
     user_id = session['user_id']
 
-    # Find keywords from prompt
-    keywords = extract_keywords(user_prompt)
-
     # Limit search to user
-    events = Events.query.filter_by(user_id=user_id).all()
-    if not events:
+    if not db.session.query(Events.id).filter_by(user_id=user_id).first():
         print("Events not found in db. Try again?")
-        add_chat_response_to_history(session['history_id'], 'Events not found in db. Try again?')
-        socketio.emit(
-            'receiver', {'message': 'Events not found in db. Try again?'})
+        add_chat_response_to_history('Events not found in db. Try again?')
+        reply('receiver', {'message': 'Events not found in db. Try again?'})
         return
 
-    # Filter events then send to API to find id
-    filtered_events = [[{"event_id": event.event_id}, event.event_dictionary] for event in events if any(
-        keyword.lower() in event.title.lower() or keyword.lower() in event.description.lower() for keyword in keywords)]
-    print(filtered_events)
+    # Rank the user's events against the prompt
+    events = search_candidates(Events, user_id, user_prompt)
+    print(events)
 
-    if not filtered_events:
+    if not events:
         print("No events found matching the provided keywords.", file=sys.stderr)
-        add_chat_response_to_history(session['history_id'], 'No matching events found.')
-        socketio.emit('receiver', {'message': 'No matching events found.'})
+        add_chat_response_to_history('No matching events found.')
+        reply('receiver', {'message': 'No matching events found.'})
         return "No matching events found."
 
-    event_id = find_event_id(user_prompt, filtered_events)
+    # Resolve locally when one event clearly wins, otherwise send the shortlist to API to find id
+    event_id, shortlist = resolve_candidate(user_prompt, events, 'title', 'event_id', time_zone=user_time_zone())
+    if event_id is None:
+        event_id = find_event_id(user_prompt, shortlist)
     if event_id == 'invalid':
         print("Not enough information, please try again?")
-        add_chat_response_to_history(session['history_id'],'Not enough information, please try again?')
-        socketio.emit(
-            'receiver', {'message': 'Not enough information, please try again?'})
+        add_chat_response_to_history('Not enough information, please try again?')
+        reply('receiver', {'message': 'Not enough information, please try again?'})
         return
     # query event from database
 
     # event = Events.query.filter_by(title=prompt_dict.get('title')).first()
-    event = Events.query.filter_by(event_id=event_id.replace('\'', '')).first()
+    event = Events.query.filter_by(user_id=session['user_id'], event_id=event_id.replace('\'', '')).first()
 
     print(event)
 
     # if not found in db
     if not event:
         print("Event not found in db. Try again?")
-        add_chat_response_to_history(session['history_id'],'Event not found in db. Try again?')
-        socketio.emit(
-            'receiver', {'message': 'Event not found in db. Try again?'})
+        add_chat_response_to_history('Event not found in db. Try again?')
+        reply('receiver', {'message': 'Event not found in db. Try again?'})
         return
 
     event_content = event.serialize()
@@ -674,7 +1228,14 @@ def gcal_update():
         prompt_dict, event_content)
 
     # GPT response as JSON
-    event_data = gpt_format_json(format_instruction, prompt_dict.get('prompt'))
+    event_data = gpt_format_json(format_instruction, prompt_dict.get('prompt'), schema=EventPayload)
+    if not event_data or event_data.get('error'):
+        print("Not enough information, Please try again")
+        add_chat_response_to_history('Not enough information, Please try again')
+        reply('receiver', {'message': 'Not enough information, Please try again'})
+        return
+
+    event_data = apply_prompt_times(event_data, prompt_dict.get('prompt'), event)
 
     updated_event = update_event(g.service, event_id, event_data)
 
@@ -693,59 +1254,55 @@ def gcal_update():
     except Exception as e:
         db_failure_message = f"Error updating event in db. Try again?"
         print(db_failure_message, file=sys.stderr)
-        add_chat_response_to_history(session['history_id'], db_failure_message)
-        socketio.emit('receiver', {'message': db_failure_message})
+        add_chat_response_to_history(db_failure_message)
+        reply('receiver', {'message': db_failure_message})
 
     event_description = f"""Event Updated! Check your Google Calendar to confirm!\n
     Event Details:
     Title: {event.title}
     Description: {event.description}
-    Start Time: {event.start}
-    End Time: {event.end}
+    Start Time: {format_datetime(event.start)}
+    End Time: {format_datetime(event.end)}
     """
     print("Event has been updated successfully.")
-    add_chat_response_to_history(session['history_id'], event_description)
-    socketio.emit('receiver', {'message': event_description})
+    add_chat_response_to_history(event_description)
+    reply('receiver', {'message': event_description})
 
 
 def gcal_remove():
     user_prompt = session['prompt_dictionary']['prompt']
     user_id = session['user_id']
 
-    # Find keywords from prompt
-    keywords = extract_keywords(user_prompt)
-
     # Limit search to user
-    events = Events.query.filter_by(user_id=user_id).all()
-    if not events:
+    if not db.session.query(Events.id).filter_by(user_id=user_id).first():
         print("Events not found in db. Try again?")
-        add_chat_response_to_history(session['history_id'],'Events not found in db. Try again?')
-        socketio.emit(
-            'receiver', {'message': 'Events not found in db. Try again?'})
+        add_chat_response_to_history('Events not found in db. Try again?')
+        reply('receiver', {'message': 'Events not found in db. Try again?'})
         return
 
-    # Filter events then send to API to find id
-    filtered_events = [[{"event_id": event.event_id}, event.event_dictionary] for event in events if any(
-        keyword.lower() in event.title.lower() or keyword.lower() in event.description.lower() for keyword in keywords)]
-    print(filtered_events)
+    # Rank the user's events against the prompt
+    events = search_candidates(Events, user_id, user_prompt)
+    print(events)
 
-    if not filtered_events:
+    if not events:
         print("No events found matching the provided keywords.", file=sys.stderr)
-        add_chat_response_to_history(session['history_id'], 'No matching events found.')
-        socketio.emit('receiver', {'message': 'No matching events found.'})
+        add_chat_response_to_history('No matching events found.')
+        reply('receiver', {'message': 'No matching events found.'})
         return "No matching events found."
 
-    event_id = find_event_id(user_prompt, filtered_events)
+    # Resolve locally when one event clearly wins, otherwise send the shortlist to API to find id
+    event_id, shortlist = resolve_candidate(user_prompt, events, 'title', 'event_id', time_zone=user_time_zone())
+    if event_id is None:
+        event_id = find_event_id(user_prompt, shortlist)
     if event_id == 'invalid':
         print("Not enough information, please try again?")
-        add_chat_response_to_history(session['history_id'],'Not enough information, please try again?')
-        socketio.emit(
-            'receiver', {'message': 'Not enough information, please try again?'})
+        add_chat_response_to_history('Not enough information, please try again?')
+        reply('receiver', {'message': 'Not enough information, please try again?'})
         return
     # query event from database
 
     # event = Events.query.filter_by(title=prompt_dict.get('title')).first()
-    event = Events.query.filter_by(event_id=event_id.replace('\'', '')).first()
+    event = Events.query.filter_by(user_id=session['user_id'], event_id=event_id.replace('\'', '')).first()
 
     print(event)
 
@@ -755,8 +1312,8 @@ def gcal_remove():
     Event Details:
     Title: {event.title}
     Description: {event.description}
-    Start Time: {event.start}
-    End Time: {event.end}
+    Start Time: {format_datetime(event.start)}
+    End Time: {format_datetime(event.end)}
     """
 
     try:
@@ -766,16 +1323,95 @@ def gcal_remove():
     except Exception as e:
         db_failure_message = f"Error deleting event in db. Try again?"
         print(db_failure_message, file=sys.stderr)
-        add_chat_response_to_history(session['history_id'], db_failure_message)
-        socketio.emit('receiver', {'message': db_failure_message})
+        add_chat_response_to_history(db_failure_message)
+        reply('receiver', {'message': db_failure_message})
 
     print("Event has been deleted successfully.")
-    add_chat_response_to_history(session['history_id'], event_description)
-    socketio.emit('receiver', {'message': event_description})
+    add_chat_response_to_history(event_description)
+    reply('receiver', {'message': event_description})
 
     return event_description
 
 
+BULK_PROMPT = PromptTemplate('bulk', f"""
+    You are an assistant that applies one request to several Google Calendar events or Google Meetings at once.
+    Pick every item from the context's items that the user message refers to and return a json response as
+    {{"operations": [{{"id": "<id from the items>", "action": "<update or remove>",
+                       "summary": "<new title, only if changed>",
+                       "start": <null unless moved, else {START_SPEC}>,
+                       "end": <null unless the length or end changed, else {END_SPEC}>}}]}}
+    {TIME_INSTRUCTIONS} Set the parts of start that stay the same to null, a moved item keeps its length.
+    If no items match, return {{"operations": []}}.
+    """, budget=app.config['PROMPT_CONTEXT_BUDGET'])
+
+
+def format_system_instructions_for_bulk(query_type_dict: dict, candidates: list) -> str:
+    item_type = "Google Meetings" if query_type_dict.get('event_type') == 'gmeet' else "Google Calendar events"
+    return BULK_PROMPT.render(item_type=item_type, items=candidates)
+
+
+def calendar_bulk(model, fields: dict, conference: bool):
+    """
+    Shared by gcal_bulk and gmeet_bulk: one LLM call picks the operations,
+    one batch request applies them and one commit records them.
+    """
+    prompt_dict = session.get('prompt_dictionary')
+    user_prompt = prompt_dict['prompt']
+    user_id = session['user_id']
+
+    rows = search_candidates(model, user_id, user_prompt, limit=MAX_BATCH_SIZE)
+    if not rows:
+        print("No items found matching the provided keywords.", file=sys.stderr)
+        add_chat_response_to_history('No matching items found.')
+        reply('receiver', {'message': 'No matching items found.'})
+        return "No matching items found."
+
+    time_zone = user_time_zone()
+    candidates = [{"id": getattr(row, fields['id']), "title": getattr(row, fields['summary']),
+                   "start": to_spec(row.start, time_zone), "end": to_spec(row.end, time_zone)} for row in rows]
+    rows_by_id = {getattr(row, fields['id']): row for row in rows}
+
+    response = gpt_format_json(format_system_instructions_for_bulk(prompt_dict, candidates), user_prompt) or {}
+    # Times come back as relative specs and are resolved per item, like single-item changes
+    operations = [resolve_operation_times(operation, rows_by_id[operation['id']].start,
+                                          rows_by_id[operation['id']].end, time_zone)
+                  for operation in response.get('operations', [])
+                  if isinstance(operation, dict) and operation.get('id') in rows_by_id]
+    if not operations:
+        print("Not enough information, please try again?")
+        add_chat_response_to_history('Not enough information, please try again?')
+        reply('receiver', {'message': 'Not enough information, please try again?'})
+        return
+
+    results = execute_batch(g.service, operations, time_zone, conference=conference)
+
+    try:
+        updated, removed, failed = reconcile(db.session, session['user_id'], model, fields, results)
+    except Exception as e:
+        db_failure_message = "Error saving batch changes in db. Try again?"
+        print(f"{db_failure_message} {e}", file=sys.stderr)
+        add_chat_response_to_history(db_failure_message)
+        reply('receiver', {'message': db_failure_message})
+        return
+
+    lines = [f"Updated: {getattr(row, fields['summary'])} ({format_datetime(row.start)})" for row in updated]
+    lines += [f"Removed: {getattr(row, fields['summary'])}" for row in removed]
+    lines += [f"Failed: {operation['id']}" for operation in failed]
+    batch_description = f"Batch complete! {len(updated)} updated, {len(removed)} removed, " \
+                        f"{len(failed)} failed.\n" + "\n".join(lines)
+
+    print("Batch has been processed.")
+    add_chat_response_to_history(batch_description)
+    reply('receiver', {'message': batch_description})
+
+    return batch_description
+
+
+def gcal_bulk():
+    return calendar_bulk(Events, {'id': 'event_id', 'summary': 'title', 'dictionary': 'event_dictionary'},
+                         conference=False)
+
+
 #
 # -----------------------------------------------------------------------
 # GMEET ROUTES
@@ -816,54 +1452,24 @@ def delete_google_meet(service, event_id):
     ).execute()
 
 
+MEETING_PROMPT = PromptTemplate('meeting', f"""
+    You are an assistant that creates or updates a Google Meeting from the user message.
+    The mode is in the context. When updating, the context also holds the meeting's current fields:
+    change only what the user message asks for and keep the rest, including the attendees.
+    Ensure the summary and description are professional and informative.
+    Default description should be the same as the summary.
+    {TIME_INSTRUCTIONS}
+    If there isn't enough information to fill the meeting, return {{"error": "invalid"}}.
+    Return the meeting as json:
+    {{"summary": "<summary>", "description": "<extra specifications, locations, and descriptions>",
+    "start": {START_SPEC}, "end": {END_SPEC}, "attendees": [{{"email": "<attendee email>"}}],
+    "reminders": {{"useDefault": true}}}}
+    """, budget=app.config['PROMPT_CONTEXT_BUDGET'])
+
+
 def format_system_instructions_for_meeting(query_type_dict: dict, content_dict: dict = None) -> str:
-    curr_time_zone = str(get_localzone())
-
-    summary = content_dict.get('summary') if content_dict else '<summary_here>'
-    description = content_dict.get(
-        'description') if content_dict else 'extra specifications, locations, and descriptions'
-    start = content_dict.get(
-        'start') if content_dict else 'start time default format <2015-05-28T09:00:00-07:00>'
-    end = content_dict.get(
-        'end') if content_dict else 'end time example format <2015-05-28T17:00:00-07:00>'
-    attendees = content_dict.get('attendees',
-                                 []) if content_dict else []  # List of attendees or an empty list if not provided
-
-    # Format attendees
-    if attendees:
-        attendees_list = [
-            {"email": email} for email in attendees
-        ]
-    else:
-        attendees_list = [{"email": "example@gmail.com"}]
-
-    instructions = f"""
-    You are an assistant that {query_type_dict.get('mode')}s a Google Meeting using a sample JSON.
-    {'Update only the specified information from user message, leave the rest' if query_type_dict.get('mode') == 'update' else ''}
-    Ensure the summary and description are professional and informative. Use default start/end times if none are provided. 
-    Default description should be the same as the summary/title.
-    Default start time is {datetime.now().strftime("%Y-%m-%dT%H:%M:%S") + "-04:00"}.
-    Set the end time to 30 minutes after the start time if no end time is provided. Use the default attendees if none are provided.
-    If there isnt enough information to fill in the dictionary, return {{'error': 'invalid'}}. 
-    Current dateTime: {datetime.now()}
-    event = {{
-        "summary": "{summary}",
-        "description": "{description}",
-        "start": {{
-            "dateTime": "{start}",
-            "timeZone": "{curr_time_zone}"
-        }},
-        "end": {{
-            "dateTime": "{end}",
-            "timeZone": "{curr_time_zone}"
-        }},
-        "attendees": {attendees_list}, 
-        "reminders": {{
-            "useDefault": True
-        }}
-    }}
-    """
-    return instructions.strip()
+    current = current_fields(content_dict, ('summary', 'description', 'attendees'))
+    return MEETING_PROMPT.render(mode=query_type_dict.get('mode'), **current)
 
 
 def convert_dict_to_str(attendees):
@@ -876,15 +1482,18 @@ def gmeet_create():
     # No content dict bc create
     instructions = format_system_instructions_for_meeting(prompt_dict)
 
-    event_data = gpt_format_json(instructions, prompt_dict['prompt'])
+    stream_id = str(uuid.uuid4())
+    event_data = prompt_dict.get('payload') or gpt_format_json(
+        instructions, prompt_dict['prompt'], schema=MeetingPayload,
+        on_delta=stream_to_client('receiver-chunk', stream_id, ('summary', 'description')))
     print(event_data)
-    if event_data.get('error'):
+    if not event_data or event_data.get('error'):
         print("Not enough information, Please try again")
-        add_chat_response_to_history(session['history_id'],'Not enough information, Please try again')
-        socketio.emit(
-            'receiver', {'message': 'Not enough information, Please try again'})
+        add_chat_response_to_history('Not enough information, Please try again')
+        reply('receiver', {'message': 'Not enough information, Please try again'})
         return
 
+    event_data = apply_prompt_times(event_data, prompt_dict['prompt'])
     print(event_data)
 
     event = create_google_meet(g.service, event_data)
@@ -908,19 +1517,19 @@ def gmeet_create():
     except Exception as e:
         db_failure_message = f"Error creating meeting in db. Try again?"
         print(db_failure_message, file=sys.stderr)
-        add_chat_response_to_history(session['history_id'], db_failure_message)
-        socketio.emit('receiver', {'message': db_failure_message})
+        add_chat_response_to_history(db_failure_message)
+        reply('receiver', {'message': db_failure_message})
 
     event_description = f"""Meeting created!\n
     Event Details:
     Title: {new_meeting.summary}
     Description: {new_meeting.description}
-    Start Time: {new_meeting.start}
-    End Time: {new_meeting.end}
+    Start Time: {format_datetime(new_meeting.start)}
+    End Time: {format_datetime(new_meeting.end)}
     """
     print("Meeting has been created successfully.")
-    add_chat_response_to_history(session['history_id'], event_description)
-    socketio.emit('receiver', {'message': event_description})
+    add_chat_response_to_history(event_description)
+    reply('receiver', {'message': event_description, 'stream_id': stream_id})
 
 
 def gmeet_update():
@@ -928,47 +1537,41 @@ def gmeet_update():
     user_prompt = session['prompt_dictionary']['prompt']
     user_id = session['user_id']
 
-    # Find keywords from prompt
-    keywords = extract_keywords(user_prompt)
-
     # Limit search to user
-    meetings = Meets.query.filter_by(user_id=user_id).all()
-    if not meetings:
+    if not db.session.query(Meets.id).filter_by(user_id=user_id).first():
         print("Meetings not found in db. Try again?")
-        add_chat_response_to_history(session['history_id'], 'Meetings not found in db. Try again?')
-        socketio.emit(
-            'receiver', {'message': 'Meetings not found in db. Try again?'})
+        add_chat_response_to_history('Meetings not found in db. Try again?')
+        reply('receiver', {'message': 'Meetings not found in db. Try again?'})
         return
 
-    # Filter events then send to API to find id
-    filtered_meetings = [[{"meet_id": meeting.meet_id}, meeting.meet_dictionary] for meeting in meetings if any(
-        keyword.lower() in meeting.summary.lower() or keyword.lower() in meeting.description.lower() for keyword in
-        keywords)]
-    print(filtered_meetings)
+    # Rank the user's meetings against the prompt
+    meetings = search_candidates(Meets, user_id, user_prompt)
+    print(meetings)
 
-    if not filtered_meetings:
+    if not meetings:
         print("No meetings found matching the provided keywords.", file=sys.stderr)
-        add_chat_response_to_history(session['history_id'], 'No meetings found matching the provided keywords.')
-        socketio.emit(
-            'receiver', {'message': 'No meetings found matching the provided keywords.'})
+        add_chat_response_to_history('No meetings found matching the provided keywords.')
+        reply('receiver', {'message': 'No meetings found matching the provided keywords.'})
         return "No matching meeting found."
 
-    mid = find_meeting_id(user_prompt, filtered_meetings)
+    # Resolve locally when one meeting clearly wins, otherwise send the shortlist to API to find id
+    mid, shortlist = resolve_candidate(user_prompt, meetings, 'summary', 'meet_id', time_zone=user_time_zone())
+    if mid is None:
+        mid = find_meeting_id(user_prompt, shortlist)
     if mid == 'invalid':
         print("Not enough information, please try again?")
-        add_chat_response_to_history(session['history_id'],'Not enough information, please try again?')
-        socketio.emit('receiver', {'message': 'Not enough information, please try again?'})
+        add_chat_response_to_history('Not enough information, please try again?')
+        reply('receiver', {'message': 'Not enough information, please try again?'})
         return
     # query event from database
     # event = Events.query.filter_by(title=prompt_dict.get('title')).first()
-    meeting = Meets.query.filter_by(meet_id=mid.replace('\'', '')).first()
+    meeting = Meets.query.filter_by(user_id=session['user_id'], meet_id=mid.replace('\'', '')).first()
 
     # if not found in db
     if not meeting:
         print("Meeting not found in db. Try again?")
-        add_chat_response_to_history(session['history_id'], 'Meeting not found in db. Try again?')
-        socketio.emit(
-            'receiver', {'message': 'Meeting not found in db. Try again?'})
+        add_chat_response_to_history('Meeting not found in db. Try again?')
+        reply('receiver', {'message': 'Meeting not found in db. Try again?'})
         return
 
     meeting_content = meeting.serialize()
@@ -983,7 +1586,14 @@ def gmeet_update():
 
     # formatted response from gpt --> can be passed directly into create or remove
     # CHECKOUT (why 'title' instead of 'prompt')
-    event_data = gpt_format_json(instructions, prompt_dict.get('prompt'))
+    event_data = gpt_format_json(instructions, prompt_dict.get('prompt'), schema=MeetingPayload)
+    if not event_data or event_data.get('error'):
+        print("Not enough information, Please try again")
+        add_chat_response_to_history('Not enough information, Please try again')
+        reply('receiver', {'message': 'Not enough information, Please try again'})
+        return
+
+    event_data = apply_prompt_times(event_data, prompt_dict.get('prompt'), meeting)
 
     event = update_google_meet(g.service, meeting_id, event_data)
 
@@ -1003,63 +1613,57 @@ def gmeet_update():
     except Exception as e:
         db_failure_message = f"Error updating meeting in db. Try again?"
         print(db_failure_message, file=sys.stderr)
-        add_chat_response_to_history(session['history_id'], db_failure_message)
-        socketio.emit('receiver', {'message': db_failure_message})
+        add_chat_response_to_history(db_failure_message)
+        reply('receiver', {'message': db_failure_message})
 
     event_description = f"""Meeting updated!\n
     Event Details:
     Title: {meeting.summary}
     Description: {meeting.description}
-    Start Time: {meeting.start}
-    End Time: {meeting.end}
+    Start Time: {format_datetime(meeting.start)}
+    End Time: {format_datetime(meeting.end)}
     """
 
     print("Meeting updated successfully.")
 
-    add_chat_response_to_history(session['history_id'], event_description)
-    socketio.emit('receiver', {'message': event_description})
+    add_chat_response_to_history(event_description)
+    reply('receiver', {'message': event_description})
 
 
 def gmeet_remove():
     user_prompt = session['prompt_dictionary']['prompt']
     user_id = session['user_id']
 
-    # Find keywords from prompt
-    keywords = extract_keywords(user_prompt)
-
     # Limit search to user
-    meetings = Meets.query.filter_by(user_id=user_id).all()
-    if not meetings:
+    if not db.session.query(Meets.id).filter_by(user_id=user_id).first():
         print("Meetings not found in db. Try again?")
-        add_chat_response_to_history(session['history_id'], 'Meetings not found in db. Try again?')
-        socketio.emit(
-            'receiver', {'message': 'Meetings not found in db. Try again?'})
+        add_chat_response_to_history('Meetings not found in db. Try again?')
+        reply('receiver', {'message': 'Meetings not found in db. Try again?'})
         return
 
-    # Filter events then send to API to find id
-    filtered_meetings = [[{"meet_id": meeting.meet_id}, meeting.meet_dictionary] for meeting in meetings if any(
-        keyword.lower() in meeting.summary.lower() or keyword.lower() in meeting.description.lower() for keyword in
-        keywords)]
-    print(filtered_meetings)
+    # Rank the user's meetings against the prompt
+    meetings = search_candidates(Meets, user_id, user_prompt)
+    print(meetings)
 
-    if not filtered_meetings:
+    if not meetings:
         print("No meetings found matching the provided keywords.", file=sys.stderr)
-        add_chat_response_to_history(session['history_id'],'No meetings found matching the provided keywords.')
-        socketio.emit(
-            'receiver', {'message': 'No meetings found matching the provided keywords.'})
+        add_chat_response_to_history('No meetings found matching the provided keywords.')
+        reply('receiver', {'message': 'No meetings found matching the provided keywords.'})
         return "No matching meeting found."
 
-    meet_id = find_meeting_id(user_prompt, filtered_meetings)
+    # Resolve locally when one meeting clearly wins, otherwise send the shortlist to API to find id
+    meet_id, shortlist = resolve_candidate(user_prompt, meetings, 'summary', 'meet_id', time_zone=user_time_zone())
+    if meet_id is None:
+        meet_id = find_meeting_id(user_prompt, shortlist)
     if meet_id == 'invalid':
         print("Not enough information, please try again?")
-        add_chat_response_to_history(session['history_id'],'Not enough information, please try again?')
-        socketio.emit(
-            'receiver', {'message': 'Not enough information, please try again?'})
+        add_chat_response_to_history('Not enough information, please try again?')
+        reply('receiver', {'message': 'Not enough information, please try again?'})
         return
     # query event from database
     # event = Events.query.filter_by(title=prompt_dict.get('title')).first()
     meeting_to_remove = Meets.query.filter_by(
-        meet_id=meet_id.replace('\'', '')).first()
+        user_id=session['user_id'], meet_id=meet_id.replace('\'', '')).first()
     print(meeting_to_remove)
 
     # remove it from calendar
@@ -1072,19 +1676,24 @@ def gmeet_remove():
     except Exception as e:
         db_failure_message = f"Error deleting meeting in db. Try again"
         print(db_failure_message, file=sys.stderr)
-        add_chat_response_to_history(session['history_id'], db_failure_message)
-        socketio.emit('receiver', {'message': db_failure_message})
+        add_chat_response_to_history(db_failure_message)
+        reply('receiver', {'message': db_failure_message})
 
     event_description = f"""Meeting removed!\n
     Event Details:
     Title: {meeting_to_remove.summary}
     Description: {meeting_to_remove.description}
-    Start Time: {meeting_to_remove.start}
-    End Time: {meeting_to_remove.end}
+    Start Time: {format_datetime(meeting_to_remove.start)}
+    End Time: {format_datetime(meeting_to_remove.end)}
     """
     print("Meeting removed successfully.")
-    add_chat_response_to_history(session['history_id'], event_description)
-    socketio.emit('receiver', {'message': event_description})
+    add_chat_response_to_history(event_description)
+    reply('receiver', {'message': event_description})
+
+
+def gmeet_bulk():
+    return calendar_bulk(Meets, {'id': 'meet_id', 'summary': 'summary', 'dictionary': 'meet_dictionary'},
+                         conference=True)
 
 
 #
@@ -1094,17 +1703,21 @@ def gmeet_remove():
 #
 
 
-def get_authenticated_user_email(service):
-    try:
-        profile = service.users().getProfile(userId='me').execute()
-        return profile['emailAddress']
-    except Exception as e:
-        print(f"An error occurred getting user email: {e}")
-        return None
+def gmail_sender():
+    """
+    (address, display name) of the user's Google account, read from Users.
+    Accounts linked before it was stored get it fetched once here.
+    """
+    if 'sender' not in g:
+        user = db.session.get(Users, session['user_id'])
+        if user and user.token and not user.google_email:
+            store_google_identity(user, get_google_service())
+        g.sender = (user.google_email, user.google_name) if user else (None, None)
+    return g.sender
 
 
 def email_json_to_raw(email_json):
-    from_field = get_authenticated_user_email(g.email)  # Assuming `from_list` has a single email
+    from_field = sender_address(*gmail_sender())
     to_field = email_json['to']
     cc_field = email_json.get('cc', [])
 
@@ -1122,29 +1735,36 @@ def email_json_to_raw(email_json):
     return raw_email
 
 
+GMAIL_PROMPT = PromptTemplate('gmail', """
+    You are an assistant that writes an email from the user message.
+    The mode, the sender and any fields already written are in the context. Leave unspecified fields unchanged.
+    Ensure the subject and body are professional and informative.
+    Sign the body with the sender's name from the context.
+    Return the email as json:
+    {"from": "<sender>", "to": "<recipient email>", "cc": [], "subject": "<email subject>", "body": "<email body>"}
+    """, budget=app.config['PROMPT_CONTEXT_BUDGET'])
+
+
+def sender_name():
+    user = db.session.get(Users, session['user_id']) if session.get('user_id') else None
+    return user.name if user else None
+
+
 def format_system_instructions_for_gmail(query_type_dict: dict, content_dict: dict = None) -> str:
-    recipient = content_dict.get('to') if content_dict else '<recipient_email>'
-    subject = content_dict.get(
-        'subject') if content_dict else '<email_subject>'
-    body = content_dict.get('body') if content_dict else '<email_body>'
-    sender = content_dict.get(
-        'from', 'noreply@example.com') if content_dict else 'noreply@example.com'
-    cc = content_dict.get('cc', []) if content_dict else []
-
-    instructions = f"""
-    You are an assistant that {query_type_dict.get('mode', 'create')}s an email using a sample JSON format.
-    Leave unspecified attributes unchanged. Ensure the subject and body are professional and informative.
-    The sender's name is {Users.query.filter_by(id=session['user_id']).first().name}. Use this name in the signature.
-    Current dateTime: {datetime.now()}
-    email = {{
-        "from": "{sender}",
-        "to": {recipient},
-        "cc": {cc},
-        "subject": "{subject}",
-        "body": "{body}"
-    }}
-    """
-    return instructions.strip()
+    content_dict = content_dict or {}
+    return GMAIL_PROMPT.render(mode=query_type_dict.get('mode', 'create'), sender_name=sender_name(),
+                               **{key: content_dict.get(key) for key in ('from', 'to', 'cc', 'subject', 'body')})
+
+
+# Classification plus the three create prompts, one static prefix for determine_query_type(include_payload=True)
+QUERY_AND_PAYLOAD_PROMPT = PromptTemplate('query_and_payload', "\n\n".join([
+    QUERY_TYPE_INSTRUCTIONS,
+    'Also add a "payload" key to the same json response. If the mode is create, fill the payload using the '
+    'instructions below that match the event_type, in create mode. Otherwise set the payload to null.',
+    f"For gcal create:\n{EVENT_PROMPT.prefix}",
+    f"For gmeet create:\n{MEETING_PROMPT.prefix}",
+    f"For gmail create:\n{GMAIL_PROMPT.prefix}",
+]), budget=app.config['PROMPT_CONTEXT_BUDGET'])
 
 
 def create_gmail_draft(service, message_body_raw):
@@ -1181,12 +1801,12 @@ def send_gmail_draft(service, draft_id):
         # draft =
         service.users().drafts().send(
             userId='me', body={'id': draft_id}).execute()
-        socketio.emit('receiver', {'message': 'Email sent successfully'})
+        reply('receiver', {'message': 'Email sent successfully'})
         print("Draft sent successfully")
         # return draft
     except Exception as e:
         print(f"An error occurred sending gmail draft: {e}")
-        socketio.emit('receiver', {'message': 'Error sending draft'})
+        reply('receiver', {'message': 'Error sending draft'})
 
 
 def delete_gmail_draft(service, draft_id):
@@ -1227,17 +1847,18 @@ def handle_approval_response(response):
                 to=email_json['to'],
 
                 user_id=session['user_id'],
-                sender=get_authenticated_user_email(g.email),
+                sender=gmail_sender()[0],
                 cc=email_json.get('cc'),
                 email_id=draft.get('id'),
+                message_id=draft.get('message', {}).get('id'),
                 email_dictionary=json.dumps(email_json),
-                link=f"https://mail.google.com/mail/u/0/#drafts?compose={draft.get('id')}"
+                link=draft_link(draft.get('id'))
             )
             db.session.add(newly_drafted_email)
             db.session.commit()
             message = "Gmail draft was saved successfully"
-    add_chat_response_to_history(session['history_id'], message)
-    socketio.emit('receiver', {'message': message})
+    add_chat_response_to_history(message)
+    reply('receiver', {'message': message})
 
     # technically there is a 'quit' but it's not anywhere, so we just ignore the data
 
@@ -1249,15 +1870,24 @@ def gmail_create():
 
     print(g.email)
 
-    content_dict = {'from': f"{get_authenticated_user_email(g.email)}"}
+    content_dict = {'from': f"{sender_address(*gmail_sender())}"}
     instructions = format_system_instructions_for_gmail(
         prompt_dict, content_dict)
 
-    created_email_json = gpt_format_json(instructions, prompt)
+    # The draft fills in on the client while it is generated
+    stream_id = str(uuid.uuid4())
+    created_email_json = prompt_dict.get('payload') or gpt_format_json(
+        instructions, prompt, schema=EmailPayload,
+        on_delta=stream_to_client('request-approval-chunk', stream_id, ('to', 'subject', 'body')))
 
     print(created_email_json)
+    if not created_email_json or created_email_json.get('error'):
+        print("Not enough information, Please try again")
+        add_chat_response_to_history('Not enough information, Please try again')
+        reply('receiver', {'message': 'Not enough information, Please try again'})
+        return
 
-    socketio.emit('request-approval', created_email_json)
+    reply('request-approval', dict(created_email_json or {}, stream_id=stream_id))
 
 
 # Sends a draft
@@ -1266,27 +1896,24 @@ def gmail_send():
     user_prompt = session['prompt_dictionary']['prompt']
     user_id = session['user_id']
 
-    # Find keywords from prompt
-    keywords = extract_keywords(user_prompt)
-
     # Limit search to user
-    emails = Emails.query.filter_by(user_id=user_id).all()
-    if not emails:
+    if not db.session.query(Emails.id).filter_by(user_id=user_id).first():
         print("Emails not found in db. Try again?")
-        socketio.emit('receiver', {'message': 'Emails not found in db. Try again?'})
+        reply('receiver', {'message': 'Emails not found in db. Try again?'})
         return
 
-    # Filter events then send to API to find id
-    filtered_emails = [[{"meet_id": email.email_id}, email.email_dictionary] for email in emails if any(
-        keyword.lower() in email.subject.lower() or keyword.lower() in email.description.lower() for keyword in
-        keywords)]
-    print(filtered_emails)
+    # Rank the user's drafts against the prompt
+    emails = search_candidates(Emails, user_id, user_prompt)
+    print(emails)
 
-    if not filtered_emails:
+    if not emails:
         print("No emails found matching the provided keywords.", file=sys.stderr)
         return "No matching emails found."
 
-    email_id = find_email_id(user_prompt, filtered_emails)
+    # Resolve locally when one draft clearly wins, otherwise send the shortlist to API to find id
+    email_id, shortlist = resolve_candidate(user_prompt, emails, 'subject', 'email_id', time_zone=user_time_zone())
+    if email_id is None:
+        email_id = find_email_id(user_prompt, shortlist)
     if email_id == 'invalid':
         print("Not enough information, please try again?")
         return
@@ -1294,7 +1921,7 @@ def gmail_send():
     # query event from database
     # event = Events.query.filter_by(title=prompt_dict.get('title')).first()
     email_to_send = Emails.query.filter_by(
-        email_id=email_id.replace('\'', '')).first()
+        user_id=session['user_id'], email_id=email_id.replace('\'', '')).first()
     print(email_to_send)
 
     if email_to_send:
@@ -1307,36 +1934,31 @@ def gmail_send():
         except Exception as e:
             db_failure_message = f"Error removing draft from db. Try again?"
             print(db_failure_message, file=sys.stderr)
-            add_chat_response_to_history(session['history_id'], db_failure_message)
-            socketio.emit('receiver', {'message': db_failure_message})
+            add_chat_response_to_history(db_failure_message)
+            reply('receiver', {'message': db_failure_message})
 
 
 def gmail_delete():
     user_prompt = session['prompt_dictionary']['prompt']
     user_id = session['user_id']
 
-    # Find keywords from prompt
-    keywords = extract_keywords(user_prompt)
-    print(keywords)
-
     # Limit search to user
-    emails = Emails.query.filter_by(user_id=user_id).all()
-    print(Emails.query.filter_by(user_id=user_id).first().email_id)
-    if not emails:
+    if not db.session.query(Emails.id).filter_by(user_id=user_id).first():
         print("Emails not found in db. Try again?")
         return
 
-    # Filter events then send to API to find id
-    filtered_emails = [[{"meet_id": email.email_id}, email.email_dictionary] for email in emails if any(
-        keyword.lower() in email.summary.lower() or keyword.lower() in email.body.lower() for keyword in
-        keywords)]
-    print(filtered_emails)
+    # Rank the user's drafts against the prompt
+    emails = search_candidates(Emails, user_id, user_prompt)
+    print(emails)
 
-    if not filtered_emails:
+    if not emails:
         print("No emails found matching the provided keywords.", file=sys.stderr)
         return "No matching emails found."
 
-    email_id = find_email_id(user_prompt, filtered_emails)
+    # Resolve locally when one draft clearly wins, otherwise send the shortlist to API to find id
+    email_id, shortlist = resolve_candidate(user_prompt, emails, 'subject', 'email_id', time_zone=user_time_zone())
+    if email_id is None:
+        email_id = find_email_id(user_prompt, shortlist)
     print(email_id)
     if email_id == 'invalid':
         print("Not enough information, please try again?")
@@ -1344,13 +1966,13 @@ def gmail_delete():
     # query event from database
     # event = Events.query.filter_by(title=prompt_dict.get('title')).first()
     draft_to_delete = Emails.query.filter_by(
-        email_id=email_id.replace('\'', '')).first()
+        user_id=session['user_id'], email_id=email_id.replace('\'', '')).first()
     print(draft_to_delete)
     if draft_to_delete:
         # delete from our db
         draft_id = draft_to_delete.email_id
 
-        delete_gmail_draft(g.gmail_service, draft_id)
+        delete_gmail_draft(g.email, draft_id)
 
         try:
             db.session.delete(draft_to_delete)
@@ -1358,8 +1980,75 @@ def gmail_delete():
         except Exception as e:
             db_failure_message = f"Error deleting draft in db. Try again?"
             print(db_failure_message, file=sys.stderr)
-            add_chat_response_to_history(session['history_id'], db_failure_message)
-            socketio.emit('receiver', {'message': db_failure_message})
+            add_chat_response_to_history(db_failure_message)
+            reply('receiver', {'message': db_failure_message})
+
+
+GMAIL_BULK_PROMPT = PromptTemplate('gmail_bulk', """
+    You are an assistant that applies one request to several Gmail drafts at once.
+    Pick every draft from the context's drafts that the user message refers to and return a json response as
+    {"operations": [{"id": "<id from the drafts>", "action": "<the action from the context>"}]}
+    If no drafts match, return {"operations": []}.
+    """, budget=app.config['PROMPT_CONTEXT_BUDGET'])
+
+
+def format_system_instructions_for_gmail_bulk(action: str, candidates: list) -> str:
+    return GMAIL_BULK_PROMPT.render(action=action, drafts=candidates)
+
+
+def gmail_bulk():
+    """
+    Sends or deletes several drafts: one LLM call picks them, one batch
+    request applies them and one commit records them.
+    """
+    prompt_dict = session.get('prompt_dictionary')
+    user_prompt = prompt_dict['prompt']
+    action = prompt_dict.get('action', 'send')
+    user_id = session['user_id']
+
+    rows = search_candidates(Emails, user_id, user_prompt, limit=MAX_BATCH_SIZE)
+    if not rows:
+        # "send all my drafts" leaves nothing to search on, let the model pick from the latest drafts
+        rows = Emails.query.filter_by(user_id=user_id).order_by(Emails.id.desc()).limit(MAX_BATCH_SIZE).all()
+    if not rows:
+        print("Emails not found in db. Try again?")
+        add_chat_response_to_history('Emails not found in db. Try again?')
+        reply('receiver', {'message': 'Emails not found in db. Try again?'})
+        return "No matching emails found."
+
+    subjects = {row.email_id: row.subject for row in rows}
+    candidates = [{"id": row.email_id, "to": row.to, "subject": row.subject} for row in rows]
+
+    response = gpt_format_json(format_system_instructions_for_gmail_bulk(action, candidates), user_prompt) or {}
+    operations = [{"id": operation['id'], "action": action} for operation in response.get('operations', [])
+                  if isinstance(operation, dict) and operation.get('id') in subjects]
+    if not operations:
+        print("Not enough information, please try again?")
+        add_chat_response_to_history('Not enough information, please try again?')
+        reply('receiver', {'message': 'Not enough information, please try again?'})
+        return
+
+    results = execute_draft_batch(g.email, operations)
+
+    try:
+        _, _, removed, failed = reconcile_drafts(db.session, user_id, results)
+    except Exception as e:
+        db_failure_message = "Error saving batch changes in db. Try again?"
+        print(f"{db_failure_message} {e}", file=sys.stderr)
+        add_chat_response_to_history(db_failure_message)
+        reply('receiver', {'message': db_failure_message})
+        return
+
+    done = "Sent" if action == "send" else "Deleted"
+    lines = [f"{done}: {row.subject}" for row in removed]
+    lines += [f"Failed: {subjects[operation['id']]}" for operation in failed]
+    batch_description = f"Batch complete! {len(removed)} {done.lower()}, {len(failed)} failed.\n" + "\n".join(lines)
+
+    print("Batch has been processed.")
+    add_chat_response_to_history(batch_description)
+    reply('receiver', {'message': batch_description})
+
+    return batch_description
 
 
 @app.route("/update_server", methods=['POST'])
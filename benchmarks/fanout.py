@@ -0,0 +1,56 @@
+"""
+Cost of one 'receiver' message as connected clients grow: a broadcast
+(what the handlers used to do) against a ReplyChannel aimed at the
+sender's room.
+
+    python -m benchmarks.fanout --clients 10 100 1000 10000 --messages 200
+
+Clients are registered straight with the Socket.IO server's manager and
+packets are counted instead of written to sockets, so the numbers are the
+server-side encode and dispatch work per message.
+"""
+import argparse
+import time
+import socketio
+from reply_channel import ReplyChannel
+
+MESSAGE = {"message": "Event Created! Check your Google Calendar to confirm!"}
+
+
+def make_server(clients):
+    server = socketio.Server(async_mode="threading")
+    sids = [server.manager.connect(f"eio-{n}", "/") for n in range(clients)]
+    packets = [0]
+
+    def count(eio_sid, packet):
+        packets[0] += 1
+    server._send_eio_packet = count
+    return server, sids, packets
+
+
+def measure(send, packets, messages):
+    packets[0] = 0
+    start = time.perf_counter()
+    for _ in range(messages):
+        send()
+    elapsed = time.perf_counter() - start
+    return 1e6 * elapsed / messages, packets[0] / messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--messages", type=int, default=200, help="messages sent per measurement")
+    args = parser.parse_args()
+
+    print(f"{'clients':>8} {'broadcast us/msg':>17} {'packets/msg':>12} {'reply us/msg':>13} {'packets/msg':>12}")
+    for clients in args.clients:
+        server, sids, packets = make_server(clients)
+        channel = ReplyChannel(server.emit, sids[0])
+        broadcast_us, broadcast_packets = measure(lambda: server.emit("receiver", MESSAGE), packets, args.messages)
+        reply_us, reply_packets = measure(lambda: channel.send("receiver", MESSAGE), packets, args.messages)
+        print(f"{clients:>8} {broadcast_us:>17.1f} {broadcast_packets:>12.0f} {reply_us:>13.1f} {reply_packets:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Google round trips and wall time of the "write an email, then save it as
+a draft" flow, before and after the account identity moved onto Users.
+
+    python -m benchmarks.save_draft --drafts 20 --latency-ms 120
+
+The Gmail API is a fake that sleeps --latency-ms per request. Before,
+gmail_create, email_json_to_raw and the save handler each called
+users.getProfile. Now the sender comes from the Users row and the only
+request left is drafts.create.
+"""
+import argparse
+import time
+from email.message import EmailMessage
+from flask import Flask
+from db import db, Users
+from google_identity import sender_address
+
+
+class FakeRequest:
+    def __init__(self, gmail, name, result):
+        self.gmail = gmail
+        self.name = name
+        self.result = result
+
+    def execute(self):
+        time.sleep(self.gmail.latency)
+        self.gmail.calls[self.name] = self.gmail.calls.get(self.name, 0) + 1
+        return self.result
+
+
+class FakeGmail:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = {}
+
+    def users(self):
+        return self
+
+    def drafts(self):
+        return self
+
+    def getProfile(self, userId):
+        return FakeRequest(self, "users.getProfile", {"emailAddress": "ada@example.com"})
+
+    def create(self, userId, body):
+        return FakeRequest(self, "drafts.create", {"id": "draft-1"})
+
+
+def raw_message(sender, email_json):
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = email_json["to"]
+    message["Subject"] = email_json["subject"]
+    message.set_content(email_json["body"])
+    return message.as_string()
+
+
+def save_draft_before(gmail, user_id, email_json):
+    sender = gmail.users().getProfile(userId="me").execute()["emailAddress"]  # gmail_create
+    raw = raw_message(gmail.users().getProfile(userId="me").execute()["emailAddress"], email_json)  # email_json_to_raw
+    draft = gmail.users().drafts().create(userId="me", body={"message": {"raw": raw}}).execute()
+    saved_sender = gmail.users().getProfile(userId="me").execute()["emailAddress"]  # handle_approval_response
+    return sender, draft, saved_sender
+
+
+def save_draft_after(gmail, user_id, email_json):
+    user = db.session.get(Users, user_id)
+    sender = sender_address(user.google_email, user.google_name)
+    raw = raw_message(sender, email_json)
+    draft = gmail.users().drafts().create(userId="me", body={"message": {"raw": raw}}).execute()
+    return sender, draft, user.google_email
+
+
+def measure(flow, drafts, latency, user_id):
+    gmail = FakeGmail(latency)
+    email_json = {"to": "grace@example.com", "subject": "Standup", "body": "See you at 9."}
+    start = time.perf_counter()
+    for _ in range(drafts):
+        flow(gmail, user_id, email_json)
+    elapsed = time.perf_counter() - start
+    return 1000 * elapsed / drafts, sum(gmail.calls.values()) / drafts, gmail.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drafts", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=100, help="simulated Gmail API round trip")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        user = Users(name="ada", email="ada@example.com")
+        user.password = "x"
+        user.google_email, user.google_name = "ada@example.com", "Ada Lovelace"
+        db.session.add(user)
+        db.session.commit()
+
+        print(f"{args.drafts} drafts, {args.latency_ms} ms per Gmail request")
+        print(f"{'flow':<8} {'ms/draft':>9} {'requests/draft':>15}  requests")
+        for name, flow in (("before", save_draft_before), ("after", save_draft_after)):
+            ms, requests, calls = measure(flow, args.drafts, args.latency_ms / 1000, user.id)
+            print(f"{name:<8} {ms:>9.1f} {requests:>15.1f}  {calls}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Stand-in for app.py that benchmarks.socket_workers runs under gunicorn:
+each prompt costs the worker BENCH_WORK_MS of CPU (classifier, JSON,
+templating) and the reply goes to the socket's room, through
+SOCKETIO_MESSAGE_QUEUE when it is set, like the app's emits.
+"""
+import hashlib
+import os
+import time
+from flask import Flask, request
+from flask_socketio import SocketIO
+from socket_queue import make_client_manager
+
+WORK_MS = float(os.getenv("BENCH_WORK_MS", 5))
+
+app = Flask(__name__)
+socketio = SocketIO(app, client_manager=make_client_manager(os.getenv("SOCKETIO_MESSAGE_QUEUE")))
+
+
+def busy(ms):
+    deadline = time.perf_counter() + ms / 1000
+    digest = b""
+    while time.perf_counter() < deadline:
+        digest = hashlib.sha256(digest).digest()
+
+
+@socketio.on("user_prompt")
+def handle_user_prompt(prompt):
+    busy(WORK_MS)
+    socketio.emit("receiver", {"message": prompt}, to=request.sid)
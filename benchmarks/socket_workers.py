@@ -0,0 +1,135 @@
+"""
+Socket.IO prompt throughput with 1 to N gunicorn workers.
+
+Starts benchmarks.socket_app under gunicorn's gevent WebSocket worker for
+each worker count, connects --clients WebSocket clients (no sticky
+sessions, connections land on whichever worker accepts them) and has
+each send --prompts prompts, one at a time, waiting for the reply.
+
+    python -m benchmarks.socket_workers --workers 4 --clients 32 --prompts 50
+    python -m benchmarks.socket_workers --message-queue redis://localhost:6379/0
+
+With --message-queue every reply is published through the queue, as in a
+multi-worker deployment. Throughput only grows with workers up to the
+number of CPU cores.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import simple_websocket
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, port, message_queue, work_ms):
+    env = dict(os.environ, BENCH_WORK_MS=str(work_ms))
+    if message_queue:
+        env["SOCKETIO_MESSAGE_QUEUE"] = message_queue
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-k", "geventwebsocket.gunicorn.workers.GeventWebSocketWorker",
+         "-w", str(workers), "--bind", f"127.0.0.1:{port}", "--log-level", "warning", "benchmarks.socket_app:app"],
+        cwd=ROOT, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            # Give the remaining workers a moment to boot
+            time.sleep(0.5 + 0.2 * workers)
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("gunicorn did not start")
+
+
+def receive_event(ws, name):
+    # Socket.IO over raw Engine.IO: answer pings ("2") until the event arrives
+    while True:
+        message = ws.receive()
+        if message == "2":
+            ws.send("3")
+        elif message.startswith(f'42["{name}"'):
+            return message
+
+
+def run_client(url, prompts, latencies, errors, lock):
+    try:
+        ws = simple_websocket.Client(f"{url}/socket.io/?EIO=4&transport=websocket")
+        # Connect without waiting for the Engine.IO open packet: simple-websocket
+        # can sit on a frame that came in with the handshake until more data arrives
+        ws.send("40")
+        while not ws.receive().startswith("40"):
+            pass
+        for n in range(prompts):
+            start = time.perf_counter()
+            ws.send(f'42["user_prompt","prompt {n}"]')
+            receive_event(ws, "receiver")
+            with lock:
+                latencies.append(time.perf_counter() - start)
+        ws.close()
+    except Exception as e:
+        with lock:
+            errors.append(str(e))
+
+
+def run(workers, clients, prompts, message_queue, work_ms):
+    port = free_port()
+    server = start_server(workers, port, message_queue, work_ms)
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    try:
+        threads = [threading.Thread(target=run_client, args=(f"ws://127.0.0.1:{port}", prompts, latencies, errors,
+                                                             lock))
+                   for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    return {
+        "prompts": len(latencies),
+        "throughput": len(latencies) / elapsed,
+        "p95_ms": 1000 * latencies[int(len(latencies) * 0.95)] if latencies else 0,
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="largest worker count to try")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent WebSocket clients")
+    parser.add_argument("--prompts", type=int, default=50, help="prompts per client")
+    parser.add_argument("--work-ms", type=float, default=5, help="CPU time a worker spends per prompt")
+    parser.add_argument("--message-queue", help="Socket.IO message queue URL, e.g. redis://localhost:6379/0")
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients x {args.prompts} prompts, {args.work_ms} ms CPU per prompt, "
+          f"{os.cpu_count()} CPUs, queue: {args.message_queue or 'none'}")
+    print(f"{'workers':>8} {'prompts':>8} {'prompts/s':>10} {'speedup':>8} {'p95 ms':>8} {'errors':>7}")
+    baseline = None
+    for workers in range(1, args.workers + 1):
+        result = run(workers, args.clients, args.prompts, args.message_queue, args.work_ms)
+        baseline = baseline or result["throughput"]
+        print(f"{workers:>8} {result['prompts']:>8} {result['throughput']:>10.1f} "
+              f"{result['throughput'] / baseline:>7.2f}x {result['p95_ms']:>8.1f} {result['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import json
+import re
+import sys
+from datetime import datetime
+from relative_time import is_relative, resolve_times, to_spec
+
+
+# Nouns that name calendar items or drafts on their own ("cancel all meetings tomorrow")
+ITEM = r"(?:event|meeting|meet|call|appointment|invite|draft|email)"
+COUNT = r"(?:two|three|four|five|six|seven|eight|nine|ten|\d+)"
+# A plural of anything else needs "my"/"our" ("all my standups", "my three retros"),
+# so "dinner with 4 friends" or "meeting with all hands" stay single-item prompts
+OWN_PLURAL = r"(?:my|our)\s+(?:[\w:-]+\s+){0,2}[\w:-]+s"
+BULK_PATTERN = re.compile(
+    rf"\b(?:all|both)\s+(?:of\s+)?(?:{OWN_PLURAL}|(?:the\s+)?{ITEM}s)\b"
+    rf"|\b(?:every|each)\s+(?:of\s+{OWN_PLURAL}|{ITEM})\b"
+    rf"|\b(?:my|our|the|these|those)\s+{COUNT}\s+(?:[\w:-]+\s+)?(?!(?:minutes|mins|hours|hrs|days|weeks)\b)[\w:-]+s\b"
+    rf"|\b{COUNT}\s+(?:of\s+(?:my|our)\s+)?{ITEM}s\b")
+
+# Google accepts at most 50 calls in one batch request
+MAX_BATCH_SIZE = 50
+
+# Keys of the API response kept in event_dictionary/meet_dictionary
+DICTIONARY_KEYS = ("summary", "description", "start", "end", "attendees", "reminders")
+
+
+def is_bulk_prompt(prompt: str) -> bool:
+    return bool(BULK_PATTERN.search(prompt.lower()))
+
+
+def resolve_operation_times(operation: dict, start: datetime, end: datetime, time_zone: str, now=None) -> dict:
+    """
+    Replaces an operation's relative start/end specs (see relative_time)
+    with dateTimes in time_zone. What a spec leaves out comes from the
+    item's current start and end: its day, its time of day, its length.
+    """
+    if not (is_relative(operation.get("start")) or is_relative(operation.get("end"))):
+        return operation
+
+    current = to_spec(start, time_zone)
+    start_spec = {key: value for key, value in (operation.get("start") or {}).items() if value is not None}
+    if any(start_spec.get(key) for key in ("date", "weekday", "day_offset")):
+        start_spec = dict({"time": current.get("time")}, **start_spec)
+    else:
+        start_spec = dict(current, **start_spec)
+    end_spec = {key: value for key, value in (operation.get("end") or {}).items() if value is not None}
+    if not end_spec:
+        # A moved item keeps its length
+        end_spec = {"duration_minutes": int((end - start).total_seconds() // 60)}
+
+    times = resolve_times({"start": start_spec, "end": end_spec}, time_zone, now)
+    return dict(operation, start=times["start"]["dateTime"], end=times["end"]["dateTime"])
+
+
+def patch_body(operation: dict, time_zone: str) -> dict:
+    """
+    Only the fields the operation changes, in Calendar API format.
+    """
+    body = {}
+    for field in ("summary", "description"):
+        if operation.get(field):
+            body[field] = operation[field]
+    for field in ("start", "end"):
+        if operation.get(field):
+            body[field] = {"dateTime": operation[field], "timeZone": time_zone}
+    return body
+
+
+def build_request(service, operation: dict, time_zone: str, conference: bool = False):
+    if operation.get("action") == "remove":
+        return service.events().delete(calendarId='primary', eventId=operation["id"])
+    kwargs = {"conferenceDataVersion": 1} if conference else {}
+    return service.events().patch(calendarId='primary', eventId=operation["id"],
+                                  body=patch_body(operation, time_zone), **kwargs)
+
+
+def execute_batch(service, operations: list, time_zone: str, conference: bool = False) -> list:
+    """
+    Sends the operations as Calendar batch requests (one HTTP call per 50
+    operations). Returns (operation, response, error) for every operation.
+    """
+    results = {}
+
+    def callback(request_id, response, exception):
+        results[request_id] = (response, exception)
+
+    for offset in range(0, len(operations), MAX_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=callback)
+        for index, operation in enumerate(operations[offset:offset + MAX_BATCH_SIZE], start=offset):
+            batch.add(build_request(service, operation, time_zone, conference), request_id=str(index))
+        batch.execute()
+
+    return [(operation, *results.get(str(index), (None, None))) for index, operation in enumerate(operations)]
+
+
+def reconcile(session, user_id, model, fields: dict, results: list):
+    """
+    Applies the successful operations to the user's local rows in one transaction.
+    fields maps 'id', 'summary' and 'dictionary' to the model's column names.
+    Returns (updated rows, removed rows, failed operations).
+    """
+    id_column = getattr(model, fields["id"])
+    ids = [operation["id"] for operation, _, error in results if error is None]
+    rows = {getattr(row, fields["id"]): row for row in
+            model.query.filter(model.user_id == user_id, id_column.in_(ids)).all()} if ids else {}
+
+    updated, removed, failed = [], [], []
+    try:
+        for operation, response, error in results:
+            row = rows.get(operation["id"])
+            if error is not None or row is None:
+                failed.append(operation)
+                if error is not None:
+                    print(f"Batch operation on {operation['id']} failed: {error}", file=sys.stderr)
+                continue
+
+            if operation.get("action") == "remove":
+                session.delete(row)
+                removed.append(row)
+                continue
+
+            if operation.get("summary"):
+                setattr(row, fields["summary"], operation["summary"])
+            if operation.get("description"):
+                row.description = operation["description"]
+            if operation.get("start"):
+                row.start = operation["start"]
+            if operation.get("end"):
+                row.end = operation["end"]
+            if response:
+                row.link = response.get("htmlLink", row.link)
+                dictionary = {key: response[key] for key in DICTIONARY_KEYS if key in response}
+                setattr(row, fields["dictionary"], json.dumps(dictionary))
+            updated.append(row)
+
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    return updated, removed, failed
@@ -0,0 +1,158 @@
+import json
+import sys
+from datetime import date, datetime, time, timezone
+from zoneinfo import ZoneInfo
+from googleapiclient.errors import HttpError
+from calendar_batch import DICTIONARY_KEYS
+from db import Events, Meets, SyncState
+
+
+PAGE_SIZE = 250
+# Keep IN (...) lists well under SQLite's variable limit
+CHUNK_SIZE = 500
+
+
+def list_events(service, sync_token=None):
+    """
+    Pages through events.list. Without a sync token this is the full
+    listing, with one it only returns what changed since. Returns
+    (items, next_sync_token).
+    """
+    items = []
+    page_token = None
+    while True:
+        kwargs = {"calendarId": "primary", "maxResults": PAGE_SIZE, "pageToken": page_token}
+        if sync_token:
+            kwargs["syncToken"] = sync_token
+        response = service.events().list(**kwargs).execute()
+        items.extend(response.get("items", []))
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return items, response.get("nextSyncToken")
+
+
+def is_meet(item: dict) -> bool:
+    return bool(item.get("hangoutLink") or item.get("conferenceData"))
+
+
+def event_time(item: dict, key: str, time_zone=None) -> str:
+    # All-day events only carry a date, they start at midnight in the user's zone
+    value = item.get(key) or {}
+    if value.get("dateTime") or not value.get("date"):
+        return value.get("dateTime") or ""
+    zone = ZoneInfo(value.get("timeZone") or time_zone or "UTC")
+    return datetime.combine(date.fromisoformat(value["date"]), time(), zone).isoformat()
+
+
+def apply_item(row, item: dict, time_zone=None):
+    dictionary = {key: item[key] for key in DICTIONARY_KEYS if key in item}
+    row.description = item.get("description", "")
+    row.start = event_time(item, "start", time_zone)
+    row.end = event_time(item, "end", time_zone)
+    row.link = item.get("htmlLink", "")
+    if isinstance(row, Meets):
+        row.summary = item.get("summary", "(No title)")
+        row.attendees = json.dumps([{"email": a["email"]} for a in item.get("attendees", []) if a.get("email")])
+        row.meet_dictionary = json.dumps(dictionary)
+    else:
+        row.title = item.get("summary", "(No title)")
+        row.event_dictionary = json.dumps(dictionary)
+
+
+def upsert_items(session, user_id, items: list, time_zone=None):
+    """
+    Bulk upserts API events into Events/Meets keyed by event_id/meet_id.
+    Events with a Meet link go to Meets, cancelled events are deleted.
+    All-day dates are placed in time_zone (UTC if None). Returns
+    (upserted, deleted) counts. Does not commit.
+    """
+    upserted = deleted = 0
+    for offset in range(0, len(items), CHUNK_SIZE):
+        chunk = items[offset:offset + CHUNK_SIZE]
+        ids = [item["id"] for item in chunk]
+        events = {row.event_id: row for row in
+                  Events.query.filter(Events.user_id == user_id, Events.event_id.in_(ids)).all()}
+        meets = {row.meet_id: row for row in
+                 Meets.query.filter(Meets.user_id == user_id, Meets.meet_id.in_(ids)).all()}
+
+        for item in chunk:
+            event_id = item["id"]
+            existing_event = events.get(event_id)
+            existing_meet = meets.get(event_id)
+
+            if item.get("status") == "cancelled":
+                for row in (existing_event, existing_meet):
+                    if row is not None:
+                        session.delete(row)
+                        deleted += 1
+                continue
+
+            # An event can gain or lose its Meet link, move it between tables
+            if is_meet(item):
+                if existing_event is not None:
+                    session.delete(existing_event)
+                row = existing_meet or Meets(user_id=user_id, meet_id=event_id)
+            else:
+                if existing_meet is not None:
+                    session.delete(existing_meet)
+                row = existing_event or Events(user_id=user_id, event_id=event_id)
+
+            apply_item(row, item, time_zone)
+            session.add(row)
+            upserted += 1
+
+    return upserted, deleted
+
+
+def delete_missing(session, user_id, items: list) -> int:
+    """
+    After a full listing, deletes the user's Events/Meets rows that are not
+    in it: events removed while the sync token was invalid, or before the
+    first sync. Returns the count. Does not commit.
+    """
+    listed = {item["id"] for item in items if item.get("status") != "cancelled"}
+    deleted = 0
+    for model, id_attr in ((Events, "event_id"), (Meets, "meet_id")):
+        for row in model.query.filter(model.user_id == user_id).all():
+            if getattr(row, id_attr) not in listed:
+                session.delete(row)
+                deleted += 1
+    return deleted
+
+
+def sync_calendar(session, service, user_id, full=False, time_zone=None) -> dict:
+    """
+    Pulls the user's calendar into the local mirror. The first run (or a
+    full=True run, or an expired sync token) lists everything and rebuilds
+    the mirror from it, later runs only fetch the delta since the stored
+    syncToken. time_zone is the user's, for all-day events.
+    """
+    state = SyncState.query.filter_by(user_id=user_id).first()
+    if state is None:
+        state = SyncState(user_id=user_id)
+        session.add(state)
+
+    sync_token = None if full else state.calendar_sync_token
+    try:
+        items, next_sync_token = list_events(service, sync_token)
+    except HttpError as e:
+        # 410 Gone means the sync token expired, start over with a full sync
+        if sync_token and e.resp.status == 410:
+            print(f"Sync token expired for user {user_id}, running a full sync", file=sys.stderr)
+            sync_token = None
+            items, next_sync_token = list_events(service)
+        else:
+            raise
+
+    try:
+        upserted, deleted = upsert_items(session, user_id, items, time_zone)
+        if sync_token is None:
+            deleted += delete_missing(session, user_id, items)
+        state.calendar_sync_token = next_sync_token
+        state.calendar_synced_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    return {"full": sync_token is None, "upserted": upserted, "deleted": deleted}
@@ -0,0 +1,289 @@
+import math
+import re
+import time
+from collections import Counter, defaultdict
+
+
+UNKNOWN = {"event_type": "unknown", "mode": "unknown"}
+
+LABELS = [
+    ("gcal", "create"), ("gcal", "update"), ("gcal", "remove"),
+    ("gmeet", "create"), ("gmeet", "update"), ("gmeet", "remove"),
+    ("gmail", "create"), ("gmail", "send"), ("gmail", "delete"),
+]
+
+# Seed corpus so the model is usable before any History rows exist
+SEED_EXAMPLES = [
+    ("add a dentist appointment to my calendar tomorrow at 3pm", ("gcal", "create")),
+    ("I have a networking event tomorrow at 5pm, put it on my calendar", ("gcal", "create")),
+    ("schedule a study session on friday from 2 to 4", ("gcal", "create")),
+    ("remind me to pick up groceries saturday morning", ("gcal", "create")),
+    ("block off my calendar next monday for the conference", ("gcal", "create")),
+    ("move my dentist appointment to thursday", ("gcal", "update")),
+    ("reschedule the study session to 6pm", ("gcal", "update")),
+    ("change the title of my gym event to leg day", ("gcal", "update")),
+    ("push my calendar event for lunch back an hour", ("gcal", "update")),
+    ("cancel my dentist appointment", ("gcal", "remove")),
+    ("remove the gym event from my calendar", ("gcal", "remove")),
+    ("delete my lunch event on friday", ("gcal", "remove")),
+    ("set up a google meet with brooke tomorrow at 5pm", ("gmeet", "create")),
+    ("create a video call with the team to discuss the roadmap", ("gmeet", "create")),
+    ("start a virtual meeting with john@example.com on monday", ("gmeet", "create")),
+    ("invite sam@example.com to a google meeting about the launch", ("gmeet", "create")),
+    ("add alex@example.com to my google meet with brooke", ("gmeet", "update")),
+    ("move the video call with the team to 4pm", ("gmeet", "update")),
+    ("reschedule my google meeting about the launch to next week", ("gmeet", "update")),
+    ("cancel the google meet with brooke", ("gmeet", "remove")),
+    ("remove my video call with the team", ("gmeet", "remove")),
+    ("delete the virtual meeting about the roadmap", ("gmeet", "remove")),
+    ("write an email to john@example.com about the project update", ("gmail", "create")),
+    ("draft an email to my professor asking for an extension", ("gmail", "create")),
+    ("create an email to send to example@gmail.com about the meeting", ("gmail", "create")),
+    ("compose a thank you email to the recruiter", ("gmail", "create")),
+    ("send my draft to the recruiter", ("gmail", "send")),
+    ("send the email draft about the project update", ("gmail", "send")),
+    ("go ahead and send my saved email to my professor", ("gmail", "send")),
+    ("delete my draft to the recruiter", ("gmail", "delete")),
+    ("remove the email draft about the project update", ("gmail", "delete")),
+    ("discard my saved email to my professor", ("gmail", "delete")),
+]
+
+SERVICE_PATTERNS = {
+    "gmail": re.compile(r"\b(e-?mails?|gmail|drafts?|inbox)\b"),
+    "gmeet": re.compile(r"\b(google meet(ing)?s?|gmeet|meet link|video (call|chat|meeting)s?|virtual meetings?)\b"),
+    "gcal": re.compile(r"\b(calendar|events?|appointments?|reminders?|remind me)\b"),
+}
+
+MODE_PATTERNS = {
+    "remove": re.compile(r"\b(cancel|delete|remove|discard|trash|get rid of)\b"),
+    "update": re.compile(r"\b(move|reschedule|change|update|rename|postpone|push|edit|shift|modify)\b"),
+    "create": re.compile(r"\b(create|add|schedule|set up|book|plan|make|write|compose|put)\b"),
+    "send": re.compile(r"\bsend\b"),
+}
+
+# Create verbs that also edit an existing item ("make my dentist appointment an hour later")
+AMBIGUOUS_CREATE = re.compile(r"\b(add|make|put|plan)\b")
+UNAMBIGUOUS_CREATE = re.compile(r"\b(create|schedule|set up|book|write|compose)\b")
+# "my dentist appointment", "to the google meet with brooke", not "my calendar"
+EXISTING_ITEM = re.compile(
+    r"\b(my|our|the|this|that)\s+(?:[\w@.-]+\s+){0,2}?"
+    r"(events?|appointments?|reminders?|meet(ing)?s?|calls?|chats?|e-?mails?|drafts?)\b"
+)
+# "send my draft", "send the saved email", not "send an email to john@x.com"
+DRAFT_REFERENCE = re.compile(r"\b(drafts?|saved|(my|the|this|that)\s+(e-?mail|message))\b")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9@.']+")
+
+
+def tokenize(text: str) -> list:
+    """
+    Lowercases and splits a prompt into unigram and bigram features.
+    """
+    words = TOKEN_PATTERN.findall(text.lower())
+    # Collapse email addresses and times so they generalize across prompts
+    words = ["<email>" if "@" in w else "<num>" if w[0].isdigit() else w.strip(".'") for w in words]
+    words = [w for w in words if w]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def rule_classify(message: str):
+    """
+    Keyword/regex rules. Returns a (event_type, mode) label only when
+    exactly one service and one mode are mentioned, otherwise None. Add,
+    make, put and plan on an existing item and sends that don't point at a
+    draft are left to the model.
+    """
+    text = message.lower()
+    services = [s for s, pattern in SERVICE_PATTERNS.items() if pattern.search(text)]
+    modes = [m for m, pattern in MODE_PATTERNS.items() if pattern.search(text)]
+    if ("create" in modes and EXISTING_ITEM.search(text) and AMBIGUOUS_CREATE.search(text)
+            and not UNAMBIGUOUS_CREATE.search(text)):
+        modes.remove("create")
+
+    if len(services) != 1:
+        return None
+    service = services[0]
+
+    if service == "gmail":
+        # "write an email to send to x" is a create, not a send
+        if "create" in modes and "send" in modes:
+            modes.remove("send")
+        modes = ["delete" if m == "remove" else m for m in modes if m != "update"]
+        # A recipient or address without a draft is a new email, not a saved one to send
+        if modes == ["send"] and not DRAFT_REFERENCE.search(text):
+            return None
+    else:
+        modes = [m for m in modes if m != "send"]
+
+    if len(modes) != 1:
+        return None
+    return service, modes[0]
+
+
+class IntentModel:
+    """
+    The TF-IDF vocabulary and logistic regression weights of one fit.
+    """
+
+    def __init__(self, idf: dict):
+        self.idf = idf
+        self.weights = {label: defaultdict(float) for label in LABELS}
+        self.bias = {label: 0.0 for label in LABELS}
+
+    def vectorize(self, text: str) -> dict:
+        counts = Counter(tokenize(text))
+        vector = {f: (1 + math.log(c)) * self.idf[f] for f, c in counts.items() if f in self.idf}
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {f: v / norm for f, v in vector.items()}
+
+    def probs_for_vector(self, vector: dict) -> dict:
+        scores = {label: self.bias[label] + sum(self.weights[label].get(f, 0.0) * v for f, v in vector.items())
+                  for label in LABELS}
+        top = max(scores.values())
+        exps = {label: math.exp(s - top) for label, s in scores.items()}
+        total = sum(exps.values())
+        return {label: e / total for label, e in exps.items()}
+
+
+class IntentClassifier:
+    """
+    Local fast-path in front of the LLM intent call: regex rules first, then
+    a TF-IDF + multinomial logistic regression model. classify() returns None
+    when neither is confident enough, and the caller should ask the LLM.
+    """
+
+    def __init__(self, threshold=0.8, epochs=60, learning_rate=1.0, l2=1e-4, max_extra_examples=2000):
+        self.threshold = threshold
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.model = None
+        # LLM labels by prompt, the oldest go first past max_extra_examples
+        self.extra_examples = {}
+        self.max_extra_examples = max_extra_examples
+        # Examples learned since the last fit started
+        self.new_examples = 0
+        self.fit_requested = False
+        self.stats = {
+            "requests": 0,
+            "rule_hits": 0,
+            "model_hits": 0,
+            "llm_fallbacks": 0,
+            "local_seconds": 0.0,
+            "llm_seconds": 0.0,
+        }
+
+    @property
+    def trained(self) -> bool:
+        return self.model is not None
+
+    def predict_proba(self, text: str) -> dict:
+        model = self.model
+        return model.probs_for_vector(model.vectorize(text))
+
+    def fit(self, prompts):
+        """
+        Trains on the seed corpus, labels learned from LLM fallbacks and any
+        stored prompts (e.g. History.user_prompt) that the rules can label.
+        The new model replaces the current one only once it is trained, so
+        classify() can keep running meanwhile (e.g. from another thread).
+        """
+        self.new_examples = 0
+        self.fit_requested = True
+        examples = list(SEED_EXAMPLES) + list(dict(self.extra_examples).items())
+        for prompt in prompts:
+            label = rule_classify(prompt)
+            if label:
+                examples.append((prompt, label))
+
+        doc_freq = Counter()
+        for text, _ in examples:
+            doc_freq.update(set(tokenize(text)))
+        n = len(examples)
+        model = IntentModel({f: math.log((1 + n) / (1 + df)) + 1 for f, df in doc_freq.items()})
+        vectors = [(model.vectorize(text), label) for text, label in examples]
+
+        for epoch in range(self.epochs):
+            rate = self.learning_rate / (1 + epoch * 0.1)
+            for vector, label in vectors:
+                probs = model.probs_for_vector(vector)
+                for candidate in LABELS:
+                    gradient = probs[candidate] - (1.0 if candidate == label else 0.0)
+                    weights = model.weights[candidate]
+                    for f, v in vector.items():
+                        weights[f] -= rate * (gradient * v + self.l2 * weights[f])
+                    model.bias[candidate] -= rate * gradient
+
+        self.model = model
+        return len(examples)
+
+    def first_fit_due(self) -> bool:
+        """
+        True for the first caller only while no fit was started, so a process
+        trains once it is asked to classify rather than when it starts.
+        """
+        if self.fit_requested:
+            return False
+        self.fit_requested = True
+        return True
+
+    def retrain_due(self, every: int) -> bool:
+        """
+        True once every new examples were learned since the last fit. The
+        count starts over, so the caller starts one fit per batch.
+        """
+        if self.new_examples < every:
+            return False
+        self.new_examples = 0
+        return True
+
+    def classify(self, message: str):
+        """
+        Returns {'event_type', 'mode'} when confidently classified locally,
+        otherwise None.
+        """
+        start = time.perf_counter()
+        self.stats["requests"] += 1
+        result = None
+
+        label = rule_classify(message)
+        if label:
+            self.stats["rule_hits"] += 1
+            result = {"event_type": label[0], "mode": label[1]}
+        elif self.trained:
+            probs = self.predict_proba(message)
+            label, confidence = max(probs.items(), key=lambda item: item[1])
+            if confidence >= self.threshold:
+                self.stats["model_hits"] += 1
+                result = {"event_type": label[0], "mode": label[1]}
+
+        self.stats["local_seconds"] += time.perf_counter() - start
+        if result is None:
+            self.stats["llm_fallbacks"] += 1
+        return result
+
+    def record_fallback(self, message: str, result: dict, elapsed: float):
+        """
+        Records an LLM classification so it can be learned on the next fit().
+        """
+        self.stats["llm_seconds"] += elapsed
+        label = (result.get("event_type"), result.get("mode"))
+        if label not in LABELS:
+            return
+        # Repeated prompts are kept once, with their latest label
+        previous = self.extra_examples.pop(message, None)
+        self.extra_examples[message] = label
+        if previous != label:
+            self.new_examples += 1
+        while len(self.extra_examples) > self.max_extra_examples:
+            del self.extra_examples[next(iter(self.extra_examples))]
+
+    def report(self) -> dict:
+        stats = dict(self.stats)
+        requests = stats["requests"] or 1
+        local_hits = stats["rule_hits"] + stats["model_hits"]
+        stats["llm_calls_avoided"] = local_hits
+        stats["hit_rate"] = local_hits / requests
+        stats["avg_local_us"] = stats["local_seconds"] / requests * 1e6
+        stats["avg_llm_ms"] = stats["llm_seconds"] / (stats["llm_fallbacks"] or 1) * 1e3
+        return stats
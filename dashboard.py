@@ -0,0 +1,153 @@
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from cachetools import TTLCache
+from sqlalchemy import event, update
+from db import Events, Meets, Emails, Users, format_datetime
+
+
+LIMIT = 10
+PREVIEW_LENGTH = 20
+
+
+def event_card(row) -> dict:
+    return {"id": row.id, "title": row.title, "description": row.description,
+            "start": format_datetime(row.start), "end": format_datetime(row.end), "link": row.link}
+
+
+def meet_card(row) -> dict:
+    return {"id": row.id, "title": row.summary, "description": row.description,
+            "start": format_datetime(row.start), "end": format_datetime(row.end), "link": row.link}
+
+
+def draft_card(row) -> dict:
+    return {"id": row.id, "subject": row.subject, "to": row.to, "preview": row.body[:PREVIEW_LENGTH],
+            "link": row.link}
+
+
+# Rows shown on the dashboard: the section they are listed in and their card
+SECTIONS = {Events: ("events", event_card), Meets: ("meets", meet_card), Emails: ("drafts", draft_card)}
+
+
+def dashboard_data(user_id, now=None, limit=LIMIT) -> dict:
+    """
+    Upcoming (or still running) events and meets, soonest first, and the
+    saved drafts, as plain dicts for the page and /api/dashboard.
+    """
+    now = now or datetime.now(timezone.utc)
+    events = Events.query.filter(Events.user_id == user_id, Events.end >= now) \
+        .order_by(Events.start).limit(limit).all()
+    meets = Meets.query.filter(Meets.user_id == user_id, Meets.end >= now) \
+        .order_by(Meets.start).limit(limit).all()
+    drafts = Emails.query.filter_by(user_id=user_id).order_by(Emails.id.desc()).limit(limit).all()
+    return {
+        "events": [event_card(row) for row in events],
+        "meets": [meet_card(row) for row in meets],
+        "drafts": [draft_card(row) for row in drafts],
+    }
+
+
+def dashboard_version(user_id) -> int:
+    """
+    The user's dashboard_version, see track_versions.
+    """
+    return Users.query.with_entities(Users.dashboard_version).filter_by(id=user_id).scalar() or 0
+
+
+class DashboardCache:
+    """
+    Per-user cache of the serialized dashboard and its ETag, stored with the
+    user's dashboard_version. An entry is only returned for the version it
+    was built from, so commits in other processes retire it too. Entries are
+    also dropped when this process changes the rows (see watch_changes) and
+    expire after ttl seconds anyway, since "upcoming" moves with the clock.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, timer=time.monotonic):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl, timer=timer)
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, user_id, version=0):
+        """
+        (etag, body) for the user at version, or None.
+        """
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and entry[0] != version:
+                entry = None
+            self.stats["hits" if entry is not None else "misses"] += 1
+            return entry[1:] if entry is not None else None
+
+    def set(self, user_id, data, version=0):
+        body = json.dumps(data, sort_keys=True, separators=(",", ":"))
+        etag = hashlib.sha1(body.encode("utf-8")).hexdigest()
+        with self.lock:
+            self.entries[user_id] = (version, etag, body)
+        return etag, body
+
+    def invalidate(self, user_ids):
+        with self.lock:
+            for user_id in user_ids:
+                if self.entries.pop(user_id, None) is not None:
+                    self.stats["invalidations"] += 1
+
+
+def row_changes(session) -> dict:
+    """
+    {user_id: [diff, ...]} for the dashboard rows a flush wrote. A diff is
+    {"section", "op": "added"/"updated"/"removed", "id"}, plus the new
+    "item" card unless it was removed.
+    """
+    changes = {}
+    for op, rows in (("added", session.new), ("updated", session.dirty), ("removed", session.deleted)):
+        for row in rows:
+            if type(row) not in SECTIONS or (op == "updated" and not session.is_modified(row)):
+                continue
+            section, card = SECTIONS[type(row)]
+            diff = {"section": section, "op": op, "id": row.id}
+            if op != "removed":
+                diff["item"] = card(row)
+            changes.setdefault(row.user_id, []).append(diff)
+    return changes
+
+
+def watch_changes(session, on_change):
+    """
+    Calls on_change({user_id: [diff, ...]}) after each commit that added,
+    changed or deleted dashboard rows, in the order they were flushed.
+    Changes that are rolled back are forgotten. Bulk Query.update() and
+    delete() bypass the session and are not seen.
+    """
+    key = object()  # each watcher collects separately in session.info
+
+    @event.listens_for(session, "after_flush")
+    def collect(session, flush_context):
+        collected = session.info.setdefault(key, {})
+        for user_id, diffs in row_changes(session).items():
+            collected.setdefault(user_id, []).extend(diffs)
+
+    @event.listens_for(session, "after_commit")
+    def notify(session):
+        changes = session.info.pop(key, None)
+        if changes:
+            on_change(changes)
+
+    @event.listens_for(session, "after_rollback")
+    def forget(session):
+        session.info.pop(key, None)
+
+
+def track_versions(session):
+    """
+    Bumps users.dashboard_version within each flush that adds, changes or
+    deletes dashboard rows, so the bump commits or rolls back with them.
+    """
+    @event.listens_for(session, "after_flush")
+    def bump(session, flush_context):
+        user_ids = [user_id for user_id in row_changes(session) if user_id is not None]
+        if user_ids:
+            session.connection().execute(update(Users).where(Users.id.in_(user_ids))
+                                         .values(dashboard_version=Users.dashboard_version + 1))
@@ -0,0 +1,87 @@
+from flask_migrate import upgrade
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+DEFAULT_URL = "sqlite:///plan-it.db"
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def database_url(url: str = None) -> str:
+    """
+    DATABASE_URL or the local SQLite file. Accepts the postgres:// form
+    some hosts hand out, which SQLAlchemy no longer does.
+    """
+    url = url or DEFAULT_URL
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def is_sqlite_memory(url: str) -> bool:
+    return is_sqlite(url) and make_url(url).database in (None, "", ":memory:")
+
+
+def engine_options(url: str, pool_size=5, max_overflow=10, pool_recycle=1800, pool_timeout=30,
+                   busy_timeout=5000) -> dict:
+    """
+    create_engine() options for the backend. Server databases get a pool
+    that pre-pings and recycles connections. SQLite gets a busy timeout so
+    writers wait for the lock instead of failing with "database is locked".
+    """
+    if not is_sqlite(url):
+        return {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_pre_ping": True,
+            "pool_recycle": pool_recycle,
+            "pool_timeout": pool_timeout,
+        }
+
+    options = {"connect_args": {"timeout": busy_timeout / 1000, "check_same_thread": False}}
+    # In-memory databases live on a single connection, there is nothing to pool
+    if not is_sqlite_memory(url):
+        options.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+    return options
+
+
+def sqlite_pragmas(busy_timeout=5000, synchronous="NORMAL", wal=True) -> list:
+    synchronous = synchronous.upper()
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f"Unknown SQLite synchronous mode {synchronous}")
+    pragmas = [f"PRAGMA busy_timeout = {int(busy_timeout)}", f"PRAGMA synchronous = {synchronous}"]
+    # WAL lets readers run alongside the writer, NORMAL only fsyncs at checkpoints
+    if wal:
+        pragmas.insert(0, "PRAGMA journal_mode = WAL")
+    return pragmas
+
+
+def install_sqlite_pragmas(engine, busy_timeout=5000, synchronous="NORMAL", wal=True):
+    """
+    Applies the pragmas to every new connection. Has to run before the
+    engine's first connect. Does nothing for other backends.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = sqlite_pragmas(busy_timeout, synchronous, wal)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def upgrade_schema(db, directory=None):
+    """
+    Runs the migrations up to head. On a database created by create_all()
+    before migrations existed, the initial revision only adds the tables it
+    lacks, and the later revisions bring the rest up to date. Needs an app
+    context.
+    """
+    upgrade(directory=directory)
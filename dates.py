@@ -0,0 +1,265 @@
+import re
+from datetime import date, datetime, time, timedelta
+from relative_time import WEEKDAYS, next_weekday, to_spec
+
+
+MONTHS = {"jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6, "jul": 7, "aug": 8, "sep": 9, "oct": 10,
+          "nov": 11, "dec": 12}
+MONTH = r"(january|jan|february|feb|march|mar|april|apr|may|june|jun|july|jul|august|aug|september|sept|sep|" \
+        r"october|oct|november|nov|december|dec)\.?"
+WEEKDAY = r"(monday|mon|tuesday|tues|tue|wednesday|wed|thursday|thurs|thur|thu|friday|fri|saturday|sunday)"
+NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+                "eight": 8, "nine": 9, "ten": 10, "fifteen": 15, "twenty": 20, "thirty": 30, "forty": 40,
+                "forty-five": 45, "ninety": 90}
+NUMBER = r"(\d+(?:\.\d+)?|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r")"
+CLOCK = r"(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)?"
+# Hour a part of the day stands for when no time is given
+PARTS_OF_DAY = {"morning": 9, "noon": 12, "midday": 12, "afternoon": 14, "evening": 18, "tonight": 19,
+                "midnight": 0}
+# Bare hours up to this one are read as pm ("at 3" is 15:00)
+LAST_PM_HOUR = 7
+
+ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+MONTH_DAY = re.compile(rf"\b{MONTH}\s+(\d{{1,2}})(?:st|nd|rd|th)?\b(?:,?\s+(\d{{4}}))?")
+DAY_MONTH = re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?{MONTH}(?:,?\s+(\d{{4}}))?\b")
+SLASH_DATE = re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2}|\d{4}))?\b")
+RELATIVE_DAY = re.compile(r"\b(the day after tomorrow|day after tomorrow|tomorrow|today|tonight|yesterday)\b")
+IN_DAYS = re.compile(rf"\bin\s+{NUMBER}\s+(days?|weeks?)\b")
+NEXT_WEEK = re.compile(r"\bnext\s+week\b")
+ON_WEEKDAY = re.compile(rf"\b(?:(next|this|on)\s+)?{WEEKDAY}\b")
+IN_TIME = re.compile(rf"\bin\s+{NUMBER}\s+(hours?|hrs?|minutes?|mins?)\b")
+DURATION = re.compile(rf"\bfor\s+(?:(half an hour)|(an hour and a half)|{NUMBER}\s*(hours?|hrs?|h|minutes?|mins?|m)\b"
+                      rf"(?:\s+and\s+(\d+)\s*(?:minutes?|mins?))?)")
+LENGTH = re.compile(r"\b(\d+)[-\s](minute|min|hour|hr)s?\b(?!\s+(?:before|after|later|ago|early))")
+TIME_RANGE = re.compile(rf"\b(?:from\s+|between\s+)?{CLOCK}\s*(?:-|–|to|until|till|and)\s*{CLOCK}(?![\d/])")
+MERIDIEM_TIME = re.compile(r"\b(?:at\s+|@\s*)?(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)")
+COLON_TIME = re.compile(r"\b(?:at\s+|@\s*)?(\d{1,2}):(\d{2})\b")
+AT_HOUR = re.compile(r"\b(?:at|@)\s*(\d{1,2})(?:\s*o'?clock)?(?=\s*$|\s*[,.;!?]|\s+(?:on|tomorrow|today|tonight|"
+                     r"next|this|for|with|in|to|until|and|every|about)\b)")
+PART_OF_DAY = re.compile(r"\b(?:(?:in the|this)\s+)?(morning|noon|midday|afternoon|evening|tonight|midnight)\b")
+# Where an update prompt names the new time ("move my 3pm meeting to 5pm"), not "add ada to my 3pm meeting"
+CHANGE_TARGET = re.compile(r"\b(to|until|till)\b(?!\s+(?:my|our|your|their|the|an?)\b)|(→|->)")
+
+
+def number(word: str) -> float:
+    return NUMBER_WORDS[word] if word in NUMBER_WORDS else float(word)
+
+
+def clock(hour, minute, meridiem, bare_pm=True):
+    """
+    time for a matched clock. Without am/pm, hours up to LAST_PM_HOUR
+    are taken as afternoon ones, unless written 24h style ("07:30").
+    """
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem:
+        if hour > 12:
+            return None
+        hour = hour % 12 + (12 if meridiem.startswith("p") else 0)
+    elif bare_pm and 1 <= hour <= LAST_PM_HOUR:
+        hour += 12
+    if hour > 23 or minute > 59:
+        return None
+    return time(hour, minute)
+
+
+def calendar_date(year, month, day, today: date, past_days=0):
+    # Dates without a year are the next time that day comes around, or up to past_days back
+    try:
+        found = date(int(year) if year else today.year, month, day)
+    except ValueError:
+        return None
+    if not year and found < today - timedelta(days=past_days):
+        found = found.replace(year=found.year + 1)
+    return found
+
+
+def is_time_range(match) -> bool:
+    # "2 to 3 people" is not a range, one side needs am/pm or minutes
+    return any(match.group(group) for group in (2, 3, 5, 6))
+
+
+def parse_when(text: str, now: datetime, past_days=0):
+    """
+    Finds when a scheduling prompt is about, relative to now (aware, in
+    the user's time zone). past_days lets dates and weekdays point back
+    in time, to find existing events. Returns None when it names no date,
+    time or length, otherwise a dict with:
+        date      the day, or None when only a time was given
+        time      the start time, or None
+        end_time  the end of a range ("9-10am"), or None
+        duration  a timedelta ("for 45 minutes"), or None
+        moment    an exact start ("in 2 hours"), or None
+        spans     the (start, end) character ranges that were used
+    """
+    lowered = text.lower()
+    when = {"date": None, "time": None, "end_time": None, "duration": None, "moment": None, "spans": []}
+    today = now.date()
+
+    def use(match):
+        # Each match is blanked out so later, looser patterns can't reuse its digits
+        nonlocal lowered
+        if match:
+            when["spans"].append(match.span())
+            lowered = lowered[:match.start()] + " " * (match.end() - match.start()) + lowered[match.end():]
+        return match
+
+    def take(pattern):
+        return use(pattern.search(lowered))
+
+    if match := take(IN_TIME):
+        unit = 60 if match.group(2).startswith("h") else 1
+        when["moment"] = now + timedelta(minutes=number(match.group(1)) * unit)
+
+    if match := take(DURATION):
+        if match.group(1):
+            minutes = 30
+        elif match.group(2):
+            minutes = 90
+        else:
+            unit = 60 if match.group(4).startswith("h") else 1
+            minutes = number(match.group(3)) * unit + int(match.group(5) or 0)
+        when["duration"] = timedelta(minutes=minutes)
+    elif match := take(LENGTH):
+        when["duration"] = timedelta(minutes=int(match.group(1)) * (60 if match.group(2).startswith("h") else 1))
+
+    if match := take(ISO_DATE):
+        when["date"] = calendar_date(match.group(1), int(match.group(2)), int(match.group(3)), today, past_days)
+    elif match := take(MONTH_DAY):
+        when["date"] = calendar_date(match.group(3), MONTHS[match.group(1)[:3]], int(match.group(2)), today, past_days)
+    elif match := take(DAY_MONTH):
+        when["date"] = calendar_date(match.group(3), MONTHS[match.group(2)[:3]], int(match.group(1)), today, past_days)
+    elif match := take(SLASH_DATE):
+        year = match.group(3)
+        year = f"20{year}" if year and len(year) == 2 else year
+        when["date"] = calendar_date(year, int(match.group(1)), int(match.group(2)), today, past_days)
+    elif match := take(RELATIVE_DAY):
+        offset = {"today": 0, "tonight": 0, "tomorrow": 1, "yesterday": -1}.get(match.group(1), 2)
+        when["date"] = today + timedelta(days=offset)
+        if match.group(1) == "tonight":
+            when["time"] = time(PARTS_OF_DAY["tonight"])
+    elif match := take(IN_DAYS):
+        days = number(match.group(1)) * (7 if match.group(2).startswith("w") else 1)
+        when["date"] = today + timedelta(days=int(days))
+    elif match := take(ON_WEEKDAY):
+        weekday = next(index for index, name in enumerate(WEEKDAYS) if name.startswith(match.group(2)[:3]))
+        # Looking back, "friday" on a friday is today's
+        this = match.group(1) == "this" or (past_days > 0 and match.group(1) != "next")
+        when["date"] = next_weekday(today, weekday, this)
+    elif match := take(NEXT_WEEK):
+        when["date"] = today + timedelta(days=7)
+
+    match = TIME_RANGE.search(lowered)
+    if match and is_time_range(match):
+        use(match)
+        start_meridiem, end_meridiem = match.group(3), match.group(6)
+        end = clock(match.group(4), match.group(5), end_meridiem)
+        start = clock(match.group(1), match.group(2), start_meridiem or end_meridiem)
+        if start and end and not start_meridiem and start > end:
+            # "11-1pm" starts in the morning
+            start = clock(match.group(1), match.group(2), "am")
+        when["time"], when["end_time"] = start, end
+    if when["end_time"] is None:
+        match = take(MERIDIEM_TIME) or take(COLON_TIME) or take(AT_HOUR)
+        if match:
+            meridiem = match.group(3) if match.re is MERIDIEM_TIME else None
+            when["time"] = clock(match.group(1), match.group(2) if match.re is not AT_HOUR else None, meridiem,
+                                 bare_pm=not match.group(1).startswith("0"))
+        elif when["time"] is None and (match := take(PART_OF_DAY)):
+            when["time"] = time(PARTS_OF_DAY[match.group(1)])
+
+    if not any(when[key] for key in ("date", "time", "end_time", "duration", "moment")):
+        return None
+    return when
+
+
+def parse_change(text: str, now: datetime):
+    """
+    parse_when for update prompts. Only what follows "to", "until" or "→"
+    is read, what comes before usually names the event being changed
+    ("move my friday standup to monday"). A time after "until" is the new
+    end. None when no such part names a date, time or length.
+    """
+    lowered = text.lower()
+    ranges = [match.span() for match in TIME_RANGE.finditer(lowered) if is_time_range(match)]
+    for marker in CHANGE_TARGET.finditer(lowered):
+        if any(start <= marker.start() < end for start, end in ranges):
+            continue
+        when = parse_when(text[marker.end():], now)
+        if when is None:
+            continue
+        when["spans"] = [(start + marker.end(), end + marker.end()) for start, end in when["spans"]]
+        if marker.group(1) in ("until", "till"):
+            if not when["time"]:
+                continue
+            when.update(date=None, time=None, end_time=when["end_time"] or when["time"], duration=None, moment=None)
+        return when
+    return None
+
+
+def overlay_when(data: dict, when: dict, time_zone: str, duration_minutes: int = None) -> dict:
+    """
+    A copy of an event payload whose start/end specs (see relative_time)
+    carry what parse_when read, field by field, over the LLM's. Whatever
+    the prompt didn't say is left as the LLM gave it. duration_minutes
+    keeps an updated event's length when only its start moved.
+    """
+    def spec(value):
+        return to_spec(value["dateTime"], time_zone) if isinstance(value, dict) and "dateTime" in value \
+            else dict(value or {})
+
+    start = spec(data.get("start"))
+    day = when["moment"].date() if when["moment"] else when["date"]
+    clock_time = when["moment"].time() if when["moment"] else when["time"]
+    if day:
+        start.update(date=day.isoformat(), weekday=None, day_offset=None)
+    if clock_time:
+        start["time"] = clock_time.strftime("%H:%M")
+
+    if when["end_time"]:
+        end = {"time": when["end_time"].strftime("%H:%M")}
+    elif when["duration"]:
+        end = {"duration_minutes": int(when["duration"].total_seconds() // 60)}
+    elif (day or clock_time) and duration_minutes:
+        end = {"duration_minutes": duration_minutes}
+    else:
+        end = spec(data.get("end"))
+    return dict(data, start=start, end=end)
+
+
+COMMAND = re.compile(r"^(?:(?:hey|hi|ok|okay|please|pls|can you|could you|would you)\b[\s,]*)*"
+                     r"(?:schedule|create|add|set up|setup|book|put|make|plan)\b\s*(?:me\s+)?(?:an?\s+|the\s+)?"
+                     r"(?:new\s+)?(?:calendar\s+|google\s+calendar\s+)?"
+                     r"(?:event|appointment|reminder|block|entry)?\s*(?:for|called|named|titled|to)?\s*",
+                     re.IGNORECASE)
+CALENDAR_SUFFIX = re.compile(r"\s*\b(?:to|in|on|into)\s+(?:my\s+)?(?:google\s+)?calendar\b", re.IGNORECASE)
+FILLER = re.compile(r"\b(?:at|on|from|for|by|starting|the|of|please|thanks)\b(?=\s*(?:$|[,.;!?]))|^\s*(?:at|on)\b",
+                    re.IGNORECASE)
+# Repeating events need the LLM for their recurrence rule
+RECURRENCE = re.compile(r"\b(?:every|each|daily|weekly|biweekly|fortnightly|monthly|yearly|annually|weekdays|"
+                        r"weekends|repeat(?:s|ing)?|recurring)\b|\b(?:mon|tues|wednes|thurs|fri|satur|sun)days\b",
+                        re.IGNORECASE)
+MAX_TITLE_WORDS = 6
+
+
+def simple_title(text: str, when: dict):
+    """
+    The title of a simple scheduling prompt: what is left once the command
+    words and the date and time expressions are taken out. None unless that
+    is a few plain words, so anything with more detail, or a repeat, goes
+    to the LLM.
+    """
+    if RECURRENCE.search(text):
+        return None
+    for start, end in sorted(when["spans"], reverse=True):
+        text = text[:start] + " " + text[end:]
+    text = CALENDAR_SUFFIX.sub(" ", text)
+    if not COMMAND.match(text.strip()):
+        return None
+    text = COMMAND.sub("", text.strip(), count=1)
+    for _ in range(3):
+        text = FILLER.sub(" ", " ".join(text.split()).strip(" ,.;!?"))
+    words = text.split()
+    if not words or len(words) > MAX_TITLE_WORDS or any(char.isdigit() or char in "@:/" for char in text):
+        return None
+    title = " ".join(words)
+    return title[0].upper() + title[1:]
@@ -1,5 +1,7 @@
+from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import Enum
+from sqlalchemy.orm import selectinload, validates
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 
@@ -8,6 +10,50 @@ from flask_login import UserMixin
 db = SQLAlchemy()
 
 
+def parse_datetime(value):
+    """
+    Timezone-aware datetime from a datetime or an ISO 8601 string (as the
+    Google APIs return them). Naive values are taken as UTC, anything
+    unparseable becomes None.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def format_datetime(value) -> str:
+    return value.isoformat() if isinstance(value, datetime) else (value or "")
+
+
+class UTCDateTime(db.TypeDecorator):
+    """
+    Timezone-aware datetime column. Values are stored in UTC (SQLite has
+    no timezone type) and always come back as aware UTC datetimes.
+    """
+
+    impl = db.DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        value = parse_datetime(value)
+        if value is None:
+            return None
+        value = value.astimezone(timezone.utc)
+        return value.replace(tzinfo=None) if dialect.name == "sqlite" else value
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
 class Users(db.Model, UserMixin):
     """
     Table for Users
@@ -19,6 +65,13 @@ class Users(db.Model, UserMixin):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(60), nullable=False)
     token = db.Column(db.String, nullable=True)
+    # The linked Google account, fetched when the token is granted
+    google_email = db.Column(db.String(320), nullable=True)
+    google_name = db.Column(db.String, nullable=True)
+    # IANA zone reported by the user's browser, e.g. "America/New_York"
+    time_zone = db.Column(db.String(64), nullable=True)
+    # Bumped in the same transaction as every change to the user's dashboard rows
+    dashboard_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     def set_password(self, password):
         self.password = generate_password_hash(
@@ -55,12 +108,16 @@ class Events(db.Model):
     """
 
     __tablename__ = "Events"
+    __table_args__ = (
+        db.Index("ix_events_user_start", "user_id", "start"),
+        db.Index("uq_events_user_event", "user_id", "event_id", unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer)
     title = db.Column(db.String, nullable=False)
     description = db.Column(db.String, nullable=False)
-    start = db.Column(db.String, nullable=False)
-    end = db.Column(db.String, nullable=False)
+    start = db.Column(UTCDateTime, nullable=True)
+    end = db.Column(UTCDateTime, nullable=True)
     event_id = db.Column(db.String, nullable=False)
     event_dictionary = db.Column(db.String, nullable=False)
     link = db.Column(db.String, nullable=False)
@@ -78,6 +135,13 @@ class Events(db.Model):
         self.event_dictionary = kwargs.get("event_dictionary", "")
         self.link = kwargs.get("link", "")
 
+    @validates("start", "end")
+    def validate_time(self, key, value):
+        """
+        Accepts the API's ISO strings, keeps the attribute a datetime.
+        """
+        return parse_datetime(value)
+
     def serialize(self):
         """
         Serializes an Event object.
@@ -87,8 +151,8 @@ class Events(db.Model):
             "user_id": self.user_id,
             "title": self.title,
             "description": self.description,
-            "start": self.start,
-            "end": self.end,
+            "start": format_datetime(self.start),
+            "end": format_datetime(self.end),
             "event_id": self.event_id,
             "event_dictionary": self.event_dictionary,
             "link": self.link
@@ -101,12 +165,16 @@ class Meets(db.Model):
     """
 
     __tablename__ = "Meets"
+    __table_args__ = (
+        db.Index("ix_meets_user_start", "user_id", "start"),
+        db.Index("uq_meets_user_meet", "user_id", "meet_id", unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, autoincrement=True)
     summary = db.Column(db.String, nullable=False)
     description = db.Column(db.String, nullable=False)
-    start = db.Column(db.String, nullable=False)
-    end = db.Column(db.String, nullable=False)
+    start = db.Column(UTCDateTime, nullable=True)
+    end = db.Column(UTCDateTime, nullable=True)
     attendees = db.Column(db.String, nullable=False)
     meet_id = db.Column(db.String, nullable=False)
     meet_dictionary = db.Column(db.String, nullable=False)
@@ -126,6 +194,13 @@ class Meets(db.Model):
         self.meet_dictionary = kwargs.get("meet_dictionary", "")
         self.link = kwargs.get("link", "")
 
+    @validates("start", "end")
+    def validate_time(self, key, value):
+        """
+        Accepts the API's ISO strings, keeps the attribute a datetime.
+        """
+        return parse_datetime(value)
+
     def serialize(self):
         """
         Serializes an Meet object.
@@ -135,8 +210,8 @@ class Meets(db.Model):
             "user_id": self.user_id,
             "summary": self.summary,
             "description": self.description,
-            "start": self.start,
-            "end": self.end,
+            "start": format_datetime(self.start),
+            "end": format_datetime(self.end),
             "attendees": self.attendees,
             "meet_id": self.meet_id,
             "meet_dictionary": self.meet_dictionary,
@@ -149,6 +224,10 @@ class Emails(db.Model):
     Table for Emails
     """
     __tablename__ = "Emails"
+    __table_args__ = (
+        db.Index("uq_emails_user_email", "user_id", "email_id", unique=True),
+        db.Index("ix_emails_user_message", "user_id", "message_id"),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, autoincrement=True)
     subject = db.Column(db.String, nullable=False)
@@ -156,6 +235,8 @@ class Emails(db.Model):
     cc = db.Column(db.String, nullable=True)
     to = db.Column(db.String, nullable=False)
     email_id = db.Column(db.String, nullable=False)
+    # The draft's current Gmail message id, which is what mailbox history reports
+    message_id = db.Column(db.String, nullable=True)
     email_dictionary = db.Column(db.String, nullable=False)
     link = db.Column(db.String, nullable=False, default='')
 
@@ -169,6 +250,7 @@ class Emails(db.Model):
         self.to = kwargs.get("to", "")
         self.sender = kwargs.get("sender", "")
         self.email_id = kwargs.get("email_id", "")
+        self.message_id = kwargs.get("message_id")
         self.email_dictionary = kwargs.get("email_dictionary", "")
         self.link = kwargs.get("link", "")
 
@@ -197,8 +279,8 @@ class ChatResponse(db.Model):
 
     __tablename__ = "ChatResponses"
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.Integer)
-    history_id = db.Column(db.Integer, db.ForeignKey('History.id'), nullable=False)
+    user_id = db.Column(db.Integer, index=True)
+    history_id = db.Column(db.Integer, db.ForeignKey('History.id'), nullable=False, index=True)
     response = db.Column(db.String, nullable=False)
 
     def __init__(self, user_id, response):
@@ -225,9 +307,10 @@ class History(db.Model):
 
     __tablename__ = "History"
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.Integer)
+    user_id = db.Column(db.Integer, index=True)
     user_prompt = db.Column(db.String, nullable=False)
-    chat_responses = db.relationship('ChatResponse', backref='history', lazy=True, cascade="all, delete-orphan")
+    chat_responses = db.relationship('ChatResponse', backref='history', lazy=True, cascade="all, delete-orphan",
+                                     order_by='ChatResponse.id')
 
     def __init__(self, user_id, user_prompt):
         """
@@ -247,9 +330,53 @@ class History(db.Model):
             "chat_responses": [response.serialize() for response in self.chat_responses],
         }
 
+    @classmethod
+    def page(cls, user_id, before_id=None, limit=20):
+        """
+        The user's newest histories older than before_id, newest first, with
+        their responses loaded in one extra query. Seeks on (user_id, id) so
+        every page costs the same however far back it is.
+        """
+        query = cls.query.options(selectinload(cls.chat_responses)).filter(cls.user_id == user_id)
+        if before_id is not None:
+            query = query.filter(cls.id < before_id)
+        return query.order_by(cls.id.desc()).limit(limit).all()
+
     def add_chat_response(self, user_id, response):
         """
         Adds a chat response to the history.
         """
         self.chat_responses.append(ChatResponse(user_id = user_id, response=response))
 
+
+class SyncState(db.Model):
+    """
+    Table for each user's incremental sync cursors
+    """
+
+    __tablename__ = "SyncState"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, unique=True, nullable=False)
+    calendar_sync_token = db.Column(db.String, nullable=True)
+    calendar_synced_at = db.Column(db.DateTime, nullable=True)
+    gmail_history_id = db.Column(db.String, nullable=True)
+    gmail_synced_at = db.Column(db.DateTime, nullable=True)
+
+    def __init__(self, user_id):
+        """
+        Initializes SyncState object.
+        """
+        self.user_id = user_id
+
+    def serialize(self):
+        """
+        Serializes a SyncState object.
+        """
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "calendar_sync_token": self.calendar_sync_token,
+            "calendar_synced_at": self.calendar_synced_at.isoformat() if self.calendar_synced_at else None,
+            "gmail_history_id": self.gmail_history_id,
+            "gmail_synced_at": self.gmail_synced_at.isoformat() if self.gmail_synced_at else None,
+        }
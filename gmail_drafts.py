@@ -0,0 +1,278 @@
+import base64
+import json
+import sys
+from datetime import datetime, timezone
+from googleapiclient.errors import HttpError
+from calendar_batch import MAX_BATCH_SIZE
+from db import Emails, SyncState
+
+
+PAGE_SIZE = 500
+# Mail history that can change what is in the Drafts folder
+HISTORY_TYPES = ["messageAdded", "messageDeleted", "labelRemoved"]
+
+
+def draft_link(draft_id: str) -> str:
+    return f"https://mail.google.com/mail/u/0/#drafts?compose={draft_id}"
+
+
+def raw_body(message_raw: str) -> dict:
+    return {"message": {"raw": base64.urlsafe_b64encode(message_raw.encode("utf-8")).decode("utf-8")}}
+
+
+def build_request(service, operation: dict):
+    """
+    One drafts.* call. operation["action"] is create/update (with "raw",
+    the RFC 2822 message), send or delete (with the draft "id").
+    """
+    drafts = service.users().drafts()
+    action = operation.get("action")
+    if action == "create":
+        return drafts.create(userId="me", body=raw_body(operation["raw"]))
+    if action == "update":
+        return drafts.update(userId="me", id=operation["id"], body=raw_body(operation["raw"]))
+    if action == "send":
+        return drafts.send(userId="me", body={"id": operation["id"]})
+    if action == "delete":
+        return drafts.delete(userId="me", id=operation["id"])
+    if action == "get":
+        return drafts.get(userId="me", id=operation["id"], format="full")
+    raise ValueError(f"Unknown draft action {action}")
+
+
+def execute_batch(service, operations: list) -> list:
+    """
+    Sends the operations as Gmail batch requests (one HTTP call per 50
+    operations). Returns (operation, response, error) for every operation.
+    """
+    results = {}
+
+    def callback(request_id, response, exception):
+        results[request_id] = (response, exception)
+
+    for offset in range(0, len(operations), MAX_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=callback)
+        for index, operation in enumerate(operations[offset:offset + MAX_BATCH_SIZE], start=offset):
+            batch.add(build_request(service, operation), request_id=str(index))
+        batch.execute()
+
+    return [(operation, *results.get(str(index), (None, None))) for index, operation in enumerate(operations)]
+
+
+def header(message: dict, name: str) -> str:
+    for item in message.get("payload", {}).get("headers", []):
+        if item.get("name", "").lower() == name.lower():
+            return item.get("value", "")
+    return ""
+
+
+def plain_text(payload: dict) -> str:
+    # The first text/plain part, depth first
+    data = payload.get("body", {}).get("data")
+    if payload.get("mimeType") == "text/plain" and data:
+        return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4)).decode("utf-8", errors="replace")
+    for part in payload.get("parts", []):
+        text = plain_text(part)
+        if text:
+            return text
+    return ""
+
+
+def apply_draft(row, draft: dict):
+    message = draft.get("message", {})
+    fields = {"to": header(message, "To"), "cc": header(message, "Cc"), "subject": header(message, "Subject"),
+              "body": plain_text(message.get("payload", {}))}
+    row.subject = fields["subject"]
+    row.body = fields["body"]
+    row.to = fields["to"]
+    row.cc = fields["cc"] or None
+    row.message_id = message.get("id")
+    row.email_dictionary = json.dumps(fields)
+    row.link = draft_link(draft["id"])
+
+
+def upsert_drafts(session, user_id, drafts: list) -> int:
+    """
+    Inserts or refreshes Emails rows from drafts.get responses, keyed by
+    draft id. Does not commit.
+    """
+    ids = [draft["id"] for draft in drafts]
+    rows = {row.email_id: row for row in
+            Emails.query.filter(Emails.user_id == user_id, Emails.email_id.in_(ids)).all()} if ids else {}
+    for draft in drafts:
+        row = rows.get(draft["id"]) or Emails(user_id=user_id, email_id=draft["id"])
+        apply_draft(row, draft)
+        session.add(row)
+    return len(drafts)
+
+
+def reconcile(session, user_id, results: list):
+    """
+    Applies the successful batch operations to Emails in one transaction:
+    created and updated drafts are stored from the API response plus the
+    operation's "fields", sent and deleted ones are removed. Returns
+    (created, updated, removed, failed), the first three as rows.
+    """
+    ids = [operation["id"] for operation, _, error in results if error is None and operation.get("id")]
+    rows = {row.email_id: row for row in
+            Emails.query.filter(Emails.user_id == user_id, Emails.email_id.in_(ids)).all()} if ids else {}
+
+    created, updated, removed, failed = [], [], [], []
+    try:
+        for operation, response, error in results:
+            action = operation.get("action")
+            if error is not None:
+                print(f"Draft {action} {operation.get('id', '')} failed: {error}", file=sys.stderr)
+                failed.append(operation)
+                continue
+
+            if action in ("send", "delete"):
+                row = rows.get(operation["id"])
+                if row is not None:
+                    session.delete(row)
+                    removed.append(row)
+                continue
+
+            row = rows.get(operation.get("id")) if action == "update" else None
+            if row is None:
+                row = Emails(user_id=user_id, email_id=response["id"])
+                created.append(row)
+            else:
+                updated.append(row)
+            fields = operation.get("fields", {})
+            row.subject = fields.get("subject", row.subject)
+            row.body = fields.get("body", row.body)
+            row.to = fields.get("to", row.to)
+            row.cc = fields.get("cc", row.cc)
+            row.email_dictionary = json.dumps(fields)
+            row.message_id = (response.get("message") or {}).get("id")
+            row.link = draft_link(response["id"])
+            session.add(row)
+
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    return created, updated, removed, failed
+
+
+def list_draft_ids(service) -> dict:
+    """
+    {message id: draft id} for every draft, ids only.
+    """
+    ids = {}
+    page_token = None
+    while True:
+        response = service.users().drafts().list(userId="me", maxResults=PAGE_SIZE, pageToken=page_token,
+                                                 fields="drafts(id,message/id),nextPageToken").execute()
+        for draft in response.get("drafts", []):
+            ids[draft["message"]["id"]] = draft["id"]
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return ids
+
+
+def list_history(service, history_id):
+    """
+    Draft changes since history_id: (message ids that became drafts,
+    message ids that stopped being drafts, latest history id).
+    """
+    added, removed = set(), set()
+    page_token = None
+    while True:
+        response = service.users().history().list(userId="me", startHistoryId=history_id, labelId="DRAFT",
+                                                  historyTypes=HISTORY_TYPES, pageToken=page_token).execute()
+        for record in response.get("history", []):
+            for change in record.get("messagesAdded", []):
+                message = change["message"]
+                if "DRAFT" in message.get("labelIds", []):
+                    added.add(message["id"])
+                    removed.discard(message["id"])
+            for change in record.get("messagesDeleted", []):
+                added.discard(change["message"]["id"])
+                removed.add(change["message"]["id"])
+            for change in record.get("labelsRemoved", []):
+                if "DRAFT" in change.get("labelIds", []):
+                    added.discard(change["message"]["id"])
+                    removed.add(change["message"]["id"])
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return added, removed, response.get("historyId", history_id)
+
+
+def fetch_drafts(service, draft_ids) -> list:
+    results = execute_batch(service, [{"action": "get", "id": draft_id} for draft_id in draft_ids])
+    drafts = []
+    for operation, response, error in results:
+        if error is not None:
+            # Sent or deleted since it was listed, the next sync drops it
+            print(f"Could not fetch draft {operation['id']}: {error}", file=sys.stderr)
+        elif response:
+            drafts.append(response)
+    return drafts
+
+
+def full_sync(session, service, user_id) -> dict:
+    # Take the history id first so changes made while listing show up next time
+    history_id = service.users().getProfile(userId="me").execute().get("historyId")
+    draft_ids = list_draft_ids(service)
+    drafts = fetch_drafts(service, list(draft_ids.values()))
+    upserted = upsert_drafts(session, user_id, drafts)
+    stale = Emails.query.filter(Emails.user_id == user_id, Emails.email_id.notin_(list(draft_ids.values()))).all()
+    for row in stale:
+        session.delete(row)
+    return {"history_id": history_id, "upserted": upserted, "deleted": len(stale)}
+
+
+def incremental_sync(session, service, user_id, history_id) -> dict:
+    added, removed, history_id = list_history(service, history_id)
+    deleted = 0
+    if removed:
+        for row in Emails.query.filter(Emails.user_id == user_id, Emails.message_id.in_(list(removed))).all():
+            session.delete(row)
+            deleted += 1
+    upserted = 0
+    if added:
+        # History only has message ids, the draft ids come from the (ids only) listing
+        draft_ids = list_draft_ids(service)
+        drafts = fetch_drafts(service, [draft_ids[message_id] for message_id in added if message_id in draft_ids])
+        upserted = upsert_drafts(session, user_id, drafts)
+    return {"history_id": history_id, "upserted": upserted, "deleted": deleted}
+
+
+def sync_drafts(session, service, user_id, full=False) -> dict:
+    """
+    Mirrors the user's Drafts folder into Emails. The first run (or a
+    full=True run, or an expired history id) lists everything, later runs
+    only read the mailbox history since the stored historyId and fetch the
+    drafts that changed, in one batch.
+    """
+    state = SyncState.query.filter_by(user_id=user_id).first()
+    if state is None:
+        state = SyncState(user_id=user_id)
+        session.add(state)
+
+    history_id = None if full else state.gmail_history_id
+    result = None
+    if history_id:
+        try:
+            result = incremental_sync(session, service, user_id, history_id)
+        except HttpError as e:
+            # 404 means the history id is too old, start over with a full sync
+            if e.resp.status != 404:
+                raise
+            print(f"Gmail history expired for user {user_id}, running a full sync", file=sys.stderr)
+
+    ran_full = result is None
+    try:
+        if ran_full:
+            result = full_sync(session, service, user_id)
+        state.gmail_history_id = str(result["history_id"]) if result["history_id"] else None
+        state.gmail_synced_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    return {"full": ran_full, "upserted": result["upserted"], "deleted": result["deleted"]}
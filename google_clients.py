@@ -0,0 +1,59 @@
+import json
+import threading
+from cachetools import LRUCache
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+
+
+# Parsed discovery documents, loaded once from the copy bundled with googleapiclient
+_discovery_documents = {}
+
+
+def discovery_document(name: str, version: str) -> dict:
+    key = (name, version)
+    if key not in _discovery_documents:
+        document = discovery_cache.get_static_doc(name, version)
+        if document is None:
+            raise ValueError(f"No bundled discovery document for {name} {version}")
+        _discovery_documents[key] = json.loads(document)
+    return _discovery_documents[key]
+
+
+class GoogleClientCache:
+    """
+    Process-wide LRU cache of each user's Credentials and the Google API
+    service objects built from them. Services are rebuilt whenever the
+    user's credentials change (e.g. after a token refresh).
+    """
+
+    def __init__(self, maxsize=256):
+        self.credentials = LRUCache(maxsize=maxsize)
+        self.services = LRUCache(maxsize=maxsize * 2)  # (user_id, name, version) -> (creds, service)
+        self.lock = threading.RLock()
+
+    def get_credentials(self, user_id):
+        with self.lock:
+            return self.credentials.get(user_id)
+
+    def store_credentials(self, user_id, creds):
+        with self.lock:
+            self.invalidate(user_id)
+            self.credentials[user_id] = creds
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.credentials.pop(user_id, None)
+            for key in [key for key in self.services.keys() if key[0] == user_id]:
+                self.services.pop(key, None)
+
+    def service(self, user_id, name: str, version: str, creds):
+        key = (user_id, name, version)
+        with self.lock:
+            cached = self.services.get(key)
+            if cached and cached[0] is creds:
+                return cached[1]
+
+        service = build_from_document(discovery_document(name, version), credentials=creds)
+        with self.lock:
+            self.services[key] = (creds, service)
+        return service
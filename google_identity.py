@@ -0,0 +1,42 @@
+import json
+import sys
+from email.utils import formataddr
+
+
+def fetch_identity(gmail) -> dict:
+    """
+    The Google account's address and display name, from the Gmail API
+    (the granted scopes don't include the userinfo ones). The name comes
+    from the primary send-as alias and is None when it isn't set.
+    """
+    email = gmail.users().getProfile(userId='me').execute()['emailAddress']
+    name = None
+    try:
+        aliases = gmail.users().settings().sendAs().list(userId='me').execute().get('sendAs', [])
+        primary = next((alias for alias in aliases if alias.get('isPrimary')), {})
+        name = primary.get('displayName') or None
+    except Exception as e:
+        print(f"Could not read Gmail display name: {e}", file=sys.stderr)
+    return {"email": email, "name": name}
+
+
+def refresh_token(token_json):
+    try:
+        return json.loads(token_json).get('refresh_token') if token_json else None
+    except ValueError:
+        return None
+
+
+def identity_stale(user, new_token_json) -> bool:
+    """
+    Whether the stored identity has to be fetched again when the user's
+    token is saved: it is missing, or the token comes from a new grant
+    (possibly another account). Access token refreshes keep the refresh
+    token, so they don't count.
+    """
+    return not user.google_email or refresh_token(user.token) != refresh_token(new_token_json)
+
+
+def sender_address(email, name=None) -> str:
+    # "Ada Lovelace <ada@example.com>", or just the address without a name
+    return formataddr((name, email)) if name else email
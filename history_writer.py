@@ -0,0 +1,114 @@
+import sys
+import threading
+import time
+from queue import Empty, Queue
+from db import History
+from jobs import start_thread
+
+
+class HistoryBuffer:
+    """
+    One prompt's History row and its chat responses, held in memory until
+    the prompt is done so they are written in a single transaction.
+    """
+
+    def __init__(self, user_id, user_prompt):
+        self.user_id = user_id
+        self.entry = History(user_id=user_id, user_prompt=user_prompt)
+
+    def add(self, response):
+        self.entry.add_chat_response(self.user_id, response)
+
+
+def write_buffers(session, buffers):
+    """
+    Inserts the buffered rows of any number of prompts with one commit.
+    """
+    try:
+        session.add_all([buffer.entry for buffer in buffers])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+
+class HistoryWriter:
+    """
+    Writes finished HistoryBuffers with write(buffers). By default each is
+    written as soon as it is submitted. With write_behind, a background
+    task groups everything submitted within interval seconds (at most
+    max_batch buffers) into one write. flush() writes whatever is still
+    queued and waits for the batch the task is writing, e.g. before reading
+    the rows back or on shutdown.
+    """
+
+    def __init__(self, write, write_behind=False, interval=1.0, max_batch=200, create_queue=Queue,
+                 start_task=start_thread, clock=time.monotonic):
+        self.write = write
+        self.write_behind = write_behind
+        self.interval = interval
+        self.max_batch = max_batch
+        self.start_task = start_task
+        self.clock = clock
+        self.queue = create_queue()
+        self.lock = threading.Lock()
+        # Buffers submitted but not written yet, queued or in the task's batch
+        self.pending = 0
+        self.written = threading.Condition(self.lock)
+        self.started = False
+        self.stats = {"prompts": 0, "writes": 0, "failed": 0}
+
+    def submit(self, buffer):
+        if not self.write_behind:
+            self._write([buffer])
+            return
+        with self.lock:
+            if not self.started:
+                self.started = True
+                self.start_task(self._worker)
+            self.pending += 1
+        self.queue.put(buffer)
+
+    def _write(self, buffers):
+        try:
+            self.write(buffers)
+            self.stats["prompts"] += len(buffers)
+            self.stats["writes"] += 1
+        except Exception as e:
+            self.stats["failed"] += len(buffers)
+            print(f"Failed to write {len(buffers)} history entries: {e}", file=sys.stderr)
+
+    def _write_pending(self, buffers):
+        self._write(buffers)
+        with self.lock:
+            self.pending -= len(buffers)
+            self.written.notify_all()
+
+    def _drain(self, batch, deadline=None):
+        while len(batch) < self.max_batch:
+            try:
+                if deadline is None:
+                    batch.append(self.queue.get(block=False))
+                else:
+                    batch.append(self.queue.get(timeout=max(deadline - self.clock(), 0)))
+            except Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = [self.queue.get()]
+            self._write_pending(self._drain(batch, self.clock() + self.interval))
+
+    def flush(self, timeout=10.0):
+        """
+        Returns once everything submitted so far is written, or after
+        timeout seconds waiting on the task (e.g. it died at shutdown).
+        """
+        while True:
+            batch = self._drain([])
+            if not batch:
+                break
+            self._write_pending(batch)
+        with self.lock:
+            return self.written.wait_for(lambda: self.pending <= 0, timeout)
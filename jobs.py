@@ -0,0 +1,107 @@
+import sys
+import threading
+import uuid
+from collections import deque
+from queue import Queue
+
+
+def start_thread(target, *args):
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+class Job:
+    """
+    A unit of work submitted to a JobQueue.
+    """
+
+    def __init__(self, key, fn, args, kwargs, room=None):
+        self.id = str(uuid.uuid4())
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.room = room
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def serialize(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Bounded worker pool. Jobs that share a key (the user id) run one at a
+    time in submission order, jobs with different keys run in parallel.
+    """
+
+    def __init__(self, workers=4, start_task=start_thread, create_queue=Queue, on_status=None):
+        self.workers = workers
+        self.start_task = start_task
+        self.on_status = on_status
+        self.pending = {}  # key -> deque of jobs, head is running or about to run
+        self.ready = create_queue()  # keys whose head job can run
+        self.lock = threading.Lock()
+        self.started = False
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        for _ in range(self.workers):
+            self.start_task(self._worker)
+
+    def submit(self, key, fn, *args, room=None, **kwargs) -> Job:
+        self.start()
+        job = Job(key, fn, args, kwargs, room=room)
+        with self.lock:
+            jobs = self.pending.setdefault(key, deque())
+            jobs.append(job)
+            # Only schedule the key if it isn't already waiting or running
+            if len(jobs) == 1:
+                self.ready.put(key)
+        self._notify(job)
+        return job
+
+    def _notify(self, job):
+        if self.on_status:
+            try:
+                self.on_status(job)
+            except Exception as e:
+                print(f"Job status callback failed: {e}", file=sys.stderr)
+
+    def _run(self, job):
+        job.status = "started"
+        self._notify(job)
+        try:
+            job.result = job.fn(*job.args, **job.kwargs)
+            job.status = "finished"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            print(f"Job {job.id} failed: {e}", file=sys.stderr)
+        self._notify(job)
+        job.done.set()
+
+    def _worker(self):
+        while True:
+            key = self.ready.get()
+            with self.lock:
+                job = self.pending[key][0]
+            self._run(job)
+            with self.lock:
+                jobs = self.pending[key]
+                jobs.popleft()
+                if jobs:
+                    self.ready.put(key)
+                else:
+                    del self.pending[key]
@@ -0,0 +1,98 @@
+import json
+
+
+ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class JSONFieldStream:
+    """
+    Scans a JSON document as it streams in and reports what was added to
+    each string value, keyed by its dotted path ("body", "to.0",
+    "start.time"). Strings only ever grow, so callers can append deltas.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.stack = []  # [container, key or index] for each open object/array
+        self.expect_key = False
+        self.in_string = False
+        self.is_key = False
+        self.escape = None  # text after a backslash, None outside escapes
+        self.buffer = []
+        self.surrogate = None  # high half of an escaped surrogate pair
+
+    def path(self) -> str:
+        return ".".join(str(part) for _, part in self.stack)
+
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+    def result(self):
+        return json.loads(self.text())
+
+    def _append(self, char, deltas):
+        self.buffer.append(char)
+        if not self.is_key:
+            path = self.path()
+            deltas[path] = deltas.get(path, "") + char
+
+    def _escaped(self, deltas):
+        if self.escape[0] != "u":
+            self._append(ESCAPES.get(self.escape, self.escape), deltas)
+        else:
+            code = int(self.escape[1:], 16)
+            if 0xD800 <= code < 0xDC00:
+                self.surrogate = code
+            elif 0xDC00 <= code < 0xE000 and self.surrogate is not None:
+                self._append(chr(0x10000 + ((self.surrogate - 0xD800) << 10) + (code - 0xDC00)), deltas)
+                self.surrogate = None
+            else:
+                self._append(chr(code), deltas)
+        self.escape = None
+
+    def feed(self, chunk: str) -> dict:
+        """
+        Consumes the next chunk and returns {path: added text} for the
+        string values it extended.
+        """
+        self.chunks.append(chunk)
+        deltas = {}
+        for char in chunk:
+            if self.in_string:
+                if self.escape is not None:
+                    self.escape += char
+                    if self.escape[0] != "u" or len(self.escape) == 5:
+                        self._escaped(deltas)
+                elif char == "\\":
+                    self.escape = ""
+                elif char == '"':
+                    self.in_string = False
+                    if self.is_key:
+                        self.stack[-1][1] = "".join(self.buffer)
+                else:
+                    self._append(char, deltas)
+            elif char == '"':
+                self.in_string = True
+                self.is_key = self.expect_key
+                self.buffer = []
+                if not self.is_key and self.stack:
+                    # Report empty strings too, so the field shows up right away
+                    deltas.setdefault(self.path(), "")
+            elif char == "{":
+                self.stack.append(["object", None])
+                self.expect_key = True
+            elif char == "[":
+                self.stack.append(["array", 0])
+                self.expect_key = False
+            elif char in "}]":
+                if self.stack:
+                    self.stack.pop()
+                self.expect_key = False
+            elif char == ":":
+                self.expect_key = False
+            elif char == "," and self.stack:
+                if self.stack[-1][0] == "array":
+                    self.stack[-1][1] += 1
+                else:
+                    self.expect_key = True
+        return deltas
@@ -0,0 +1,207 @@
+import random
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from queue import Queue
+import httpx
+import openai
+from openai import OpenAI
+
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+# Latencies kept per label for the percentiles in stats()
+LATENCY_WINDOW = 500
+
+
+class Slots:
+    """
+    Counting semaphore built on a queue, so waiting on it yields properly
+    under gevent when given the server's create_queue.
+    """
+
+    def __init__(self, size, create_queue=Queue):
+        self.tokens = create_queue()
+        for _ in range(size):
+            self.tokens.put(None)
+
+    def acquire(self):
+        self.tokens.get()
+
+    def release(self):
+        self.tokens.put(None)
+
+
+def is_retryable(error) -> bool:
+    if isinstance(error, openai.APIConnectionError):  # includes timeouts
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def retry_after(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after")) if response is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    """
+    The one way the app talks to the LLM: a single OpenAI client over a
+    pooled keep-alive HTTP/2 httpx client, global and per-user concurrency
+    limits, retries with jittered exponential backoff on 429/5xx/connection
+    errors, and per-label latency and token usage metrics.
+    """
+
+    def __init__(self, api_key=None, client=None, max_concurrency=16, user_concurrency=2, timeout=30.0,
+                 max_retries=3, backoff=0.5, max_backoff=8.0, http2=True, max_connections=32,
+                 create_queue=Queue, sleep=time.sleep):
+        if client is None:
+            http_client = httpx.Client(
+                http2=http2,
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+                timeout=httpx.Timeout(timeout, connect=5.0),
+            )
+            # Retries happen here, with our backoff, not inside the SDK
+            client = OpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+        self.client = client
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.create_queue = create_queue
+        self.sleep = sleep
+        self.user_concurrency = user_concurrency
+        self.slots = Slots(max_concurrency, create_queue)
+        self.user_slots = {}  # user_id -> [Slots, holders and waiters]
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    @contextmanager
+    def _slot(self, user_id):
+        # Per-user first, so one user's burst waits on itself, not on everyone
+        if user_id is not None:
+            with self.lock:
+                entry = self.user_slots.setdefault(user_id, [Slots(self.user_concurrency, self.create_queue), 0])
+                entry[1] += 1
+            entry[0].acquire()
+        self.slots.acquire()
+        try:
+            yield
+        finally:
+            self.slots.release()
+            if user_id is not None:
+                entry[0].release()
+                with self.lock:
+                    entry[1] -= 1
+                    if entry[1] == 0:
+                        del self.user_slots[user_id]
+
+    def backoff_delay(self, attempt, error=None) -> float:
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        return max(delay, retry_after(error) or 0)
+
+    def _create(self, label, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.client.chat.completions.create(**kwargs)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                self._record(label, retry=True)
+                delay = self.backoff_delay(attempt, e)
+                print(f"LLM call {label} failed ({e}), retrying in {delay:.2f}s", file=sys.stderr)
+                self.sleep(delay)
+
+    def _record(self, label, latency=None, wait=None, error=False, retry=False, usage=None):
+        with self.lock:
+            metric = self.metrics.setdefault(label, {"calls": 0, "errors": 0, "retries": 0, "wait": 0.0,
+                                                     "latencies": deque(maxlen=LATENCY_WINDOW),
+                                                     "prompt_tokens": 0, "completion_tokens": 0,
+                                                     "cached_tokens": 0, "metered": 0})
+            if retry:
+                metric["retries"] += 1
+                return
+            metric["calls"] += 1
+            metric["errors"] += int(error)
+            metric["wait"] += wait or 0.0
+            if latency is not None and not error:
+                metric["latencies"].append(latency)
+            if usage is not None:
+                # cached_tokens is the part of the prompt served from the provider's prefix cache
+                details = getattr(usage, "prompt_tokens_details", None)
+                metric["metered"] += 1
+                metric["prompt_tokens"] += usage.prompt_tokens or 0
+                metric["completion_tokens"] += usage.completion_tokens or 0
+                metric["cached_tokens"] += getattr(details, "cached_tokens", None) or 0
+
+    def chat(self, messages, user_id=None, label="chat", json_mode=False, json_schema=None, model=DEFAULT_MODEL,
+             **kwargs) -> str:
+        """
+        Runs one chat completion and returns the message content.
+        json_schema (a strict json_schema response_format entry) takes
+        precedence over json_mode.
+        """
+        if json_schema is not None:
+            kwargs["response_format"] = {"type": "json_schema", "json_schema": json_schema}
+        elif json_mode:
+            kwargs["response_format"] = {"type": "json_object"}
+        queued = time.perf_counter()
+        with self._slot(user_id):
+            start = time.perf_counter()
+            try:
+                completion = self._create(label, model=model, messages=messages, **kwargs)
+            except Exception:
+                self._record(label, wait=start - queued, error=True)
+                raise
+            self._record(label, time.perf_counter() - start, start - queued, usage=getattr(completion, "usage", None))
+        return completion.choices[0].message.content
+
+    def stream(self, messages, user_id=None, label="chat", json_mode=False, json_schema=None, model=DEFAULT_MODEL,
+               **kwargs):
+        """
+        Like chat, but yields the content as it arrives. The slot is held
+        until the stream is consumed or closed.
+        """
+        if json_schema is not None:
+            kwargs["response_format"] = {"type": "json_schema", "json_schema": json_schema}
+        elif json_mode:
+            kwargs["response_format"] = {"type": "json_object"}
+        # The last chunk then carries the token counts, with no choices
+        kwargs.setdefault("stream_options", {"include_usage": True})
+        queued = time.perf_counter()
+        usage = None
+        with self._slot(user_id):
+            start = time.perf_counter()
+            try:
+                for chunk in self._create(label, model=model, messages=messages, stream=True, **kwargs):
+                    usage = getattr(chunk, "usage", None) or usage
+                    content = chunk.choices[0].delta.content if chunk.choices else None
+                    if content:
+                        yield content
+            except Exception:
+                self._record(label, wait=start - queued, error=True)
+                raise
+            self._record(label, time.perf_counter() - start, start - queued, usage=usage)
+
+    def stats(self) -> dict:
+        report = {}
+        with self.lock:
+            for label, metric in self.metrics.items():
+                latencies = sorted(metric["latencies"])
+                report[label] = {
+                    "calls": metric["calls"],
+                    "errors": metric["errors"],
+                    "retries": metric["retries"],
+                    "avg_wait_ms": round(1000 * metric["wait"] / metric["calls"], 2) if metric["calls"] else 0,
+                    "avg_ms": round(1000 * sum(latencies) / len(latencies), 2) if latencies else 0,
+                    "p50_ms": round(1000 * latencies[len(latencies) // 2], 2) if latencies else 0,
+                    "p95_ms": round(1000 * latencies[int(len(latencies) * 0.95)], 2) if latencies else 0,
+                    "prompt_tokens": metric["prompt_tokens"],
+                    "completion_tokens": metric["completion_tokens"],
+                    "cached_tokens": metric["cached_tokens"],
+                    "avg_prompt_tokens": round(metric["prompt_tokens"] / metric["metered"], 1)
+                    if metric["metered"] else 0,
+                }
+        return report
@@ -0,0 +1,105 @@
+"""initial schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2024-08-05 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def create_missing_table(existing, name, *elements):
+    if name not in existing:
+        op.create_table(name, *elements)
+
+
+def upgrade():
+    # A database created by create_all() before migrations existed already
+    # has the older tables, only the ones it lacks are created
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    create_missing_table(existing, 'users',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('name', sa.String(length=60), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('password', sa.String(length=60), nullable=False),
+    sa.Column('token', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email')
+    )
+    create_missing_table(existing, 'Events',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('start', sa.String(), nullable=False),
+    sa.Column('end', sa.String(), nullable=False),
+    sa.Column('event_id', sa.String(), nullable=False),
+    sa.Column('event_dictionary', sa.String(), nullable=False),
+    sa.Column('link', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_missing_table(existing, 'Meets',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('summary', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('start', sa.String(), nullable=False),
+    sa.Column('end', sa.String(), nullable=False),
+    sa.Column('attendees', sa.String(), nullable=False),
+    sa.Column('meet_id', sa.String(), nullable=False),
+    sa.Column('meet_dictionary', sa.String(), nullable=False),
+    sa.Column('link', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_missing_table(existing, 'Emails',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('subject', sa.String(), nullable=False),
+    sa.Column('body', sa.String(), nullable=False),
+    sa.Column('cc', sa.String(), nullable=True),
+    sa.Column('to', sa.String(), nullable=False),
+    sa.Column('email_id', sa.String(), nullable=False),
+    sa.Column('email_dictionary', sa.String(), nullable=False),
+    sa.Column('link', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_missing_table(existing, 'History',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('user_prompt', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_missing_table(existing, 'ChatResponses',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('history_id', sa.Integer(), nullable=False),
+    sa.Column('response', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['history_id'], ['History.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_missing_table(existing, 'SyncState',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('calendar_sync_token', sa.String(), nullable=True),
+    sa.Column('calendar_synced_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('SyncState')
+    op.drop_table('ChatResponses')
+    op.drop_table('History')
+    op.drop_table('Emails')
+    op.drop_table('Meets')
+    op.drop_table('Events')
+    op.drop_table('users')
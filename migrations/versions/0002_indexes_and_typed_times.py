@@ -0,0 +1,108 @@
+"""lookup indexes and timezone-aware start/end
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-08-12 10:00:00.000000
+
+"""
+from datetime import datetime, timezone
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# (table, id column) pairs that become unique per user
+UNIQUE_IDS = (('Events', 'event_id', 'uq_events_user_event'),
+              ('Meets', 'meet_id', 'uq_meets_user_meet'),
+              ('Emails', 'email_id', 'uq_emails_user_email'))
+TIMED_TABLES = (('Events', 'ix_events_user_start'), ('Meets', 'ix_meets_user_start'))
+
+
+def to_utc(value, naive):
+    # Stored strings are the API's ISO dateTimes (or dates for all-day events)
+    try:
+        moment = datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+    if moment is None:
+        return None
+    moment = (moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)).astimezone(timezone.utc)
+    return moment.replace(tzinfo=None) if naive else moment
+
+
+def from_utc(value):
+    if value is None:
+        return ''
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).isoformat()
+
+
+def drop_duplicates(table_name, id_column):
+    # Keep the newest row for each (user_id, id)
+    table = sa.table(table_name, sa.column('id'), sa.column('user_id'), sa.column(id_column))
+    keep = sa.select(sa.func.max(table.c.id)).group_by(table.c.user_id, table.c[id_column])
+    op.execute(table.delete().where(table.c.id.not_in(keep)))
+
+
+def convert_times(table_name, source_type, target_type, convert):
+    """
+    Adds start_new/end_new, backfills them from start/end with convert,
+    then swaps them in for the old columns.
+    """
+    with op.batch_alter_table(table_name) as batch_op:
+        batch_op.add_column(sa.Column('start_new', target_type, nullable=True))
+        batch_op.add_column(sa.Column('end_new', target_type, nullable=True))
+
+    table = sa.table(table_name, sa.column('id', sa.Integer), sa.column('start', source_type),
+                     sa.column('end', source_type), sa.column('start_new', target_type),
+                     sa.column('end_new', target_type))
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(table.c.id, table.c.start, table.c.end)).all()
+    for row_id, start, end in rows:
+        bind.execute(table.update().where(table.c.id == row_id)
+                     .values(start_new=convert(start), end_new=convert(end)))
+
+    with op.batch_alter_table(table_name) as batch_op:
+        batch_op.drop_column('start')
+        batch_op.drop_column('end')
+    with op.batch_alter_table(table_name) as batch_op:
+        batch_op.alter_column('start_new', new_column_name='start')
+        batch_op.alter_column('end_new', new_column_name='end')
+
+
+def upgrade():
+    naive = op.get_bind().dialect.name == 'sqlite'  # SQLite has no timezone type, store UTC
+    for table_name, _ in TIMED_TABLES:
+        convert_times(table_name, sa.String(), sa.DateTime(timezone=True), lambda value: to_utc(value, naive))
+
+    for table_name, id_column, index_name in UNIQUE_IDS:
+        drop_duplicates(table_name, id_column)
+        op.create_index(index_name, table_name, ['user_id', id_column], unique=True)
+    for table_name, index_name in TIMED_TABLES:
+        op.create_index(index_name, table_name, ['user_id', 'start'], unique=False)
+
+    op.create_index('ix_History_user_id', 'History', ['user_id'], unique=False)
+    op.create_index('ix_ChatResponses_user_id', 'ChatResponses', ['user_id'], unique=False)
+    op.create_index('ix_ChatResponses_history_id', 'ChatResponses', ['history_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ChatResponses_history_id', table_name='ChatResponses')
+    op.drop_index('ix_ChatResponses_user_id', table_name='ChatResponses')
+    op.drop_index('ix_History_user_id', table_name='History')
+    for table_name, index_name in TIMED_TABLES:
+        op.drop_index(index_name, table_name=table_name)
+    for table_name, _, index_name in UNIQUE_IDS:
+        op.drop_index(index_name, table_name=table_name)
+
+    for table_name, _ in TIMED_TABLES:
+        convert_times(table_name, sa.DateTime(timezone=True), sa.String(), from_utc)
+    # The old columns were NOT NULL
+    for table_name, _ in TIMED_TABLES:
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.alter_column('start', existing_type=sa.String(), nullable=False)
+            batch_op.alter_column('end', existing_type=sa.String(), nullable=False)
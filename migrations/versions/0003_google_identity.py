@@ -0,0 +1,29 @@
+"""google account identity on users
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-08-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled in the next time each user's Gmail identity is needed
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('google_email', sa.String(length=320), nullable=True))
+        batch_op.add_column(sa.Column('google_name', sa.String(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('google_name')
+        batch_op.drop_column('google_email')
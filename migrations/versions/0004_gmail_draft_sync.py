@@ -0,0 +1,51 @@
+"""gmail draft sync cursor and draft message ids
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-08-26 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def missing_columns(table, *columns):
+    # A database stamped after create_all() may already have some of them
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+    return [column for column in columns if column.name not in existing]
+
+
+def has_index(table, name):
+    return any(index['name'] == name for index in sa.inspect(op.get_bind()).get_indexes(table))
+
+
+def upgrade():
+    # Existing drafts get their message id on the first full draft sync
+    with op.batch_alter_table('Emails') as batch_op:
+        for column in missing_columns('Emails', sa.Column('message_id', sa.String(), nullable=True)):
+            batch_op.add_column(column)
+        if not has_index('Emails', 'ix_emails_user_message'):
+            batch_op.create_index('ix_emails_user_message', ['user_id', 'message_id'])
+
+    with op.batch_alter_table('SyncState') as batch_op:
+        for column in missing_columns('SyncState',
+                                      sa.Column('gmail_history_id', sa.String(), nullable=True),
+                                      sa.Column('gmail_synced_at', sa.DateTime(), nullable=True)):
+            batch_op.add_column(column)
+
+
+def downgrade():
+    with op.batch_alter_table('SyncState') as batch_op:
+        batch_op.drop_column('gmail_synced_at')
+        batch_op.drop_column('gmail_history_id')
+
+    with op.batch_alter_table('Emails') as batch_op:
+        batch_op.drop_index('ix_emails_user_message')
+        batch_op.drop_column('message_id')
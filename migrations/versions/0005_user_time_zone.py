@@ -0,0 +1,27 @@
+"""time zone on users
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2024-09-02 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled in when the user's browser next connects, until then the server's zone is used
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('time_zone', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('time_zone')
@@ -0,0 +1,27 @@
+"""dashboard version on users
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2024-09-09 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bumped with every commit to the user's Events/Meets/Emails, so each process can tell its cached dashboard is stale
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('dashboard_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('dashboard_version')
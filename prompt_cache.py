@@ -0,0 +1,119 @@
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+import unicodedata
+from cachetools import TTLCache
+
+
+# Shorthand rewritten before keying, so "tmrw 9 AM" and "tomorrow 9am" share an entry
+ABBREVIATIONS = {
+    "tmrw": "tomorrow", "tmr": "tomorrow", "tmrrw": "tomorrow", "2moro": "tomorrow",
+    "tonite": "tonight", "mtg": "meeting", "w/": "with",
+}
+# Ordinary words too ("sun", "sat", "min"), only expanded next to a number or a day word
+WEEKDAY_ABBREVIATIONS = {
+    "mon": "monday", "tue": "tuesday", "tues": "tuesday", "wed": "wednesday", "thu": "thursday",
+    "thurs": "thursday", "fri": "friday", "sat": "saturday", "sun": "sunday",
+}
+UNIT_ABBREVIATIONS = {"min": "minutes", "mins": "minutes", "hr": "hours", "hrs": "hours"}
+WEEKDAY_SHORTHAND = re.compile(r"\b(?:(on|next|this|every|by|until|till)\s+)?(" + "|".join(WEEKDAY_ABBREVIATIONS) +
+                               r")\b(?=(\s+(?:at\s+)?\d)?)")
+UNIT_SHORTHAND = re.compile(r"\b(\d+)\s*(" + "|".join(UNIT_ABBREVIATIONS) + r")\b")
+# Politeness that doesn't change what gets scheduled
+FILLER_PREFIX = re.compile(r"^(hey|hi|ok|okay|please|pls|can you|could you|would you)\b[\s,]*")
+FILLER_SUFFIX = re.compile(r"[\s,]*\b(please|pls|thanks|thank you)$")
+TIME_OF_DAY = re.compile(r"\b(\d{1,2})(?::00)?\s*([ap])\.?m\.?\b")
+
+
+def expand_weekday(match) -> str:
+    if not (match.group(1) or match.group(3)):
+        return match.group(0)
+    preposition = f"{match.group(1)} " if match.group(1) else ""
+    return preposition + WEEKDAY_ABBREVIATIONS[match.group(2)]
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Canonical form of a prompt for cache keys: case, spacing, trailing
+    punctuation, shorthand and filler words are folded away.
+    """
+    text = unicodedata.normalize("NFKC", prompt).lower().strip()
+    text = TIME_OF_DAY.sub(lambda m: f"{m.group(1)}{m.group(2)}m", text)
+    text = " ".join(ABBREVIATIONS.get(word, word) for word in text.split())
+    text = UNIT_SHORTHAND.sub(lambda m: f"{m.group(1)} {UNIT_ABBREVIATIONS[m.group(2)]}", text)
+    text = WEEKDAY_SHORTHAND.sub(expand_weekday, text)
+    text = text.rstrip(" .!?")
+    for _ in range(2):
+        text = FILLER_SUFFIX.sub("", FILLER_PREFIX.sub("", text))
+    return text
+
+
+def cache_key(system_instructions: str, prompt: str) -> str:
+    """
+    The instructions carry the mode and the user's context (existing event,
+    sender name), so they are hashed along with the normalized prompt.
+    """
+    raw = json.dumps([system_instructions, normalize_prompt(prompt)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PromptCache:
+    """
+    In-process cache of structured LLM responses. Entries expire after ttl
+    seconds and the least recently used go first once maxsize is reached.
+    """
+
+    def __init__(self, maxsize=1024, ttl=86400, timer=time.monotonic):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl, timer=timer)
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            self.stats["hits" if value is not None else "misses"] += 1
+        # Callers may modify the result, never hand out the cached object
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = json.dumps(value)
+
+
+class RedisPromptCache:
+    """
+    Same interface backed by Redis, so the cache is shared across workers.
+    Entries expire after ttl seconds, eviction follows the server's
+    maxmemory-policy (e.g. allkeys-lru). Redis errors count as misses.
+    """
+
+    def __init__(self, client, ttl=86400, prefix="plan-it:prompt:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key):
+        try:
+            value = self.client.get(self.prefix + key)
+        except Exception as e:
+            print(f"Prompt cache read failed: {e}", file=sys.stderr)
+            value = None
+        self.stats["hits" if value is not None else "misses"] += 1
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        try:
+            self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+        except Exception as e:
+            print(f"Prompt cache write failed: {e}", file=sys.stderr)
+
+
+def make_prompt_cache(redis_url=None, maxsize=1024, ttl=86400):
+    if redis_url:
+        import redis
+        return RedisPromptCache(redis.Redis.from_url(redis_url), ttl=ttl)
+    return PromptCache(maxsize=maxsize, ttl=ttl)
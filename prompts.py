@@ -0,0 +1,88 @@
+import copy
+import json
+import math
+import sys
+import textwrap
+from functools import lru_cache
+import tiktoken
+from llm_gateway import DEFAULT_MODEL
+
+
+# Tokens the per-call context may take on top of the static prefix
+DEFAULT_BUDGET = 800
+# Roughly four characters per token in English text, used when tiktoken can't load its encoding
+CHARS_PER_TOKEN = 4
+# Strings are not cut below this many characters
+MIN_FIELD_LENGTH = 40
+ELLIPSIS = "…"
+
+
+@lru_cache(maxsize=None)
+def encoding_for(model):
+    # Encodings are downloaded once into TIKTOKEN_CACHE_DIR, offline hosts need it prefilled
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"Could not load the token encoding for {model}, estimating token counts: {e}", file=sys.stderr)
+        return None
+
+
+def count_tokens(text: str, model=DEFAULT_MODEL) -> int:
+    encoding = encoding_for(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+def compact(value) -> str:
+    # No whitespace between separators, it costs tokens and tells the model nothing
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def trim(context: dict, budget: int, model=DEFAULT_MODEL) -> dict:
+    """
+    A copy of context whose compact form fits in budget tokens. The longest
+    string is cut in half first, then lists lose their last items
+    (candidates come best first), until it fits or nothing is left to cut.
+    """
+    context = copy.deepcopy(context)
+    while count_tokens(compact(context), model) > budget:
+        strings = [key for key, value in context.items()
+                   if isinstance(value, str) and len(value) > MIN_FIELD_LENGTH]
+        if strings:
+            key = max(strings, key=lambda key: len(context[key]))
+            context[key] = context[key].rstrip(ELLIPSIS)[:len(context[key]) // 2] + ELLIPSIS
+            continue
+        lists = [key for key, value in context.items() if isinstance(value, list) and len(value) > 1]
+        if not lists:
+            break
+        context[max(lists, key=lambda key: len(context[key]))].pop()
+    return context
+
+
+class PromptTemplate:
+    """
+    A system prompt split into a static prefix, dedented and measured once,
+    and a compact JSON context appended per call. Everything that changes
+    comes after the prefix, so the provider's prompt caching can reuse it
+    across users and modes.
+    """
+
+    def __init__(self, name, prefix, budget=DEFAULT_BUDGET, model=DEFAULT_MODEL):
+        self.name = name
+        self.prefix = textwrap.dedent(prefix).strip()
+        self.budget = budget
+        self.model = model
+        self.prefix_tokens = count_tokens(self.prefix, model)
+
+    def render(self, **context) -> str:
+        context = trim({key: value for key, value in context.items() if value is not None}, self.budget, self.model)
+        if not context:
+            return self.prefix
+        return f"{self.prefix}\nContext: {compact(context)}"
+
+    def tokens(self, **context) -> int:
+        return count_tokens(self.render(**context), self.model)
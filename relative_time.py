@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+DEFAULT_DURATION = 30  # minutes
+# Fields of a relative time spec, as returned by the LLM
+SPEC_KEYS = ("date", "weekday", "day_offset", "time")
+
+# Shown to the LLM in place of absolute dateTimes, so its answer does not depend on the clock
+START_SPEC = ('{"date": "<YYYY-MM-DD only if the user gave a calendar date, else null>", '
+              '"weekday": "<monday..sunday if the user named a weekday, else null>", '
+              '"day_offset": <days from today, 0 today, 1 tomorrow, default 0>, '
+              '"time": "<HH:MM 24h, null if no time given>"}')
+END_SPEC = '{"duration_minutes": <length in minutes, default 30>}'
+TIME_INSTRUCTIONS = ("Do not work out calendar dates yourself, describe start and end with the fields shown, "
+                     "they are resolved to dates afterwards. Set date to null when using weekday or day_offset. "
+                     "If the user gives an end time instead of a length, give end the same fields as start.")
+
+
+def to_spec(date_time, time_zone: str = None) -> dict:
+    """
+    Turns a stored absolute dateTime (datetime or ISO string) into a spec
+    in time_zone, e.g. to show an existing event's times in an update prompt.
+    """
+    try:
+        moment = date_time if isinstance(date_time, datetime) else datetime.fromisoformat(date_time)
+    except (TypeError, ValueError):
+        return {}
+    if time_zone and moment.tzinfo:
+        moment = moment.astimezone(ZoneInfo(time_zone))
+    return {"date": moment.strftime("%Y-%m-%d"), "time": moment.strftime("%H:%M")}
+
+
+def is_relative(value) -> bool:
+    return isinstance(value, dict) and "dateTime" not in value
+
+
+def next_weekday(today, weekday: int, this: bool = False):
+    # Next occurrence, a week out if it's today unless it's "this friday"
+    ahead = (weekday - today.weekday()) % 7
+    return today + timedelta(days=ahead if this else ahead or 7)
+
+
+def resolve_date(spec: dict, today):
+    if spec.get("date"):
+        return datetime.strptime(spec["date"], "%Y-%m-%d").date()
+
+    day = today
+    weekday = str(spec.get("weekday") or "").lower()
+    if weekday in WEEKDAYS:
+        day = next_weekday(today, WEEKDAYS.index(weekday))
+    return day + timedelta(days=int(spec.get("day_offset") or 0))
+
+
+def resolve_moment(spec: dict, now: datetime, base_date=None) -> datetime:
+    """
+    Absolute time for a spec. Without a date/weekday/offset it falls on
+    base_date (the start's day for an end time), without a time it keeps
+    the current time of day.
+    """
+    has_day = any(spec.get(key) for key in ("date", "weekday", "day_offset"))
+    day = resolve_date(spec, now.date()) if has_day or base_date is None else base_date
+
+    if spec.get("time"):
+        hour, minute = (int(part) for part in str(spec["time"]).split(":")[:2])
+    else:
+        hour, minute = now.hour, now.minute
+    return datetime(day.year, day.month, day.day, hour, minute, tzinfo=now.tzinfo)
+
+
+def resolve_times(data: dict, time_zone: str, now: datetime = None) -> dict:
+    """
+    Replaces relative start/end specs in an LLM event payload with absolute
+    dateTimes in time_zone. Payloads that already have dateTimes are returned
+    as they are.
+    """
+    if not isinstance(data, dict) or not any(is_relative(data.get(key)) for key in ("start", "end")):
+        return data
+
+    zone = ZoneInfo(time_zone)
+    now = (now or datetime.now(zone)).astimezone(zone)
+    resolved = dict(data)
+
+    start_spec = data.get("start") or {}
+    start = datetime.fromisoformat(start_spec["dateTime"]) if "dateTime" in start_spec \
+        else resolve_moment(start_spec, now)
+
+    end_spec = data.get("end") or {}
+    if "dateTime" in end_spec:
+        end = datetime.fromisoformat(end_spec["dateTime"])
+    elif any(end_spec.get(key) for key in SPEC_KEYS):
+        end = resolve_moment(end_spec, now, base_date=start.date())
+    else:
+        end = start + timedelta(minutes=int(end_spec.get("duration_minutes") or DEFAULT_DURATION))
+
+    resolved["start"] = {"dateTime": start.isoformat(), "timeZone": time_zone}
+    resolved["end"] = {"dateTime": end.isoformat(), "timeZone": time_zone}
+    return resolved
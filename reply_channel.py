@@ -0,0 +1,22 @@
+import sys
+
+
+class ReplyChannel:
+    """
+    Where one request's responses go: the Socket.IO room of the socket
+    that sent it, and no one else. Without a room there is nobody to
+    answer, so messages are dropped rather than broadcast.
+    """
+
+    def __init__(self, emit, room):
+        self.emit = emit
+        self.room = room
+        self.sent = 0
+
+    def send(self, event, data=None) -> bool:
+        if not self.room:
+            print(f"No socket to send {event} to, dropping it", file=sys.stderr)
+            return False
+        self.emit(event, data, to=self.room)
+        self.sent += 1
+        return True
@@ -0,0 +1,116 @@
+import json
+import re
+from datetime import datetime
+from difflib import SequenceMatcher
+from zoneinfo import ZoneInfo
+from dates import parse_when
+from search import tokenize_prompt
+
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+# Existing events the prompt dates may be up to this many days back
+LOOKBACK_DAYS = 180
+
+# Weights of each signal, only the signals present in the prompt are used
+WEIGHTS = {"title": 0.6, "date": 0.25, "attendees": 0.15}
+
+
+def mentioned_date(prompt: str, now: datetime):
+    """
+    Finds a single calendar day referenced by the prompt, if any, read in
+    now's time zone.
+    """
+    when = parse_when(prompt, now, past_days=LOOKBACK_DAYS)
+    if when is None:
+        return None
+    return when["moment"].date() if when["moment"] else when["date"]
+
+
+def parse_start(start, zone):
+    # Stored in UTC, compare on the user's calendar day
+    if not isinstance(start, datetime):
+        try:
+            start = datetime.fromisoformat(str(start))
+        except ValueError:
+            return None
+    return (start.astimezone(zone) if start.tzinfo else start).date()
+
+
+def attendee_emails(attendees) -> set:
+    # Meets.attendees is stored as JSON but older rows use the backtick convention
+    try:
+        parsed = json.loads(attendees) if isinstance(attendees, str) else attendees
+    except ValueError:
+        parsed = attendees.split('`')
+    emails = set()
+    for attendee in parsed or []:
+        email = attendee.get('email') if isinstance(attendee, dict) else attendee
+        if email:
+            emails.add(email.lower())
+    return emails
+
+
+def title_score(keywords: list, title: str) -> float:
+    title_words = set(tokenize_prompt(title))
+    if not title_words or not keywords:
+        return 0.0
+    overlap = sum(1 for word in title_words if any(k.startswith(word) or word.startswith(k) for k in keywords))
+    fuzzy = SequenceMatcher(None, " ".join(keywords), " ".join(sorted(title_words))).ratio()
+    return max(overlap / len(title_words), fuzzy)
+
+
+def score_candidates(prompt: str, candidates: list, title_attr: str, time_zone: str = None,
+                     now: datetime = None) -> list:
+    """
+    Scores each candidate row against the prompt, with dates read in
+    time_zone (the server's when None). Returns (score, row) pairs with the
+    best match first.
+    """
+    now = now or (datetime.now(ZoneInfo(time_zone)) if time_zone else datetime.now().astimezone())
+    keywords = tokenize_prompt(prompt)
+    target_day = mentioned_date(prompt, now)
+    prompt_emails = {e.lower() for e in EMAIL_PATTERN.findall(prompt)}
+
+    scored = []
+    for row in candidates:
+        signals = {"title": title_score(keywords, getattr(row, title_attr) or '')}
+        if target_day and hasattr(row, 'start'):
+            start_day = parse_start(row.start, now.tzinfo)
+            signals["date"] = max(0.0, 1 - abs((start_day - target_day).days) / 3) if start_day else 0.0
+        if prompt_emails and hasattr(row, 'attendees'):
+            signals["attendees"] = len(prompt_emails & attendee_emails(row.attendees)) / len(prompt_emails)
+
+        total_weight = sum(WEIGHTS[name] for name in signals)
+        scored.append((sum(WEIGHTS[name] * value for name, value in signals.items()) / total_weight, row))
+
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    return scored
+
+
+def resolve_candidate(prompt: str, candidates: list, title_attr: str, id_attr: str,
+                      top_k: int = 5, min_score: float = 0.6, margin: float = 0.2, time_zone: str = None,
+                      now: datetime = None):
+    """
+    Returns (id, shortlist). id is set when one candidate clearly wins,
+    otherwise the caller should let the LLM pick from the compact shortlist.
+    """
+    scored = score_candidates(prompt, candidates, title_attr, time_zone, now)
+    if not scored:
+        return None, []
+
+    best_score, best = scored[0]
+    runner_up = scored[1][0] if len(scored) > 1 else 0.0
+    if best_score >= min_score and best_score - runner_up >= margin:
+        return getattr(best, id_attr), []
+
+    return None, [compact_candidate(row, title_attr, id_attr) for _, row in scored[:top_k]]
+
+
+def compact_candidate(row, title_attr: str, id_attr: str) -> dict:
+    # Just enough for the LLM to tell candidates apart
+    candidate = {id_attr: getattr(row, id_attr), "title": getattr(row, title_attr)}
+    if hasattr(row, 'start'):
+        candidate["start"] = row.start.isoformat() if isinstance(row.start, datetime) else str(row.start)
+    elif hasattr(row, 'to'):
+        candidate["to"] = row.to
+    return candidate
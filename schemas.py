@@ -0,0 +1,169 @@
+import json
+from datetime import datetime
+from email.utils import getaddresses
+from typing import Literal, Optional
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+from relative_time import WEEKDAYS
+
+
+# Checked locally after the response arrives, strict mode doesn't accept them in the schema
+LOCAL_KEYWORDS = ("minLength", "maxLength", "pattern", "format", "minimum", "maximum", "exclusiveMinimum",
+                  "exclusiveMaximum", "multipleOf", "minItems", "maxItems")
+
+
+def is_address(value: str) -> bool:
+    return all("@" in address for _, address in getaddresses([value])) and "@" in value
+
+
+class TimeSpec(BaseModel):
+    """
+    Relative start time as described in relative_time.START_SPEC.
+    """
+    date: Optional[str] = Field(None, pattern=r"^\d{4}-\d{2}-\d{2}$")
+    weekday: Optional[Literal[WEEKDAYS]] = None
+    day_offset: Optional[int] = None
+    time: Optional[str] = Field(None, pattern=r"^\d{1,2}:\d{2}$")
+
+    @field_validator("weekday", mode="before")
+    @classmethod
+    def lower_weekday(cls, value):
+        return value.lower() if isinstance(value, str) else value
+
+    @field_validator("date")
+    @classmethod
+    def real_date(cls, value):
+        if value is not None:
+            datetime.strptime(value, "%Y-%m-%d")
+        return value
+
+
+class EndSpec(TimeSpec):
+    # Either a length or the same fields as the start
+    duration_minutes: Optional[int] = Field(None, gt=0)
+
+
+class Reminders(BaseModel):
+    useDefault: bool = True
+
+
+class Attendee(BaseModel):
+    email: str
+
+    @field_validator("email")
+    @classmethod
+    def valid_email(cls, value):
+        if not is_address(value):
+            raise ValueError("not an email address")
+        return value
+
+
+class Payload(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    # Filled instead of the other fields when the message doesn't say enough
+    error: Optional[str] = None
+
+
+class EventPayload(Payload):
+    summary: str = Field(min_length=1)
+    description: str = ""
+    start: TimeSpec
+    end: EndSpec
+    reminders: Reminders = Reminders()
+
+
+class MeetingPayload(EventPayload):
+    attendees: list[Attendee] = []
+
+
+class EmailPayload(Payload):
+    sender: str = Field("", alias="from")
+    to: str
+    cc: list[str] = []
+    subject: str = Field(min_length=1)
+    body: str = Field(min_length=1)
+
+    @field_validator("to", mode="before")
+    @classmethod
+    def join_recipients(cls, value):
+        return ", ".join(value) if isinstance(value, list) else value
+
+    @field_validator("to")
+    @classmethod
+    def valid_recipients(cls, value):
+        if not is_address(value):
+            raise ValueError("not an email address")
+        return value
+
+
+# Create payloads returned along with the classification, by event_type
+PAYLOAD_SCHEMAS = {"gcal": EventPayload, "gmeet": MeetingPayload, "gmail": EmailPayload}
+
+
+def strictify(node):
+    if isinstance(node, list):
+        return [strictify(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+    properties = node.get("properties")
+    node = {key: strictify(value) for key, value in node.items()
+            if key not in LOCAL_KEYWORDS and key not in ("default", "title", "properties")}
+    if isinstance(properties, dict):
+        # Strict mode wants every property listed, optional ones are nullable instead
+        node["properties"] = {name: strictify(value) for name, value in properties.items()}
+        node["required"] = list(properties)
+        node["additionalProperties"] = False
+    return node
+
+
+def strict_schema(model) -> dict:
+    """
+    The json_schema response_format entry for model, in the subset
+    structured outputs accept in strict mode.
+    """
+    return {"name": model.__name__, "strict": True, "schema": strictify(model.model_json_schema(by_alias=True))}
+
+
+def invalid_fields(error: ValidationError) -> dict:
+    # {top-level field: what is wrong with it}, the unit a repair call resends
+    fields = {}
+    for item in error.errors():
+        field = str(item["loc"][0]) if item["loc"] else "__root__"
+        fields.setdefault(field, item["msg"])
+    return fields
+
+
+def validate_payload(model, data):
+    """
+    Returns (payload, errors). payload is the validated dict without null
+    fields, or None with errors as {field: message}. Error answers
+    ({"error": ...}) are passed through untouched.
+    """
+    if isinstance(data, dict) and data.get("error"):
+        return data, {}
+    try:
+        return model.model_validate(data).model_dump(by_alias=True, exclude_none=True), {}
+    except ValidationError as e:
+        return None, invalid_fields(e)
+
+
+def repair_messages(messages: list, response: str, errors: dict) -> list:
+    """
+    The original conversation plus the invalid answer and a request for
+    only the fields that failed, so the cached prefix is reused and the
+    reply stays short.
+    """
+    if "__root__" in errors:
+        request = f"Your answer is not a valid json object ({errors['__root__']}). " \
+                  f"Return the whole json object again."
+    else:
+        request = f"These fields are invalid: {json.dumps(errors)}. " \
+                  f"Return a json object with only these fields, corrected."
+    return messages + [{"role": "assistant", "content": response or ""}, {"role": "user", "content": request}]
+
+
+def merge_repair(data, repaired, errors: dict):
+    # The repair answer replaces the failed fields, or everything when the first answer wasn't an object
+    if "__root__" in errors or not isinstance(data, dict) or not isinstance(repaired, dict):
+        return repaired
+    return dict(data, **{field: repaired[field] for field in errors if field in repaired})
@@ -0,0 +1,115 @@
+import re
+import sys
+from sqlalchemy import or_, text
+from db import db, Events, Meets, Emails
+
+
+# Model -> (fts table, indexed columns)
+FTS_TABLES = {
+    Events: ("events_fts", ("title", "description")),
+    Meets: ("meets_fts", ("summary", "description")),
+    Emails: ("emails_fts", ("subject", "body")),
+}
+
+# Words that describe the action or service rather than the item itself
+STOPWORDS = {
+    "a", "about", "all", "am", "an", "and", "any", "appointment", "are", "at", "be", "calendar", "can",
+    "cancel", "change", "could", "delete", "draft", "drafts", "email", "emails", "event", "events", "for",
+    "from", "get", "gmail", "google", "have", "i", "i'd", "i'm", "in", "into", "is", "it", "its", "just",
+    "me", "meet", "meeting", "meetings", "move", "my", "of", "on", "please", "remove", "reschedule", "saved",
+    "send", "should", "so", "that", "the", "this", "to", "update", "want", "was", "we", "with", "would",
+    "you", "your",
+}
+
+WORD_PATTERN = re.compile(r"[a-z0-9][a-z0-9'@.-]*")
+
+
+def tokenize_prompt(prompt: str) -> list:
+    """
+    Local replacement for the extract_keywords LLM call.
+    """
+    words = [w.strip(".'-") for w in WORD_PATTERN.findall(prompt.lower())]
+    keywords = []
+    for word in words:
+        if word and word not in STOPWORDS and len(word) > 1 and word not in keywords:
+            keywords.append(word)
+    return keywords
+
+
+def fts_query(keywords: list) -> str:
+    # Quote every term so user text can never be parsed as FTS syntax
+    return " OR ".join('"{}"*'.format(k.replace('"', '""')) for k in keywords)
+
+
+def fts_available(engine) -> bool:
+    return engine.dialect.name == "sqlite"
+
+
+def install_search_index(engine):
+    """
+    Creates the FTS5 tables and the triggers that keep them in sync with
+    Events/Meets/Emails. Safe to call on every start up.
+    """
+    if not fts_available(engine):
+        return
+
+    with engine.begin() as conn:
+        for model, (fts_table, columns) in FTS_TABLES.items():
+            table = model.__tablename__
+            cols = ", ".join(columns)
+            new_cols = ", ".join(f"new.{c}" for c in columns)
+            old_cols = ", ".join(f"old.{c}" for c in columns)
+
+            exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"),
+                                  {"name": fts_table}).first()
+            conn.execute(text(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+                    {cols}, content='{table}', content_rowid='id', tokenize='porter unicode61'
+                )"""))
+            conn.execute(text(f"""
+                CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON "{table}" BEGIN
+                    INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_cols});
+                END"""))
+            conn.execute(text(f"""
+                CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON "{table}" BEGIN
+                    INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                END"""))
+            conn.execute(text(f"""
+                CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE ON "{table}" BEGIN
+                    INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                    INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_cols});
+                END"""))
+
+            # Index rows that were stored before the index existed
+            if not exists:
+                conn.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+
+
+def search_candidates(model, user_id, prompt: str, limit: int = 20) -> list:
+    """
+    Returns the user's rows of `model` that best match the prompt, ranked
+    by BM25 (or by simple LIKE matching on databases without FTS5).
+    """
+    keywords = tokenize_prompt(prompt)
+    if not keywords:
+        return []
+
+    fts_table, columns = FTS_TABLES[model]
+    table = model.__tablename__
+
+    if fts_available(db.engine):
+        try:
+            rows = db.session.execute(text(f"""
+                SELECT "{table}".id FROM {fts_table}
+                JOIN "{table}" ON "{table}".id = {fts_table}.rowid
+                WHERE {fts_table} MATCH :query AND "{table}".user_id = :user_id
+                ORDER BY bm25({fts_table}) LIMIT :limit
+            """), {"query": fts_query(keywords), "user_id": user_id, "limit": limit}).all()
+            ids = [row.id for row in rows]
+            by_id = {row.id: row for row in model.query.filter(model.id.in_(ids)).all()}
+            return [by_id[i] for i in ids if i in by_id]
+        except Exception as e:
+            print(f"Full-text search failed, falling back to LIKE: {e}", file=sys.stderr)
+
+    conditions = [getattr(model, column).ilike(f"%{keyword}%") for column in columns for keyword in keywords]
+    return model.query.filter(model.user_id == user_id, or_(*conditions)).limit(limit).all()
@@ -0,0 +1,76 @@
+import threading
+import socketio
+
+
+DEFAULT_CHANNEL = "plan-it"
+
+
+class MemoryBroker:
+    """
+    In-process pub/sub for MemoryManager. Every subscriber gets its own
+    queue, so several Socket.IO servers in one process (e.g. in tests)
+    see each other's messages the way workers do through Redis.
+    """
+
+    def __init__(self):
+        self.subscribers = {}  # channel -> [queue]
+        self.lock = threading.Lock()
+
+    def subscribe(self, channel, queue):
+        with self.lock:
+            self.subscribers.setdefault(channel, []).append(queue)
+
+    def unsubscribe(self, channel, queue):
+        with self.lock:
+            self.subscribers.get(channel, []).remove(queue)
+
+    def publish(self, channel, data):
+        with self.lock:
+            queues = list(self.subscribers.get(channel, []))
+        for queue in queues:
+            queue.put(data)
+        return len(queues)
+
+
+# Shared by every memory:// manager in the process
+BROKER = MemoryBroker()
+
+
+class MemoryManager(socketio.PubSubManager):
+    """
+    Client manager that relays emits and room changes through a
+    MemoryBroker. Stands in for RedisManager when there is one process.
+    """
+    name = "memory"
+
+    def __init__(self, broker=BROKER, channel=DEFAULT_CHANNEL, write_only=False, logger=None):
+        self.broker = broker
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _publish(self, data):
+        return self.broker.publish(self.channel, data)
+
+    def _listen(self):
+        # The server's queue type, so waiting on it yields under gevent
+        queue = self.server.eio.create_queue()
+        self.broker.subscribe(self.channel, queue)
+        try:
+            while True:
+                yield queue.get()
+        finally:
+            self.broker.unsubscribe(self.channel, queue)
+
+
+def make_client_manager(url=None, channel=DEFAULT_CHANNEL, write_only=False):
+    """
+    Socket.IO client manager for a message queue URL: None keeps emits in
+    this process, memory:// uses the in-process broker, redis:// (or
+    rediss://) goes through Redis, and anything else is handed to Kombu.
+    """
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryManager(channel=channel, write_only=write_only)
+    if url.startswith(("redis://", "rediss://")):
+        return socketio.RedisManager(url, channel=channel, write_only=write_only)
+    return socketio.KombuManager(url, channel=channel, write_only=write_only)
@@ -16,11 +16,23 @@ const overlay = document.getElementById("overlay");
 const textarea = document.getElementById('prompt');
 const charCount = document.getElementById('charCount');
 const maxLength = parseInt(textarea.getAttribute('maxlength'));
-let socket = io();
+// WebSocket only: long polling needs sticky sessions once there is more than one worker
+// The server reads "tomorrow at 9" in the browser's time zone
+let socket = io({
+    transports: ['websocket'],
+    auth: { timeZone: Intl.DateTimeFormat().resolvedOptions().timeZone }
+});
 
 
 let response = "";
 
+// Responses still streaming in, by stream_id, until their final message arrives
+const streams = {};
+
+// Chat history paging: the id to load older entries before, null when there are none
+let historyBeforeId = null;
+let historyLoading = false;
+
         // Correct punctuation for the transcript
 const correctPunctuation = (transcript) => {
     transcript = transcript.trim();
@@ -115,10 +127,68 @@ socket.on('server_response', (response) => {
 // GOOGLE CALENDAR EVENTS
 socket.on('receiver', (data) => {
     const message = data.message;
+    const stream = streams[data.stream_id];
+    if (stream) {
+        // Replace the streamed preview with the final message
+        delete streams[data.stream_id];
+        stream.element.innerHTML = formatMessage(message);
+        chatBox.scrollTop = chatBox.scrollHeight;
+        return;
+    }
+    // An answer without the stream's id (e.g. an error) means the preview won't be completed
+    dropStreams();
     appendMessage(message, 'server');
    
 });
 
+// Partial event details while the LLM is still writing them
+socket.on('receiver-chunk', (chunk) => {
+    let stream = streams[chunk.stream_id];
+    if (!stream) {
+        stream = streams[chunk.stream_id] = {fields: {}, element: appendMessage('', 'server')};
+    }
+    stream.fields[chunk.field] = (stream.fields[chunk.field] || '') + chunk.delta;
+    stream.element.innerHTML = formatMessage(Object.values(stream.fields).join('\n'));
+    chatBox.scrollTop = chatBox.scrollHeight;
+});
+
+// Partial email draft, filled into the approval form as it is written
+socket.on('request-approval-chunk', (chunk) => {
+    let stream = streams[chunk.stream_id];
+    if (!stream) {
+        stream = streams[chunk.stream_id] = {seen: {}, element: createEmailDiv({to: '', subject: '', body: ''})};
+    }
+    const input = stream.element.querySelector(`[name="${chunk.field.split('.')[0]}-field"]`);
+    if (!input) return;
+    // Several recipients stream in as to.0, to.1, ...
+    if (!stream.seen[chunk.field] && chunk.field.startsWith('to.') && input.value) {
+        input.value += ', ';
+    }
+    stream.seen[chunk.field] = true;
+    input.value += chunk.delta;
+    chatBox.scrollTop = chatBox.scrollHeight;
+});
+
+// Removes previews whose final message never came
+function dropStreams() {
+    Object.keys(streams).forEach((streamId) => {
+        streams[streamId].element.remove();
+        delete streams[streamId];
+    });
+}
+
+// Prompt pipeline progress (queued, started, finished, failed)
+socket.on('job-status', (job) => {
+    console.log('Job ' + job.job_id + ': ' + job.status);
+    // A user's prompts run one at a time, whatever is still streaming belonged to this job
+    if (job.status === 'finished' || job.status === 'failed') {
+        dropStreams();
+    }
+    if (job.status === 'failed') {
+        appendMessage('Something went wrong processing your request. Please try again.', 'server');
+    }
+});
+
 // Handle redirection from server
 socket.on('redirect_to_app', (data) => {
     window.location.href = data.url;
@@ -166,16 +236,50 @@ function formatMessage(message) {
     return message.replace(/\n/g, '<br>');
 }
 
-//Append message to chat box
-function appendMessage(message, sender) {
+function createMessage(message, sender) {
     const messageElement = document.createElement('div');
     messageElement.classList.add('chat-message', sender);
     messageElement.innerHTML = formatMessage(message);
+    return messageElement;
+}
+
+//Append message to chat box
+function appendMessage(message, sender) {
+    const messageElement = createMessage(message, sender);
     chatBox.appendChild(messageElement);
     chatBox.scrollTop = chatBox.scrollHeight;
+    return messageElement;
 }
 
 
+// Fetches one page of history and puts it above what is already shown,
+// keeping the visible messages where they are
+async function loadHistory(beforeId) {
+    if (historyLoading) return;
+    historyLoading = true;
+    try {
+        const url = beforeId ? `/chat-history?before_id=${beforeId}` : '/chat-history';
+        const response = await fetch(url);
+        if (!response.ok) return;
+        const page = await response.json();
+        if (!page.history) return;
+
+        const fragment = document.createDocumentFragment();
+        page.history.slice().reverse().forEach(entry => {
+            fragment.appendChild(createMessage(entry.user_prompt, 'user'));
+            entry.chat_responses.forEach(response => {
+                fragment.appendChild(createMessage(response.response, 'server'));
+            });
+        });
+        const fromBottom = chatBox.scrollHeight - chatBox.scrollTop;
+        chatBox.insertBefore(fragment, chatBox.firstChild);
+        chatBox.scrollTop = beforeId ? chatBox.scrollHeight - fromBottom : chatBox.scrollHeight;
+        historyBeforeId = page.next_before_id;
+    } finally {
+        historyLoading = false;
+    }
+}
+
 // saving chat history
 function chatHistory() {
     let chatHistory = chatBox.innerHTML;
@@ -321,21 +425,18 @@ function createEmailDiv(fields) {
     container.classList.add('chat-message', 'server');
     chatBox.appendChild(container);
     chatBox.scrollTop = chatBox.scrollHeight;
-
+    return container;
 }
 
 document.addEventListener('DOMContentLoaded', async () => {
     
-    const response = await fetch('/chat-history');
-    if (response.ok) {
-        const chatHistory = await response.json();
-        chatHistory.reverse().forEach(entry => {
-            appendMessage(entry.user_prompt, 'user');
-            entry.chat_responses.forEach(response => {
-                appendMessage(response.response, 'server');
-            });
-        });
-    }
+    await loadHistory();
+    // Load older history when scrolled near the top
+    chatBox.addEventListener('scroll', () => {
+        if (chatBox.scrollTop < 100 && historyBeforeId) {
+            loadHistory(historyBeforeId);
+        }
+    });
     
     startButton.style.display = 'inline-block';
     stopButton.style.display = 'none';
@@ -374,6 +475,15 @@ document.addEventListener('DOMContentLoaded', async () => {
 
     socket.on('request-approval', (email_json) => {
         // clearEmailContainers(); // Clear existing email containers before adding a new one
+        const stream = streams[email_json.stream_id];
+        if (stream) {
+            // The form was streamed already, settle it on the final values
+            delete streams[email_json.stream_id];
+            stream.element.querySelector('[name="to-field"]').value = [].concat(email_json.to || []).join(', ');
+            stream.element.querySelector('[name="subject-field"]').value = email_json.subject || '';
+            stream.element.querySelector('[name="body-field"]').value = email_json.body || '';
+            return;
+        }
         createEmailDiv(email_json);
 });
 
@@ -403,6 +513,7 @@ document.getElementById('confirmYes').addEventListener('click', async function()
         if (response.ok) {
             console.log(result.message);
             chatBox.innerHTML = '';
+            historyBeforeId = null;
         } else {
             console.error('Failed to clear history:', result.error);
         }
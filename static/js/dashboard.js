@@ -3,6 +3,159 @@ const closeButtons = document.querySelectorAll("[data-close-button]");
 const overlay = document.getElementById("overlay");
 const dateElements = document.querySelectorAll('.card-details.date');
 const timeElements = document.querySelectorAll('.card-details.time');
+const dashboard = document.getElementById('dashboard');
+// How often to check /api/dashboard for changes while the socket is down
+const POLL_INTERVAL = 30000;
+// Cards per section, as on the server
+const SECTION_LIMIT = 10;
+// What the page shows, patched by 'dashboard-diff' pushes
+let state = JSON.parse(document.getElementById('dashboard-data').textContent) || { events: [], meets: [], drafts: [] };
+// WebSocket only: long polling needs sticky sessions once there is more than one worker
+// The server reads "tomorrow at 9" in the browser's time zone
+let socket = io({
+    transports: ['websocket'],
+    auth: { timeZone: Intl.DateTimeFormat().resolvedOptions().timeZone }
+});
+const EMPTY_MESSAGES = {
+    events: 'No upcoming events at the moment...',
+    meets: 'No upcoming meetings at the moment...',
+    drafts: 'No saved drafts at the moment...',
+};
+
+function formatDate(iso) {
+    return new Date(iso).toLocaleDateString('en-US', {
+        year: 'numeric', month: 'long', day: 'numeric'
+    });
+}
+
+function formatTime(iso) {
+    return new Date(iso).toLocaleTimeString('en-US', {
+        hour: '2-digit', minute: '2-digit', hour12: true
+    });
+}
+
+function detail(text, className) {
+    const div = document.createElement('div');
+    div.className = className ? `card-details ${className}` : 'card-details';
+    div.textContent = text;
+    return div;
+}
+
+function linkDetail(href, text) {
+    const div = detail('');
+    const link = document.createElement('a');
+    link.href = href;
+    link.target = '_blank';
+    link.textContent = text;
+    div.appendChild(link);
+    return div;
+}
+
+// Same markup as the cards in dashboard.html
+function createCard(section, item) {
+    const card = document.createElement('div');
+    card.className = 'card';
+    card.dataset.id = item.id;
+    card.dataset.key = JSON.stringify(item);
+
+    const title = document.createElement('div');
+    title.className = 'card-title';
+    const bold = document.createElement('b');
+    bold.textContent = section === 'drafts' ? item.subject : item.title;
+    title.appendChild(bold);
+    card.appendChild(title);
+
+    if (section === 'drafts') {
+        card.appendChild(detail('To: ' + item.to));
+        card.appendChild(detail('Body: ' + item.preview + '...'));
+        card.appendChild(linkDetail(item.link, 'View draft in Gmail'));
+    } else {
+        card.appendChild(detail('Date: ' + formatDate(item.start), 'date'));
+        card.appendChild(detail('Description: ' + item.description));
+        card.appendChild(detail('Time: ' + formatTime(item.start), 'time'));
+        card.appendChild(linkDetail(item.link, section === 'events' ? 'View event in Calendar' : 'View meet in Calendar'));
+    }
+    return card;
+}
+
+// Brings one section in line with items, only touching cards that changed
+function updateSection(section, items) {
+    const container = document.querySelector(`[data-section="${section}"]`);
+    if (!container) return;
+    const existing = {};
+    container.querySelectorAll('.card').forEach(card => {
+        existing[card.dataset.id] = card;
+    });
+
+    let previous = null;
+    items.forEach(item => {
+        let card = existing[item.id];
+        delete existing[item.id];
+        if (!card || card.dataset.key !== JSON.stringify(item)) {
+            const replacement = createCard(section, item);
+            if (card) card.replaceWith(replacement);
+            card = replacement;
+        }
+        const next = previous ? previous.nextElementSibling : container.firstElementChild;
+        if (next !== card) container.insertBefore(card, next);
+        previous = card;
+    });
+    Object.values(existing).forEach(card => card.remove());
+
+    let empty = container.querySelector('p');
+    if (items.length === 0 && !empty) {
+        empty = document.createElement('p');
+        empty.textContent = EMPTY_MESSAGES[section];
+        container.appendChild(empty);
+    } else if (items.length > 0 && empty) {
+        empty.remove();
+    }
+}
+
+// Keeps a section in the server's order: calendar items by start and only
+// while not over yet, drafts newest first
+function sortSection(section, items) {
+    if (section === 'drafts') {
+        items.sort((a, b) => b.id - a.id);
+    } else {
+        const now = Date.now();
+        items = items.filter(item => !item.end || new Date(item.end).getTime() >= now);
+        items.sort((a, b) => new Date(a.start) - new Date(b.start));
+    }
+    return items.slice(0, SECTION_LIMIT);
+}
+
+function applyDiffs(diffs) {
+    const touched = new Set();
+    diffs.forEach(diff => {
+        const items = (state[diff.section] || []).filter(item => item.id !== diff.id);
+        if (diff.op !== 'removed') items.push(diff.item);
+        state[diff.section] = items;
+        touched.add(diff.section);
+    });
+    touched.forEach(section => {
+        state[section] = sortSection(section, state[section]);
+        updateSection(section, state[section]);
+    });
+    // The cached copy changed, the next poll has to fetch it again
+    delete dashboard.dataset.etag;
+}
+
+async function refreshDashboard() {
+    const headers = dashboard.dataset.etag ? { 'If-None-Match': `"${dashboard.dataset.etag}"` } : {};
+    try {
+        const response = await fetch('/api/dashboard', { headers, cache: 'no-store' });
+        if (response.status === 304 || !response.ok) return;
+        const data = await response.json();
+        dashboard.dataset.etag = (response.headers.get('ETag') || '').replace(/"/g, '');
+        state = data;
+        updateSection('events', data.events);
+        updateSection('meets', data.meets);
+        updateSection('drafts', data.drafts);
+    } catch (error) {
+        console.error('Error refreshing dashboard:', error);
+    }
+}
 
 document.addEventListener('DOMContentLoaded', () => {;
     openButtons.forEach(button => {
@@ -38,18 +191,35 @@ document.addEventListener('DOMContentLoaded', () => {;
 
     dateElements.forEach(element => {
         const isoDate = element.textContent.trim().replace('Date: ', '');
-        const date = new Date(isoDate).toLocaleDateString('en-US', {
-            year: 'numeric', month: 'long', day: 'numeric'
-        });
-        element.textContent = 'Date: ' + date;
+        element.textContent = 'Date: ' + formatDate(isoDate);
     });
 
     timeElements.forEach(element => {
         const isoTime = element.textContent.trim().replace('Time: ', '');
-        const time = new Date(isoTime).toLocaleTimeString('en-US', {
-            hour: '2-digit', minute: '2-digit', hour12: true
+        element.textContent = 'Time: ' + formatTime(isoTime);
+    });
+
+    // Cards rendered by the server count as up to date
+    ['events', 'meets', 'drafts'].forEach(section => {
+        (state[section] || []).forEach(item => {
+            const card = document.querySelector(`[data-section="${section}"] [data-id="${item.id}"]`);
+            if (card) card.dataset.key = JSON.stringify(item);
         });
-        element.textContent = 'Time: ' + time;
+    });
+
+    // The server pushes changes as they are committed. Catch up on whatever
+    // was missed while disconnected, and poll only while the socket is down.
+    let connected = false;
+    socket.on('dashboard-diff', applyDiffs);
+    socket.on('connect', () => {
+        if (connected) refreshDashboard();
+        connected = true;
+    });
+    setInterval(() => {
+        if (!socket.connected) refreshDashboard();
+    }, POLL_INTERVAL);
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'visible') refreshDashboard();
     });
 
 });
\ No newline at end of file
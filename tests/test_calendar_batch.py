@@ -0,0 +1,132 @@
+import json
+import unittest
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+from flask import Flask
+from db import db, Events
+from calendar_batch import execute_batch, is_bulk_prompt, patch_body, reconcile, resolve_operation_times
+
+
+FIELDS = {'id': 'event_id', 'summary': 'title', 'dictionary': 'event_dictionary'}
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.http_calls += 1
+        for request_id, (action, event_id, body) in self.requests:
+            if event_id == 'missing':
+                self.callback(request_id, None, Exception('404'))
+            else:
+                self.callback(request_id, dict(body or {}, id=event_id, htmlLink=f'link/{event_id}'), None)
+
+
+class FakeEvents:
+    def delete(self, calendarId, eventId):
+        return ('delete', eventId, None)
+
+    def patch(self, calendarId, eventId, body, **kwargs):
+        return ('patch', eventId, body)
+
+
+class FakeService:
+    def __init__(self):
+        self.http_calls = 0
+
+    def events(self):
+        return FakeEvents()
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(self, callback)
+
+
+class TestCalendarBatch(unittest.TestCase):
+
+    # python -m unittest tests/test_calendar_batch.py
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        for event_id in ('a', 'b', 'c'):
+            db.session.add(Events(user_id=1, title=f'Standup {event_id}', description='', start='2024-07-30T09:00:00',
+                                  end='2024-07-30T09:15:00', event_id=event_id, event_dictionary='{}', link=''))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_is_bulk_prompt(self):
+        self.assertTrue(is_bulk_prompt("Cancel all my standups this week"))
+        self.assertTrue(is_bulk_prompt("move my three meetings to Friday"))
+        self.assertFalse(is_bulk_prompt("push my standup back 2 hours"))
+        self.assertFalse(is_bulk_prompt("cancel my dentist appointment"))
+        self.assertTrue(is_bulk_prompt("cancel all meetings tomorrow"))
+        self.assertTrue(is_bulk_prompt("delete both drafts"))
+        # Counts and quantifiers that aren't about the items
+        self.assertFalse(is_bulk_prompt("move dinner with 4 friends to 8pm"))
+        self.assertFalse(is_bulk_prompt("move the meeting with all hands to friday"))
+        self.assertFalse(is_bulk_prompt("update my all-hands meeting"))
+        self.assertFalse(is_bulk_prompt("move my call with all the designers"))
+        self.assertFalse(is_bulk_prompt("cancel my 1:1 with both managers"))
+
+    def test_resolve_operation_times(self):
+        zone = 'America/New_York'
+        now = datetime(2024, 7, 30, 14, 0, tzinfo=ZoneInfo(zone))
+        start = datetime(2024, 7, 31, 13, 0, tzinfo=timezone.utc)  # 09:00 in New York
+        end = datetime(2024, 7, 31, 13, 15, tzinfo=timezone.utc)
+
+        # A new time keeps the item's day and length
+        moved = resolve_operation_times({"id": "a", "start": {"time": "10:00"}, "end": None}, start, end, zone, now)
+        self.assertEqual((moved["start"], moved["end"]), ('2024-07-31T10:00:00-04:00', '2024-07-31T10:15:00-04:00'))
+        # A new day keeps the time of day
+        moved = resolve_operation_times({"id": "a", "start": {"weekday": "friday", "time": None}},
+                                        start, end, zone, now)
+        self.assertEqual((moved["start"], moved["end"]), ('2024-08-02T09:00:00-04:00', '2024-08-02T09:15:00-04:00'))
+        # Only the length
+        moved = resolve_operation_times({"id": "a", "end": {"duration_minutes": 30}}, start, end, zone, now)
+        self.assertEqual((moved["start"], moved["end"]), ('2024-07-31T09:00:00-04:00', '2024-07-31T09:30:00-04:00'))
+        self.assertEqual(resolve_operation_times({"id": "a", "action": "remove"}, start, end, zone, now),
+                         {"id": "a", "action": "remove"})
+
+    def test_patch_body(self):
+        self.assertEqual(patch_body({"id": "a", "start": "2024-08-02T09:00:00-04:00"}, "America/New_York"),
+                         {"start": {"dateTime": "2024-08-02T09:00:00-04:00", "timeZone": "America/New_York"}})
+
+    def test_batch_and_reconcile(self):
+        service = FakeService()
+        operations = [{"id": "a", "action": "remove"},
+                      {"id": "b", "action": "update", "start": "2024-08-02T09:00:00", "end": "2024-08-02T09:15:00"},
+                      {"id": "missing", "action": "remove"}]
+        # Another user invited to the same Google event
+        db.session.add(Events(user_id=2, title='Standup a', description='', start='2024-07-30T09:00:00',
+                              end='2024-07-30T09:15:00', event_id='a', event_dictionary='{}', link=''))
+        db.session.commit()
+        results = execute_batch(service, operations, "UTC")
+        self.assertEqual(service.http_calls, 1)
+
+        updated, removed, failed = reconcile(db.session, 1, Events, FIELDS, results)
+        self.assertEqual([row.event_id for row in updated], ['b'])
+        self.assertEqual([row.event_id for row in removed], ['a'])
+        self.assertEqual(failed, [operations[2]])
+
+        self.assertEqual([row.user_id for row in Events.query.filter_by(event_id='a')], [2])
+        moved = Events.query.filter_by(event_id='b').first()
+        self.assertEqual(moved.start, datetime(2024, 8, 2, 9, 0, tzinfo=timezone.utc))
+        self.assertEqual(moved.link, 'link/b')
+        self.assertEqual(json.loads(moved.event_dictionary)['start']['timeZone'], 'UTC')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import json
+import unittest
+from flask import Flask
+from googleapiclient.errors import HttpError
+from db import db, Events, Meets, SyncState
+from calendar_sync import event_time, list_events, sync_calendar
+
+
+def item(event_id, summary, meet=False, status='confirmed'):
+    data = {'id': event_id, 'status': status, 'summary': summary, 'htmlLink': f'link/{event_id}',
+            'start': {'dateTime': '2024-07-30T09:00:00-04:00'}, 'end': {'dateTime': '2024-07-30T10:00:00-04:00'}}
+    if meet:
+        data['hangoutLink'] = f'https://meet.google.com/{event_id}'
+        data['attendees'] = [{'email': 'a@example.com'}]
+    return data
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+        self.reason = 'Gone'
+
+
+class FakeList:
+    def __init__(self, service, kwargs):
+        self.service = service
+        self.kwargs = kwargs
+
+    def execute(self):
+        self.service.calls.append(self.kwargs)
+        sync_token = self.kwargs.get('syncToken')
+        if sync_token in self.service.expired:
+            raise HttpError(FakeResponse(410), b'{}')
+        pages = self.service.deltas[sync_token] if sync_token else self.service.full
+        index = int(self.kwargs.get('pageToken') or 0)
+        response = {'items': pages[index]}
+        if index + 1 < len(pages):
+            response['nextPageToken'] = str(index + 1)
+        else:
+            response['nextSyncToken'] = f'token-{len(self.service.calls)}'
+        return response
+
+
+class FakeEvents:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, **kwargs):
+        return FakeList(self.service, kwargs)
+
+
+class FakeService:
+    def __init__(self, full, deltas=None, expired=()):
+        self.full = full  # pages of items
+        self.deltas = deltas or {}  # sync token -> pages of items
+        self.expired = set(expired)
+        self.calls = []
+
+    def events(self):
+        return FakeEvents(self)
+
+
+class TestCalendarSync(unittest.TestCase):
+
+    # python -m unittest tests/test_calendar_sync.py
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_all_day_dates_start_in_the_users_zone(self):
+        all_day = {'start': {'date': '2024-08-01'}, 'end': {'date': '2024-08-02'}}
+        self.assertEqual(event_time(all_day, 'start', 'America/Los_Angeles'), '2024-08-01T00:00:00-07:00')
+        self.assertEqual(event_time(all_day, 'end'), '2024-08-02T00:00:00+00:00')
+        timed = {'start': {'dateTime': '2024-08-01T09:00:00-04:00'}}
+        self.assertEqual(event_time(timed, 'start', 'America/Los_Angeles'), '2024-08-01T09:00:00-04:00')
+        self.assertEqual(event_time({}, 'start'), '')
+
+    def test_list_events_follows_pages(self):
+        service = FakeService([[item('a', 'A')], [item('b', 'B')]])
+        items, sync_token = list_events(service)
+        self.assertEqual([i['id'] for i in items], ['a', 'b'])
+        self.assertEqual(sync_token, 'token-2')
+        self.assertEqual(service.calls[1]['pageToken'], '1')
+
+    def test_full_then_incremental_sync(self):
+        service = FakeService(
+            [[item('a', 'Standup'), item('b', 'Review', meet=True)]],
+            deltas={'token-1': [[item('a', 'Standup moved', meet=True), item('b', '', status='cancelled'),
+                                 item('c', 'Lunch')]]})
+
+        result = sync_calendar(db.session, service, 1)
+        self.assertEqual(result, {'full': True, 'upserted': 2, 'deleted': 0})
+        self.assertEqual(Events.query.one().title, 'Standup')
+        meet = Meets.query.one()
+        self.assertEqual(json.loads(meet.attendees), [{'email': 'a@example.com'}])
+        self.assertEqual(SyncState.query.filter_by(user_id=1).one().calendar_sync_token, 'token-1')
+
+        result = sync_calendar(db.session, service, 1)
+        self.assertEqual(result, {'full': False, 'upserted': 2, 'deleted': 1})
+        self.assertEqual(service.calls[-1]['syncToken'], 'token-1')
+        # 'a' gained a Meet link, 'b' was cancelled
+        self.assertEqual([e.event_id for e in Events.query.all()], ['c'])
+        self.assertEqual([(m.meet_id, m.summary) for m in Meets.query.all()], [('a', 'Standup moved')])
+
+    def test_expired_sync_token_falls_back_to_full_sync(self):
+        # Deleted in Google while the token was stale, the full listing no longer has them
+        db.session.add(Events(user_id=1, title='Gone', event_id='gone'))
+        db.session.add(Meets(user_id=1, summary='Gone too', meet_id='gone-meet'))
+        db.session.add(SyncState(user_id=1))
+        SyncState.query.one().calendar_sync_token = 'stale'
+        db.session.commit()
+        service = FakeService([[item('a', 'Standup')]], expired={'stale'})
+
+        result = sync_calendar(db.session, service, 1)
+        self.assertEqual(result, {'full': True, 'upserted': 1, 'deleted': 2})
+        self.assertNotIn('syncToken', service.calls[-1])
+        self.assertEqual(Events.query.one().event_id, 'a')
+        self.assertEqual(Meets.query.count(), 0)
+        self.assertNotEqual(SyncState.query.one().calendar_sync_token, 'stale')
+
+    def test_sync_is_scoped_to_user(self):
+        db.session.add(Events(user_id=2, title='Other', event_id='a'))
+        db.session.commit()
+        sync_calendar(db.session, FakeService([[item('a', 'Mine')]]), 1)
+        self.assertEqual(sorted((e.user_id, e.title) for e in Events.query.all()), [(1, 'Mine'), (2, 'Other')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from flask import Flask
+from sqlalchemy import event
+from db import db, History
+
+
+class TestChatHistory(unittest.TestCase):
+
+    # python -m unittest tests/test_chat_history.py
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        for n in range(5):
+            entry = History(1, f'prompt {n}')
+            entry.add_chat_response(1, f'first reply {n}')
+            entry.add_chat_response(1, f'second reply {n}')
+            db.session.add(entry)
+        db.session.add(History(2, 'someone else'))
+        db.session.commit()
+        db.session.expunge_all()
+        self.statements = 0
+        event.listen(db.engine, 'before_cursor_execute', self.count_statement)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.count_statement)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def count_statement(self, *args):
+        self.statements += 1
+
+    def test_pages_newest_first(self):
+        first = History.page(1, limit=2)
+        self.assertEqual([h.user_prompt for h in first], ['prompt 4', 'prompt 3'])
+        second = History.page(1, before_id=first[-1].id, limit=2)
+        self.assertEqual([h.user_prompt for h in second], ['prompt 2', 'prompt 1'])
+        last = History.page(1, before_id=second[-1].id, limit=2)
+        self.assertEqual([h.user_prompt for h in last], ['prompt 0'])
+
+    def test_loads_responses_in_one_query(self):
+        serialized = [h.serialize() for h in History.page(1, limit=5)]
+
+        self.assertEqual(self.statements, 2)
+        self.assertEqual([r['response'] for r in serialized[0]['chat_responses']],
+                         ['first reply 4', 'second reply 4'])
+
+
+if __name__ == '__main__':
+    unittest.main()
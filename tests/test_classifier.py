@@ -0,0 +1,86 @@
+import unittest
+from classifier import IntentClassifier, rule_classify
+
+
+class TestClassifier(unittest.TestCase):
+
+    # python -m unittest tests/test_classifier.py
+    def setUp(self):
+        self.classifier = IntentClassifier(threshold=0.7)
+        self.classifier.fit([])
+
+    def test_rules_calendar(self):
+        self.assertEqual(rule_classify("Cancel my dentist appointment"), ("gcal", "remove"))
+        self.assertEqual(rule_classify("Move my gym event to 6pm"), ("gcal", "update"))
+
+    def test_rules_email_create_over_send(self):
+        self.assertEqual(rule_classify("create an email to send to example@gmail.com about xyz"),
+                         ("gmail", "create"))
+        self.assertEqual(rule_classify("send my draft to the recruiter"), ("gmail", "send"))
+
+    def test_rules_leave_edits_of_existing_items_to_the_model(self):
+        self.assertIsNone(rule_classify("make my dentist appointment an hour later"))
+        self.assertIsNone(rule_classify("add alex@example.com to my google meet with brooke"))
+        self.assertEqual(rule_classify("add a dentist appointment to my calendar tomorrow at 3pm"), ("gcal", "create"))
+        self.assertEqual(rule_classify("schedule my dentist appointment for friday"), ("gcal", "create"))
+
+    def test_rules_send_needs_a_draft(self):
+        self.assertIsNone(rule_classify("send an email to john@x.com about lunch"))
+        self.assertEqual(rule_classify("go ahead and send my saved email to my professor"), ("gmail", "send"))
+        self.assertEqual(rule_classify("send the email draft about the project update"), ("gmail", "send"))
+
+    def test_rules_ambiguous(self):
+        self.assertIsNone(rule_classify("cancel my calendar event and email the team"))
+        self.assertIsNone(rule_classify("hello there"))
+
+    def test_model_confident(self):
+        result = self.classifier.classify("I need to talk with john@x.com on a video call thursday")
+        self.assertEqual(result, {"event_type": "gmeet", "mode": "create"})
+
+    def test_model_falls_back(self):
+        self.assertIsNone(self.classifier.classify("what is the weather like"))
+        self.assertEqual(self.classifier.report()["llm_fallbacks"], 1)
+
+    def test_learns_from_fallback(self):
+        prompt = "ping the squad on a hangout about the offsite"
+        self.classifier.record_fallback(prompt, {"event_type": "gmeet", "mode": "create"}, 0.5)
+        self.classifier.fit([])
+        self.assertEqual(self.classifier.classify(prompt), {"event_type": "gmeet", "mode": "create"})
+        self.assertEqual(self.classifier.report()["llm_calls_avoided"], 1)
+
+    def test_fit_swaps_in_a_new_model(self):
+        model = self.classifier.model
+        before = model.probs_for_vector(model.vectorize("ping the squad on a hangout"))
+        self.classifier.record_fallback("ping the squad on a hangout", {"event_type": "gmeet", "mode": "create"}, 0.5)
+        self.classifier.fit([])
+        # Readers holding the old model never see it change
+        self.assertIsNot(self.classifier.model, model)
+        self.assertEqual(model.probs_for_vector(model.vectorize("ping the squad on a hangout")), before)
+
+    def test_retrain_counts_new_examples_only(self):
+        classifier = IntentClassifier(max_extra_examples=3)
+        label = {"event_type": "gcal", "mode": "create"}
+        classifier.record_fallback("lunch with sam", label, 0.1)
+        classifier.record_fallback("lunch with sam", label, 0.1)
+        classifier.record_fallback("hello", {"event_type": "unknown", "mode": "unknown"}, 0.1)
+        self.assertFalse(classifier.retrain_due(2))
+        classifier.record_fallback("gym at 6", label, 0.1)
+        self.assertTrue(classifier.retrain_due(2))
+        # Counted from zero again, unknowns don't count
+        classifier.record_fallback("hello", {"event_type": "unknown", "mode": "unknown"}, 0.1)
+        self.assertFalse(classifier.retrain_due(1))
+
+        for prompt in ("a", "b", "c"):
+            classifier.record_fallback(prompt, label, 0.1)
+        self.assertEqual(list(classifier.extra_examples), ["a", "b", "c"])
+
+    def test_first_fit_requested_once(self):
+        classifier = IntentClassifier()
+        self.assertTrue(classifier.first_fit_due())
+        self.assertFalse(classifier.first_fit_due())
+        # Already trained, e.g. fit directly
+        self.assertFalse(self.classifier.first_fit_due())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from datetime import datetime, timezone
+from flask import Flask
+from db import db, Events, Emails, Users
+from dashboard import DashboardCache, dashboard_data, dashboard_version, track_versions, watch_changes
+
+NOW = datetime(2024, 7, 30, 12, 0, tzinfo=timezone.utc)
+
+
+def make_event(user_id, event_id, start, end):
+    return Events(user_id=user_id, title=f'Event {event_id}', description='', start=start, end=end,
+                  event_id=event_id, event_dictionary='{}', link=f'link/{event_id}')
+
+
+class TestDashboard(unittest.TestCase):
+
+    # python -m unittest tests/test_dashboard.py
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.changed = []
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_upcoming_soonest_first(self):
+        db.session.add_all([
+            make_event(1, 'later', '2024-08-02T09:00:00Z', '2024-08-02T10:00:00Z'),
+            make_event(1, 'past', '2024-07-29T09:00:00Z', '2024-07-29T10:00:00Z'),
+            make_event(1, 'running', '2024-07-30T11:30:00Z', '2024-07-30T12:30:00Z'),
+            make_event(2, 'other user', '2024-08-01T09:00:00Z', '2024-08-01T10:00:00Z'),
+            Emails(user_id=1, subject='Hi', body='A body longer than the preview', to='a@example.com',
+                   email_id='d1', email_dictionary='{}'),
+        ])
+        db.session.commit()
+
+        data = dashboard_data(1, now=NOW)
+        self.assertEqual([card['title'] for card in data['events']], ['Event running', 'Event later'])
+        self.assertEqual(data['events'][0]['start'], '2024-07-30T11:30:00+00:00')
+        self.assertEqual(data['meets'], [])
+        self.assertEqual(data['drafts'][0]['preview'], 'A body longer than t')
+
+    def test_etag_follows_content(self):
+        cache = DashboardCache()
+        etag, body = cache.set(1, {'events': [], 'meets': [], 'drafts': []})
+        self.assertEqual(cache.get(1), (etag, body))
+        self.assertEqual(cache.set(2, {'drafts': [], 'meets': [], 'events': []})[0], etag)
+        self.assertNotEqual(cache.set(1, {'events': [{'id': 1}], 'meets': [], 'drafts': []})[0], etag)
+
+    def test_commits_invalidate_owners(self):
+        cache = DashboardCache()
+        cache.set(1, {})
+        cache.set(2, {})
+        watch_changes(db.session, cache.invalidate)
+
+        db.session.add(make_event(1, 'a', '2024-08-02T09:00:00Z', '2024-08-02T10:00:00Z'))
+        db.session.flush()
+        self.assertIsNotNone(cache.get(1))
+        db.session.commit()
+        self.assertIsNone(cache.get(1))
+        self.assertIsNotNone(cache.get(2))
+
+        cache.set(1, {})
+        event = Events.query.filter_by(event_id='a').one()
+        event.title = 'Renamed'
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+        self.assertIsNotNone(cache.get(1))
+
+    def test_commits_elsewhere_retire_cached_versions(self):
+        track_versions(db.session)
+        for name in ('a', 'b'):
+            user = Users(name=name, email=f'{name}@example.com')
+            user.set_password('secret')
+            db.session.add(user)
+        db.session.commit()
+        # This process' cache, the commit below comes from another one
+        cache = DashboardCache()
+        before = dashboard_version(1)
+        cache.set(1, {}, before)
+        cache.set(2, {}, dashboard_version(2))
+
+        db.session.add(make_event(1, 'a', '2024-08-02T09:00:00Z', '2024-08-02T10:00:00Z'))
+        db.session.flush()
+        db.session.rollback()
+        self.assertIsNotNone(cache.get(1, dashboard_version(1)))
+
+        db.session.add(make_event(1, 'a', '2024-08-02T09:00:00Z', '2024-08-02T10:00:00Z'))
+        db.session.commit()
+        self.assertGreater(dashboard_version(1), before)
+        self.assertIsNone(cache.get(1, dashboard_version(1)))
+        self.assertIsNotNone(cache.get(2, dashboard_version(2)))
+
+    def test_commits_report_diffs(self):
+        watch_changes(db.session, self.changed.append)
+
+        db.session.add(make_event(1, 'a', '2024-08-02T09:00:00Z', '2024-08-02T10:00:00Z'))
+        db.session.commit()
+        event = Events.query.filter_by(event_id='a').one()
+        event.title = 'Renamed'
+        db.session.commit()
+        db.session.delete(event)
+        db.session.commit()
+
+        added, updated, removed = [changes[1][0] for changes in self.changed]
+        self.assertEqual((added['section'], added['op'], added['item']['title']), ('events', 'added', 'Event a'))
+        self.assertEqual((updated['op'], updated['item']['title']), ('updated', 'Renamed'))
+        self.assertEqual(removed, {'section': 'events', 'op': 'removed', 'id': event.id})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+from datetime import date, datetime, time
+from zoneinfo import ZoneInfo
+from dates import overlay_when, parse_change, parse_when, simple_title
+from relative_time import resolve_times
+
+ZONE = 'America/New_York'
+# A Wednesday afternoon
+NOW = datetime(2024, 7, 31, 14, 5, tzinfo=ZoneInfo(ZONE))
+
+
+def resolved(prompt, data=None, duration_minutes=None, parse=parse_when):
+    data = overlay_when(data or {}, parse(prompt, NOW), ZONE, duration_minutes)
+    times = resolve_times(data, ZONE, now=NOW)
+    return times['start']['dateTime'], times['end']['dateTime']
+
+
+class TestDates(unittest.TestCase):
+
+    # python -m unittest tests/test_dates.py
+    def test_relative_days_and_weekdays(self):
+        self.assertEqual(parse_when('standup tomorrow at 9am', NOW)['date'], date(2024, 8, 1))
+        self.assertEqual(parse_when('review the day after tomorrow', NOW)['date'], date(2024, 8, 2))
+        self.assertEqual(parse_when('retro in 2 weeks', NOW)['date'], date(2024, 8, 14))
+        self.assertEqual(parse_when('dentist on friday', NOW)['date'], date(2024, 8, 2))
+        # Today's weekday is next week's, unless it's "this"
+        self.assertEqual(parse_when('yoga wednesday', NOW)['date'], date(2024, 8, 7))
+        self.assertEqual(parse_when('yoga this wednesday', NOW)['date'], date(2024, 7, 31))
+
+    def test_calendar_dates(self):
+        self.assertEqual(parse_when('offsite on Aug 5th', NOW)['date'], date(2024, 8, 5))
+        self.assertEqual(parse_when('offsite on 5 August', NOW)['date'], date(2024, 8, 5))
+        self.assertEqual(parse_when('offsite 2025-01-02', NOW)['date'], date(2025, 1, 2))
+        self.assertEqual(parse_when('offsite 8/12', NOW)['date'], date(2024, 8, 12))
+        # Past dates without a year are next year's
+        self.assertEqual(parse_when('party on July 4', NOW)['date'], date(2025, 7, 4))
+
+    def test_times(self):
+        self.assertEqual(parse_when('call at 9:30 pm', NOW)['time'], time(21, 30))
+        self.assertEqual(parse_when('call at 3', NOW)['time'], time(15, 0))
+        self.assertEqual(parse_when('call at 07:30', NOW)['time'], time(7, 30))
+        self.assertEqual(parse_when('lunch at noon', NOW)['time'], time(12, 0))
+        self.assertEqual(parse_when('gym tonight', NOW)['time'], time(19, 0))
+        self.assertIsNone(parse_when('write the report', NOW))
+
+    def test_ranges_and_durations(self):
+        self.assertEqual(resolved('focus 9-11am'), ('2024-07-31T09:00:00-04:00', '2024-07-31T11:00:00-04:00'))
+        self.assertEqual(resolved('lunch friday from 11 to 1pm'),
+                         ('2024-08-02T11:00:00-04:00', '2024-08-02T13:00:00-04:00'))
+        self.assertEqual(resolved('standup tomorrow at 9am for 15 minutes'),
+                         ('2024-08-01T09:00:00-04:00', '2024-08-01T09:15:00-04:00'))
+        self.assertEqual(resolved('a 45-minute review on 8/12 at 11:15'),
+                         ('2024-08-12T11:15:00-04:00', '2024-08-12T12:00:00-04:00'))
+        self.assertEqual(resolved('sync in 2 hours for an hour and a half'),
+                         ('2024-07-31T16:05:00-04:00', '2024-07-31T17:35:00-04:00'))
+        # Not a range
+        when = parse_when('dinner with 2 to 3 people on saturday', NOW)
+        self.assertIsNone(when['time'])
+        self.assertEqual(when['date'], date(2024, 8, 3))
+
+    def test_overlay_keeps_what_the_prompt_leaves_out(self):
+        current = {'start': {'date': '2024-08-02', 'time': '09:00'}, 'end': {'date': '2024-08-02', 'time': '09:15'}}
+        # Only the time moves, the day and the length stay
+        self.assertEqual(resolved('move my standup to 3pm', current, duration_minutes=15),
+                         ('2024-08-02T15:00:00-04:00', '2024-08-02T15:15:00-04:00'))
+        # Only the length changes
+        llm = {'start': {'weekday': 'friday', 'time': '09:00'}, 'end': {'duration_minutes': 30}}
+        self.assertEqual(resolved('make it last 2 hours', llm),
+                         ('2024-08-02T09:00:00-04:00', '2024-08-02T11:00:00-04:00'))
+
+    def test_update_reads_only_the_new_time(self):
+        # What the LLM answered, the old time in the prompt only names the event
+        llm = {'start': {'date': '2024-08-02', 'time': '17:00'}, 'end': {'duration_minutes': 30}}
+        self.assertEqual(resolved('move my 3pm meeting to 5pm', llm, 30, parse_change),
+                         ('2024-08-02T17:00:00-04:00', '2024-08-02T17:30:00-04:00'))
+        llm = {'start': {'date': '2024-08-05', 'time': '09:00'}, 'end': {'duration_minutes': 15}}
+        self.assertEqual(resolved('move my friday standup to monday', llm, 15, parse_change),
+                         ('2024-08-05T09:00:00-04:00', '2024-08-05T09:15:00-04:00'))
+        llm = {'start': {'date': '2024-08-01', 'time': '14:00'}, 'end': {'duration_minutes': 60}}
+        self.assertEqual(resolved('reschedule the dentist from tuesday to thursday at 2pm', llm, 60, parse_change),
+                         ('2024-08-01T14:00:00-04:00', '2024-08-01T15:00:00-04:00'))
+        # "until" moves the end, a range after "to" is read whole
+        self.assertEqual(resolved('extend the 3pm review until 5pm', llm, 60, parse_change),
+                         ('2024-08-01T14:00:00-04:00', '2024-08-01T17:00:00-04:00'))
+        self.assertEqual(resolved('change the sync to 9 to 10am', llm, 60, parse_change),
+                         ('2024-08-01T09:00:00-04:00', '2024-08-01T10:00:00-04:00'))
+        # Nothing after "to", the LLM's answer stands
+        self.assertIsNone(parse_change('add ada@example.com to my 3pm meeting', NOW))
+        self.assertIsNone(parse_change('rename friday\'s standup', NOW))
+
+    def test_simple_title(self):
+        def title(prompt):
+            return simple_title(prompt, parse_when(prompt, NOW))
+        self.assertEqual(title('schedule standup tomorrow at 9am for 15 minutes'), 'Standup')
+        self.assertEqual(title('Create an event for dentist on friday at 3'), 'Dentist')
+        self.assertEqual(title('put Project sync in my calendar on July 30 at noon'), 'Project sync')
+        # Anything more detailed is left to the LLM
+        self.assertIsNone(title('book a call with ada@example.com on Aug 5th at 10am'))
+        self.assertIsNone(title('team lunch next monday from 12 to 1:30pm'))
+        self.assertIsNone(title('schedule a long planning session with the whole design team and '
+                                'marketing tomorrow at 3pm'))
+        self.assertIsNone(title('add standup every monday at 9am'))
+        self.assertIsNone(title('schedule a daily standup at 9am'))
+        self.assertIsNone(title('put gym on my calendar tuesdays at 6pm'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+import base64
+import json
+import unittest
+from flask import Flask
+from googleapiclient.errors import HttpError
+from db import db, Emails, SyncState
+from gmail_drafts import execute_batch, plain_text, reconcile, sync_drafts
+
+
+def encode(text):
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('utf-8').rstrip('=')
+
+
+def draft(draft_id, message_id, subject, to='team@example.com', body='Hello'):
+    return {'id': draft_id, 'message': {'id': message_id, 'labelIds': ['DRAFT'], 'payload': {
+        'mimeType': 'multipart/alternative',
+        'headers': [{'name': 'Subject', 'value': subject}, {'name': 'To', 'value': to}],
+        'parts': [{'mimeType': 'text/html', 'body': {'data': encode(f'<p>{body}</p>')}},
+                  {'mimeType': 'text/plain', 'body': {'data': encode(body)}}]}}}
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+        self.reason = 'Error'
+
+
+class FakeRequest:
+    def __init__(self, service, name, run):
+        self.service = service
+        self.name = name
+        self.run = run
+
+    def execute(self):
+        self.service.calls.append(self.name)
+        return self.run()
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.batches.append([request.name for _, request in self.requests])
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.run(), None)
+            except HttpError as e:
+                self.callback(request_id, None, e)
+
+
+class FakeGmail:
+    def __init__(self, drafts, history=None, history_id='100', expired=()):
+        self.drafts_by_id = {d['id']: d for d in drafts}
+        self.history_pages = history or {}  # start history id -> history records
+        self.history_id = history_id
+        self.expired = set(expired)
+        self.calls = []
+        self.batches = []
+        self.next_id = 0
+
+    def users(self):
+        return self
+
+    def drafts(self):
+        return self
+
+    def history(self):
+        return self
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(self, callback)
+
+    def getProfile(self, userId):
+        return FakeRequest(self, 'getProfile', lambda: {'historyId': self.history_id})
+
+    def missing(self, draft_id):
+        if draft_id not in self.drafts_by_id:
+            raise HttpError(FakeResponse(404), b'{}')
+
+    def get(self, userId, id, format):
+        def run():
+            self.missing(id)
+            return self.drafts_by_id[id]
+        return FakeRequest(self, 'drafts.get', run)
+
+    def create(self, userId, body):
+        def run():
+            self.next_id += 1
+            created = {'id': f'new-{self.next_id}', 'message': {'id': f'm-new-{self.next_id}'}}
+            self.drafts_by_id[created['id']] = created
+            return created
+        return FakeRequest(self, 'drafts.create', run)
+
+    def send(self, userId, body):
+        def run():
+            self.missing(body['id'])
+            return {'id': self.drafts_by_id.pop(body['id'])['message']['id'], 'labelIds': ['SENT']}
+        return FakeRequest(self, 'drafts.send', run)
+
+    def delete(self, userId, id):
+        def run():
+            self.missing(id)
+            del self.drafts_by_id[id]
+            return ''
+        return FakeRequest(self, 'drafts.delete', run)
+
+    def list(self, userId, **kwargs):
+        if 'startHistoryId' in kwargs:
+            def run():
+                if kwargs['startHistoryId'] in self.expired:
+                    raise HttpError(FakeResponse(404), b'{}')
+                return {'history': self.history_pages.get(kwargs['startHistoryId'], []),
+                        'historyId': self.history_id}
+            return FakeRequest(self, 'history.list', run)
+        return FakeRequest(self, 'drafts.list', lambda: {'drafts': [
+            {'id': d['id'], 'message': {'id': d['message']['id']}} for d in self.drafts_by_id.values()]})
+
+
+class TestGmailDrafts(unittest.TestCase):
+
+    # python -m unittest tests/test_gmail_drafts.py
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_plain_text_prefers_text_part(self):
+        self.assertEqual(plain_text(draft('d1', 'm1', 'Hi', body='See you at 9')['message']['payload']),
+                         'See you at 9')
+
+    def test_batch_and_reconcile(self):
+        gmail = FakeGmail([draft(f'd{i}', f'm{i}', f'Draft {i}') for i in range(60)])
+        sync_drafts(db.session, gmail, 1)
+        operations = [{'id': f'd{i}', 'action': 'send'} for i in range(55)]
+        operations += [{'id': 'd55', 'action': 'delete'}, {'id': 'gone', 'action': 'delete'},
+                       {'action': 'create', 'raw': 'Subject: New\n\nBody',
+                        'fields': {'subject': 'New', 'body': 'Body', 'to': 'ada@example.com'}}]
+
+        results = execute_batch(gmail, operations)
+        # 58 calls in two HTTP requests instead of 58
+        self.assertEqual([len(batch) for batch in gmail.batches[-2:]], [50, 8])
+        created, updated, removed, failed = reconcile(db.session, 1, results)
+
+        self.assertEqual((len(created), len(updated), len(removed)), (1, 0, 56))
+        self.assertEqual(failed, [{'id': 'gone', 'action': 'delete'}])
+        self.assertEqual(sorted(row.email_id for row in Emails.query.all()), ['d56', 'd57', 'd58', 'd59', 'new-1'])
+        self.assertEqual(Emails.query.filter_by(email_id='new-1').one().message_id, 'm-new-1')
+
+    def test_full_then_incremental_sync(self):
+        gmail = FakeGmail([draft('d1', 'm1', 'Standup notes'), draft('d2', 'm2', 'Offsite')])
+        result = sync_drafts(db.session, gmail, 1)
+        self.assertEqual(result, {'full': True, 'upserted': 2, 'deleted': 0})
+        row = Emails.query.filter_by(email_id='d1').one()
+        self.assertEqual((row.subject, row.to, row.body, row.message_id),
+                         ('Standup notes', 'team@example.com', 'Hello', 'm1'))
+        self.assertEqual(json.loads(row.email_dictionary)['subject'], 'Standup notes')
+        self.assertEqual(SyncState.query.one().gmail_history_id, '100')
+
+        # d1 was edited (new message id), d2 was sent, d3 was written
+        gmail.drafts_by_id['d1'] = draft('d1', 'm1b', 'Standup notes v2')
+        del gmail.drafts_by_id['d2']
+        gmail.drafts_by_id['d3'] = draft('d3', 'm3', 'Lunch')
+        gmail.history_id = '120'
+        gmail.history_pages['100'] = [
+            {'messagesDeleted': [{'message': {'id': 'm1'}}]},
+            {'messagesAdded': [{'message': {'id': 'm1b', 'labelIds': ['DRAFT']}}]},
+            {'labelsRemoved': [{'message': {'id': 'm2'}, 'labelIds': ['DRAFT']}]},
+            {'messagesAdded': [{'message': {'id': 'm3', 'labelIds': ['DRAFT']}}]},
+        ]
+        gmail.calls.clear()
+
+        result = sync_drafts(db.session, gmail, 1)
+        self.assertEqual(result, {'full': False, 'upserted': 2, 'deleted': 2})
+        self.assertNotIn('getProfile', gmail.calls)
+        self.assertEqual(sorted((row.email_id, row.subject) for row in Emails.query.all()),
+                         [('d1', 'Standup notes v2'), ('d3', 'Lunch')])
+        self.assertEqual(SyncState.query.one().gmail_history_id, '120')
+
+    def test_expired_history_falls_back_to_full_sync(self):
+        db.session.add(Emails(user_id=1, subject='Old', to='a@example.com', email_id='old'))
+        db.session.add(SyncState(user_id=1))
+        SyncState.query.one().gmail_history_id = 'stale'
+        db.session.commit()
+        gmail = FakeGmail([draft('d1', 'm1', 'Standup')], expired={'stale'})
+
+        result = sync_drafts(db.session, gmail, 1)
+        self.assertEqual(result, {'full': True, 'upserted': 1, 'deleted': 1})
+        self.assertEqual([row.email_id for row in Emails.query.all()], ['d1'])
+        self.assertEqual(SyncState.query.one().gmail_history_id, '100')
+
+    def test_sync_is_scoped_to_user(self):
+        db.session.add(Emails(user_id=2, subject='Other', to='a@example.com', email_id='d1'))
+        db.session.commit()
+        sync_drafts(db.session, FakeGmail([draft('d1', 'm1', 'Mine')]), 1)
+        self.assertEqual(sorted((row.user_id, row.subject) for row in Emails.query.all()), [(1, 'Mine'), (2, 'Other')])
+
+
+if __name__ == '__main__':
+    unittest.main()
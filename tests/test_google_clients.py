@@ -0,0 +1,33 @@
+import unittest
+from google.oauth2.credentials import Credentials
+from google_clients import GoogleClientCache
+
+
+class TestGoogleClients(unittest.TestCase):
+
+    # python -m unittest tests/test_google_clients.py
+    def setUp(self):
+        self.cache = GoogleClientCache(maxsize=2)
+        self.creds = Credentials(token='token')
+
+    def test_service_reused(self):
+        service = self.cache.service(1, 'calendar', 'v3', self.creds)
+        self.assertIs(self.cache.service(1, 'calendar', 'v3', self.creds), service)
+        self.assertIsNot(self.cache.service(2, 'calendar', 'v3', self.creds), service)
+
+    def test_new_credentials_rebuild(self):
+        service = self.cache.service(1, 'gmail', 'v1', self.creds)
+        refreshed = Credentials(token='refreshed')
+        self.cache.store_credentials(1, refreshed)
+        self.assertIs(self.cache.get_credentials(1), refreshed)
+        self.assertIsNot(self.cache.service(1, 'gmail', 'v1', refreshed), service)
+
+    def test_lru_bound(self):
+        for user_id in range(3):
+            self.cache.store_credentials(user_id, self.creds)
+        self.assertIsNone(self.cache.get_credentials(0))
+        self.assertIs(self.cache.get_credentials(2), self.creds)
+
+
+if __name__ == '__main__':
+    unittest.main()
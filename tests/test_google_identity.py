@@ -0,0 +1,78 @@
+import json
+import unittest
+from google_identity import fetch_identity, identity_stale, sender_address
+
+
+class FakeRequest:
+    def __init__(self, service, name, result):
+        self.service = service
+        self.name = name
+        self.result = result
+
+    def execute(self):
+        self.service.calls.append(self.name)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FakeGmail:
+    def __init__(self, aliases):
+        self.aliases = aliases
+        self.calls = []
+
+    def users(self):
+        return self
+
+    def settings(self):
+        return self
+
+    def sendAs(self):
+        return self
+
+    def getProfile(self, userId):
+        return FakeRequest(self, 'getProfile', {'emailAddress': 'ada@example.com'})
+
+    def list(self, userId):
+        return FakeRequest(self, 'sendAs.list', self.aliases)
+
+
+class FakeUser:
+    def __init__(self, google_email, token):
+        self.google_email = google_email
+        self.token = token
+
+
+def token(refresh_token, access_token='a'):
+    return json.dumps({'refresh_token': refresh_token, 'token': access_token})
+
+
+class TestGoogleIdentity(unittest.TestCase):
+
+    # python -m unittest tests/test_google_identity.py
+    def test_fetch_identity(self):
+        gmail = FakeGmail({'sendAs': [{'sendAsEmail': 'alias@example.com', 'displayName': 'Alias'},
+                                      {'sendAsEmail': 'ada@example.com', 'displayName': 'Ada Lovelace',
+                                       'isPrimary': True}]})
+        self.assertEqual(fetch_identity(gmail), {'email': 'ada@example.com', 'name': 'Ada Lovelace'})
+        self.assertEqual(gmail.calls, ['getProfile', 'sendAs.list'])
+
+    def test_name_is_optional(self):
+        self.assertEqual(fetch_identity(FakeGmail(RuntimeError('forbidden'))),
+                         {'email': 'ada@example.com', 'name': None})
+        self.assertEqual(fetch_identity(FakeGmail({'sendAs': [{'isPrimary': True, 'displayName': ''}]}))['name'],
+                         None)
+
+    def test_identity_stale(self):
+        self.assertTrue(identity_stale(FakeUser(None, token('r1')), token('r1')))
+        self.assertFalse(identity_stale(FakeUser('ada@example.com', token('r1')), token('r1', access_token='b')))
+        self.assertTrue(identity_stale(FakeUser('ada@example.com', token('r1')), token('r2')))
+        self.assertTrue(identity_stale(FakeUser('ada@example.com', None), token('r1')))
+
+    def test_sender_address(self):
+        self.assertEqual(sender_address('ada@example.com', 'Ada Lovelace'), 'Ada Lovelace <ada@example.com>')
+        self.assertEqual(sender_address('ada@example.com'), 'ada@example.com')
+
+
+if __name__ == '__main__':
+    unittest.main()
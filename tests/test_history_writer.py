@@ -0,0 +1,102 @@
+import threading
+import unittest
+from flask import Flask
+from sqlalchemy import event
+from db import db, History, ChatResponse
+from history_writer import HistoryBuffer, HistoryWriter, write_buffers
+
+
+class TestHistoryWriter(unittest.TestCase):
+
+    # python -m unittest tests/test_history_writer.py
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.commits = 0
+        event.listen(db.engine, 'commit', self.count_commit)
+
+    def tearDown(self):
+        event.remove(db.engine, 'commit', self.count_commit)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def count_commit(self, conn):
+        self.commits += 1
+
+    def write(self, buffers):
+        write_buffers(db.session, buffers)
+
+    def test_one_commit_per_prompt(self):
+        buffer = HistoryBuffer(1, 'schedule standup tomorrow 9am')
+        buffer.add('Sure thing!')
+        buffer.add('Event Created!')
+        HistoryWriter(self.write).submit(buffer)
+
+        self.assertEqual(self.commits, 1)
+        entry = History.query.one()
+        self.assertEqual([r.response for r in entry.chat_responses], ['Sure thing!', 'Event Created!'])
+        self.assertEqual({r.user_id for r in ChatResponse.query.all()}, {1})
+
+    def test_write_behind_batches_prompts(self):
+        written = []
+        done = threading.Event()
+
+        def write(buffers):
+            written.append(len(buffers))
+            if sum(written) == 5:
+                done.set()
+
+        writer = HistoryWriter(write, write_behind=True, interval=0.2)
+        for n in range(5):
+            writer.submit(HistoryBuffer(n, f'prompt {n}'))
+        self.assertTrue(done.wait(2))
+        self.assertEqual(written, [5])
+        self.assertEqual(writer.stats, {'prompts': 5, 'writes': 1, 'failed': 0})
+
+    def test_flush_writes_queued(self):
+        writer = HistoryWriter(self.write, write_behind=True, start_task=lambda target: None)
+        for n in range(3):
+            writer.submit(HistoryBuffer(1, f'prompt {n}'))
+        self.assertEqual(History.query.count(), 0)
+        writer.flush()
+        self.assertEqual(History.query.count(), 3)
+        self.assertEqual(self.commits, 1)
+
+    def test_flush_waits_for_the_batch_being_written(self):
+        started, release = threading.Event(), threading.Event()
+        written = []
+
+        def write(buffers):
+            started.set()
+            release.wait(2)
+            written.extend(buffer.entry.user_prompt for buffer in buffers)
+
+        writer = HistoryWriter(write, write_behind=True, interval=0)
+        writer.submit(HistoryBuffer(1, 'prompt'))
+        self.assertTrue(started.wait(2))
+        # The queue is empty, the batch is still being written
+        flushed = threading.Thread(target=writer.flush)
+        flushed.start()
+        flushed.join(0.2)
+        self.assertTrue(flushed.is_alive())
+        release.set()
+        flushed.join(2)
+        self.assertFalse(flushed.is_alive())
+        self.assertEqual(written, ['prompt'])
+
+    def test_failed_write_is_reported(self):
+        def write(buffers):
+            raise RuntimeError('disk full')
+
+        writer = HistoryWriter(write)
+        writer.submit(HistoryBuffer(1, 'prompt'))
+        self.assertEqual(writer.stats['failed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
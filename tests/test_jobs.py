@@ -0,0 +1,58 @@
+import threading
+import time
+import unittest
+from jobs import JobQueue
+
+
+class TestJobs(unittest.TestCase):
+
+    # python -m unittest tests/test_jobs.py
+    def test_per_user_order(self):
+        queue = JobQueue(workers=4)
+        order = []
+
+        def work(user, n):
+            time.sleep(0.01 * (3 - n))
+            order.append((user, n))
+
+        jobs = [queue.submit(user, work, user, n) for n in range(3) for user in ('a', 'b')]
+        for job in jobs:
+            self.assertTrue(job.done.wait(2))
+        self.assertEqual([n for user, n in order if user == 'a'], [0, 1, 2])
+        self.assertEqual([n for user, n in order if user == 'b'], [0, 1, 2])
+
+    def test_bounded_pool(self):
+        queue = JobQueue(workers=2)
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def work():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+
+        jobs = [queue.submit(user, work) for user in range(6)]
+        for job in jobs:
+            self.assertTrue(job.done.wait(2))
+        self.assertEqual(max(peak), 2)
+
+    def test_status_and_failures(self):
+        statuses = []
+        queue = JobQueue(workers=1, on_status=lambda job: statuses.append(job.status))
+
+        def fail():
+            raise ValueError("boom")
+
+        job = queue.submit('a', fail, room='sid')
+        self.assertTrue(job.done.wait(2))
+        self.assertEqual(statuses, ['queued', 'started', 'failed'])
+        self.assertEqual(job.serialize()['error'], 'boom')
+        self.assertEqual(queue.submit('a', lambda: 'ok').done.wait(2), True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import json
+import unittest
+from json_stream import JSONFieldStream
+
+
+def stream(document, size):
+    parser = JSONFieldStream()
+    fields = {}
+    for offset in range(0, len(document), size):
+        for path, text in parser.feed(document[offset:offset + size]).items():
+            fields[path] = fields.get(path, '') + text
+    return parser, fields
+
+
+class TestJSONStream(unittest.TestCase):
+
+    # python -m unittest tests/test_json_stream.py
+    def test_fields_match_final_document(self):
+        email = {'from': 'me@example.com', 'to': ['a@example.com', 'b@example.com'], 'cc': [],
+                 'subject': 'Lunch "tomorrow"?', 'body': 'Hi team,\n\nSee you at 12.\\o/ é \U0001F600'}
+        document = json.dumps(email)
+        for size in (1, 2, 5, 64):
+            parser, fields = stream(document, size)
+            self.assertEqual(parser.result(), email)
+            self.assertEqual(fields, {'from': email['from'], 'to.0': 'a@example.com', 'to.1': 'b@example.com',
+                                      'subject': email['subject'], 'body': email['body']})
+
+    def test_nested_paths_and_non_strings(self):
+        _, fields = stream('{"summary": "Standup", "start": {"day_offset": 1, "time": "09:00"}, '
+                           '"reminders": {"useDefault": true}}', 3)
+        self.assertEqual(fields, {'summary': 'Standup', 'start.time': '09:00'})
+
+    def test_reports_partial_values(self):
+        parser = JSONFieldStream()
+        self.assertEqual(parser.feed('{"subject": "Hel'), {'subject': 'Hel'})
+        self.assertEqual(parser.feed('lo", "body": "'), {'subject': 'lo', 'body': ''})
+        self.assertEqual(parser.feed('Dear'), {'body': 'Dear'})
+
+
+if __name__ == '__main__':
+    unittest.main()
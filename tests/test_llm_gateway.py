@@ -0,0 +1,137 @@
+import threading
+import time
+import types
+import unittest
+import httpx
+import openai
+from llm_gateway import LLMGateway
+
+
+def status_error(cls, status, headers=None):
+    response = httpx.Response(status, headers=headers or {}, request=httpx.Request('POST', 'http://llm.test'))
+    return cls(f'{status}', response=response, body=None)
+
+
+def completion(content, usage=None):
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))],
+                                 usage=usage)
+
+
+def usage(prompt_tokens, completion_tokens, cached_tokens=0):
+    return types.SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                 prompt_tokens_details=types.SimpleNamespace(cached_tokens=cached_tokens))
+
+
+def chunk(content):
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=content))])
+
+
+class FakeClient:
+    def __init__(self, outcomes, delay=0):
+        self.outcomes = list(outcomes)
+        self.delay = delay
+        self.calls = []
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        time.sleep(self.delay)
+        outcome = self.outcomes.pop(0) if self.outcomes else completion('ok')
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class TestLLMGateway(unittest.TestCase):
+
+    # python -m unittest tests/test_llm_gateway.py
+    def test_retries_429_and_5xx_with_backoff(self):
+        client = FakeClient([status_error(openai.RateLimitError, 429, {'retry-after': '1.5'}),
+                             status_error(openai.InternalServerError, 503), completion('{"a": 1}')])
+        sleeps = []
+        gateway = LLMGateway(client=client, sleep=sleeps.append, backoff=0.1)
+        self.assertEqual(gateway.chat([], label='format', json_mode=True), '{"a": 1}')
+        self.assertEqual(len(client.calls), 3)
+        self.assertEqual(client.calls[0]['response_format'], {'type': 'json_object'})
+        self.assertGreaterEqual(sleeps[0], 1.5)  # honours Retry-After
+        self.assertLessEqual(sleeps[1], 0.2)
+        stats = gateway.stats()['format']
+        self.assertEqual((stats['calls'], stats['retries'], stats['errors']), (1, 2, 0))
+
+    def test_client_errors_are_not_retried(self):
+        client = FakeClient([status_error(openai.BadRequestError, 400)])
+        gateway = LLMGateway(client=client, sleep=lambda _: None)
+        with self.assertRaises(openai.BadRequestError):
+            gateway.chat([])
+        self.assertEqual(len(client.calls), 1)
+        self.assertEqual(gateway.stats()['chat']['errors'], 1)
+
+    def test_gives_up_after_max_retries(self):
+        client = FakeClient([status_error(openai.InternalServerError, 500)] * 5)
+        gateway = LLMGateway(client=client, sleep=lambda _: None, max_retries=2)
+        with self.assertRaises(openai.InternalServerError):
+            gateway.chat([])
+        self.assertEqual(len(client.calls), 3)
+
+    def test_concurrency_limits(self):
+        client = FakeClient([], delay=0.05)
+        gateway = LLMGateway(client=client, max_concurrency=3, user_concurrency=1)
+        running = []
+        peak = {'all': 0, 'a': 0}
+        lock = threading.Lock()
+        original = client.create
+
+        def create(**kwargs):
+            with lock:
+                running.append(kwargs['user'])
+                peak['all'] = max(peak['all'], len(running))
+                peak['a'] = max(peak['a'], running.count('a'))
+            try:
+                return original(**kwargs)
+            finally:
+                with lock:
+                    running.remove(kwargs['user'])
+
+        client.chat.completions.create = create
+        threads = [threading.Thread(target=gateway.chat, args=([],), kwargs={'user_id': user, 'user': user})
+                   for user in ['a'] * 4 + ['b', 'c', 'd', 'e']]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(peak['all'], 3)
+        self.assertEqual(peak['a'], 1)
+        self.assertEqual(gateway.user_slots, {})
+
+    def test_stream_yields_content(self):
+        client = FakeClient([[chunk('{"a"'), chunk(None), chunk(': 1}')]])
+        gateway = LLMGateway(client=client)
+        self.assertEqual(''.join(gateway.stream([], user_id=1, label='format')), '{"a": 1}')
+        self.assertTrue(client.calls[0]['stream'])
+        self.assertEqual(gateway.stats()['format']['calls'], 1)
+        self.assertEqual(client.calls[0]['stream_options'], {'include_usage': True})
+        self.assertEqual(gateway.user_slots, {})
+
+    def test_json_schema_response_format(self):
+        client = FakeClient([completion('{}'), completion('{}')])
+        gateway = LLMGateway(client=client)
+        schema = {'name': 'EventPayload', 'strict': True, 'schema': {'type': 'object'}}
+        gateway.chat([], json_mode=True, json_schema=schema)
+        gateway.chat([], json_mode=True)
+        self.assertEqual(client.calls[0]['response_format'], {'type': 'json_schema', 'json_schema': schema})
+        self.assertEqual(client.calls[1]['response_format'], {'type': 'json_object'})
+
+    def test_records_token_usage_per_label(self):
+        client = FakeClient([completion('{}', usage(1200, 40, cached_tokens=1024)), completion('{}', usage(800, 20)),
+                             completion('{}')])
+        gateway = LLMGateway(client=client)
+        for _ in range(3):
+            gateway.chat([], label='format_gcal_update')
+        stats = gateway.stats()['format_gcal_update']
+        self.assertEqual((stats['prompt_tokens'], stats['completion_tokens'], stats['cached_tokens']),
+                         (2000, 60, 1024))
+        self.assertEqual(stats['avg_prompt_tokens'], 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
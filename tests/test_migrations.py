@@ -0,0 +1,129 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from flask import Flask
+from flask_migrate import Migrate, downgrade, upgrade
+from sqlalchemy import inspect, text
+from db import db, Events
+from database import upgrade_schema
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+# What create_all() built from the models before the app had migrations, no SyncState yet
+BASELINE_SCHEMA = [
+    "CREATE TABLE users (id INTEGER NOT NULL, name VARCHAR(60) NOT NULL, email VARCHAR(120) NOT NULL, "
+    "password VARCHAR(60) NOT NULL, token VARCHAR, PRIMARY KEY (id), UNIQUE (email))",
+    "CREATE TABLE \"Events\" (id INTEGER NOT NULL, user_id INTEGER, title VARCHAR NOT NULL, "
+    "description VARCHAR NOT NULL, start VARCHAR NOT NULL, \"end\" VARCHAR NOT NULL, event_id VARCHAR NOT NULL, "
+    "event_dictionary VARCHAR NOT NULL, link VARCHAR NOT NULL, PRIMARY KEY (id))",
+    "CREATE TABLE \"Meets\" (id INTEGER NOT NULL, user_id INTEGER, summary VARCHAR NOT NULL, "
+    "description VARCHAR NOT NULL, start VARCHAR NOT NULL, \"end\" VARCHAR NOT NULL, attendees VARCHAR NOT NULL, "
+    "meet_id VARCHAR NOT NULL, meet_dictionary VARCHAR NOT NULL, link VARCHAR NOT NULL, PRIMARY KEY (id))",
+    "CREATE TABLE \"Emails\" (id INTEGER NOT NULL, user_id INTEGER, subject VARCHAR NOT NULL, body VARCHAR NOT NULL, "
+    "cc VARCHAR, \"to\" VARCHAR NOT NULL, email_id VARCHAR NOT NULL, email_dictionary VARCHAR NOT NULL, "
+    "link VARCHAR NOT NULL, PRIMARY KEY (id))",
+    "CREATE TABLE \"History\" (id INTEGER NOT NULL, user_id INTEGER, user_prompt VARCHAR NOT NULL, PRIMARY KEY (id))",
+    "CREATE TABLE \"ChatResponses\" (id INTEGER NOT NULL, user_id INTEGER, history_id INTEGER NOT NULL, "
+    "response VARCHAR NOT NULL, PRIMARY KEY (id), FOREIGN KEY(history_id) REFERENCES \"History\" (id))",
+]
+
+LEGACY_EVENT = ("INSERT INTO \"Events\" (user_id, title, description, start, \"end\", event_id, event_dictionary, link) "
+                "VALUES (:user_id, 'Standup', '', :start, :end, :event_id, '{}', '')")
+
+
+class TestMigrations(unittest.TestCase):
+
+    # python -m unittest tests/test_migrations.py
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.directory.name, 'plan.db')}"
+        db.init_app(self.app)
+        Migrate(self.app, db, directory=MIGRATIONS, render_as_batch=True)
+        self.context = self.app.app_context()
+        self.context.push()
+
+    def tearDown(self):
+        db.session.remove()
+        db.engine.dispose()
+        self.context.pop()
+        self.directory.cleanup()
+
+    def insert_legacy_events(self):
+        rows = [
+            {'user_id': 1, 'start': '2024-07-30T09:00:00-04:00', 'end': '2024-07-30T09:15:00-04:00', 'event_id': 'a'},
+            {'user_id': 1, 'start': '2024-07-31T09:00:00-04:00', 'end': '2024-07-31T09:15:00-04:00', 'event_id': 'a'},
+            {'user_id': 1, 'start': '2024-08-01', 'end': '', 'event_id': 'b'},
+        ]
+        with db.engine.begin() as connection:
+            for row in rows:
+                connection.execute(text(LEGACY_EVENT), row)
+
+    def test_upgrade_converts_times_and_dedupes(self):
+        upgrade(directory=MIGRATIONS, revision='0001')
+        self.insert_legacy_events()
+        upgrade(directory=MIGRATIONS)
+
+        events = Events.query.order_by(Events.event_id).all()
+        self.assertEqual([event.event_id for event in events], ['a', 'b'])
+        # The newest duplicate is kept, converted to UTC
+        self.assertEqual(events[0].start, datetime(2024, 7, 31, 13, 0, tzinfo=timezone.utc))
+        self.assertEqual(events[1].start, datetime(2024, 8, 1, tzinfo=timezone.utc))
+        self.assertIsNone(events[1].end)
+
+        indexes = {index['name']: index for index in inspect(db.engine).get_indexes('Events')}
+        self.assertTrue(indexes['uq_events_user_event']['unique'])
+        self.assertEqual(indexes['ix_events_user_start']['column_names'], ['user_id', 'start'])
+
+    def test_downgrade_restores_strings(self):
+        upgrade(directory=MIGRATIONS, revision='0001')
+        self.insert_legacy_events()
+        upgrade(directory=MIGRATIONS)
+        downgrade(directory=MIGRATIONS, revision='0001')
+
+        with db.engine.connect() as connection:
+            starts = connection.execute(text('SELECT start FROM "Events" ORDER BY event_id')).scalars().all()
+        self.assertEqual(starts, ['2024-07-31T13:00:00+00:00', '2024-08-01T00:00:00+00:00'])
+
+    def test_stamps_databases_created_without_migrations(self):
+        upgrade(directory=MIGRATIONS, revision='0001')
+        self.insert_legacy_events()
+        with db.engine.begin() as connection:
+            connection.execute(text('DROP TABLE alembic_version'))
+
+        upgrade_schema(db, directory=MIGRATIONS)
+
+        with db.engine.connect() as connection:
+            self.assertEqual(connection.execute(text('SELECT version_num FROM alembic_version')).scalar(), '0006')
+        self.assertEqual(Events.query.count(), 2)
+
+    def test_upgrades_baseline_create_all_database(self):
+        with db.engine.begin() as connection:
+            for statement in BASELINE_SCHEMA:
+                connection.execute(text(statement))
+        self.insert_legacy_events()
+
+        upgrade_schema(db, directory=MIGRATIONS)
+
+        with db.engine.connect() as connection:
+            self.assertEqual(connection.execute(text('SELECT version_num FROM alembic_version')).scalar(), '0006')
+        columns = {column['name'] for column in inspect(db.engine).get_columns('SyncState')}
+        self.assertTrue({'calendar_sync_token', 'gmail_history_id', 'gmail_synced_at'} <= columns)
+        self.assertEqual(Events.query.count(), 2)
+
+    def test_draft_sync_skips_columns_that_exist(self):
+        # Left behind by create_all() at head followed by a stamp at 0001
+        upgrade(directory=MIGRATIONS, revision='0003')
+        with db.engine.begin() as connection:
+            connection.execute(text('ALTER TABLE "SyncState" ADD COLUMN gmail_history_id VARCHAR'))
+            connection.execute(text('ALTER TABLE "Emails" ADD COLUMN message_id VARCHAR'))
+
+        upgrade(directory=MIGRATIONS)
+
+        columns = {column['name'] for column in inspect(db.engine).get_columns('SyncState')}
+        self.assertIn('gmail_synced_at', columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
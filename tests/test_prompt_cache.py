@@ -0,0 +1,75 @@
+import unittest
+from prompt_cache import PromptCache, RedisPromptCache, cache_key, normalize_prompt
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode()
+        self.expiry[key] = ex
+
+
+class TestPromptCache(unittest.TestCase):
+
+    # python -m unittest tests/test_prompt_cache.py
+    def test_normalize_prompt(self):
+        self.assertEqual(normalize_prompt('Schedule standup tmrw at 9 AM.'), 'schedule standup tomorrow at 9am')
+        self.assertEqual(normalize_prompt('Please  schedule standup tomorrow at 9:00am, thanks!'),
+                         'schedule standup tomorrow at 9am')
+
+    def test_key_depends_on_instructions(self):
+        self.assertEqual(cache_key('create', 'Standup tmrw 9am'), cache_key('create', 'standup tomorrow 9 am'))
+        self.assertEqual(cache_key('create', 'standup on wed at 9am for 15 min'),
+                         cache_key('create', 'standup on wednesday at 9am for 15 minutes'))
+        self.assertNotEqual(cache_key('create', 'standup'), cache_key('update', 'standup'))
+        self.assertNotEqual(cache_key('create', 'standup 9am'), cache_key('create', 'standup 9pm'))
+
+    def test_plain_words_are_not_expanded(self):
+        # "sun", "sat" and "min" are only shorthand next to a number or a day word
+        self.assertNotEqual(cache_key('create', 'lunch in the sun'), cache_key('create', 'lunch in the sunday'))
+        self.assertNotEqual(cache_key('create', 'sat with ada'), cache_key('create', 'saturday with ada'))
+        self.assertEqual(normalize_prompt('min wage meeting sat 10am'), 'min wage meeting saturday 10am')
+
+    def test_ttl_and_lru(self):
+        clock = FakeClock()
+        cache = PromptCache(maxsize=2, ttl=10, timer=clock)
+        cache.set('a', {'summary': 'A'})
+        cache.set('b', {'summary': 'B'})
+        self.assertEqual(cache.get('a'), {'summary': 'A'})
+        cache.set('c', {'summary': 'C'})  # evicts b, the least recently used
+        self.assertIsNone(cache.get('b'))
+        clock.now = 11
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats, {'hits': 1, 'misses': 2})
+
+    def test_returns_copies(self):
+        cache = PromptCache()
+        cache.set('a', {'start': {'day_offset': 1}})
+        cache.get('a')['start']['day_offset'] = 5
+        self.assertEqual(cache.get('a'), {'start': {'day_offset': 1}})
+
+    def test_redis_backend(self):
+        client = FakeRedis()
+        cache = RedisPromptCache(client, ttl=60)
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', {'summary': 'A'})
+        self.assertEqual(cache.get('a'), {'summary': 'A'})
+        self.assertEqual(client.expiry['plan-it:prompt:a'], 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import json
+import unittest
+from prompts import ELLIPSIS, PromptTemplate, compact, count_tokens, trim
+
+
+class TestPrompts(unittest.TestCase):
+
+    # python -m unittest tests/test_prompts.py
+    def test_render_appends_compact_context_after_static_prefix(self):
+        template = PromptTemplate('event', """
+            Return the event as json.
+            """)
+        self.assertEqual(template.prefix, 'Return the event as json.')
+        self.assertEqual(template.render(), template.prefix)
+
+        rendered = template.render(mode='update', summary='Standup', description=None)
+        prefix, context = rendered.split('\nContext: ')
+        self.assertEqual(prefix, template.prefix)
+        self.assertEqual(json.loads(context), {'mode': 'update', 'summary': 'Standup'})
+        self.assertNotIn(' ', context.replace('Standup', ''))
+
+    def test_trim_cuts_longest_string_first(self):
+        context = {'summary': 'Standup', 'description': 'word ' * 2000, 'attendees': ['a@example.com'] * 3}
+        trimmed = trim(context, 200)
+        self.assertLessEqual(count_tokens(compact(trimmed)), 200)
+        self.assertTrue(trimmed['description'].endswith(ELLIPSIS))
+        self.assertEqual(trimmed['summary'], 'Standup')
+        self.assertEqual(len(trimmed['attendees']), 3)
+        # The caller's context is left alone
+        self.assertEqual(len(context['description']), 10000)
+
+    def test_trim_drops_last_list_items(self):
+        items = [{'id': str(i), 'title': f'Meeting {i}'} for i in range(100)]
+        trimmed = trim({'items': items}, 150)
+        self.assertLessEqual(count_tokens(compact(trimmed)), 150)
+        self.assertEqual(trimmed['items'], items[:len(trimmed['items'])])
+        self.assertGreater(len(trimmed['items']), 1)
+
+    def test_render_respects_budget(self):
+        template = PromptTemplate('bulk', 'Pick the items.', budget=100)
+        rendered = template.render(items=[{'id': str(i), 'title': 'Standup ' * 5} for i in range(50)])
+        self.assertLessEqual(count_tokens(rendered) - template.prefix_tokens, 110)
+
+
+if __name__ == '__main__':
+    unittest.main()
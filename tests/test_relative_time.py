@@ -0,0 +1,48 @@
+import unittest
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from relative_time import resolve_times, to_spec
+
+
+ZONE = 'America/New_York'
+# Tuesday
+NOW = datetime(2024, 7, 30, 14, 25, tzinfo=ZoneInfo(ZONE))
+
+
+class TestRelativeTime(unittest.TestCase):
+
+    # python -m unittest tests/test_relative_time.py
+    def test_day_offset_and_duration(self):
+        data = resolve_times({'summary': 'Standup', 'start': {'day_offset': 1, 'time': '09:00'},
+                              'end': {'duration_minutes': 15}}, ZONE, NOW)
+        self.assertEqual(data['start'], {'dateTime': '2024-07-31T09:00:00-04:00', 'timeZone': ZONE})
+        self.assertEqual(data['end']['dateTime'], '2024-07-31T09:15:00-04:00')
+        self.assertEqual(data['summary'], 'Standup')
+
+    def test_weekday_is_next_occurrence(self):
+        data = resolve_times({'start': {'weekday': 'Tuesday', 'time': '10:00'}, 'end': {}}, ZONE, NOW)
+        self.assertEqual(data['start']['dateTime'], '2024-08-06T10:00:00-04:00')
+        self.assertEqual(data['end']['dateTime'], '2024-08-06T10:30:00-04:00')
+
+    def test_end_time_on_start_day(self):
+        data = resolve_times({'start': {'date': '2024-12-02', 'time': '13:00'}, 'end': {'time': '15:30'}}, ZONE, NOW)
+        self.assertEqual(data['start']['dateTime'], '2024-12-02T13:00:00-05:00')
+        self.assertEqual(data['end']['dateTime'], '2024-12-02T15:30:00-05:00')
+
+    def test_defaults_to_now(self):
+        data = resolve_times({'start': {'time': None}, 'end': {'duration_minutes': None}}, ZONE, NOW)
+        self.assertEqual(data['start']['dateTime'], '2024-07-30T14:25:00-04:00')
+        self.assertEqual(data['end']['dateTime'], '2024-07-30T14:55:00-04:00')
+
+    def test_absolute_payloads_untouched(self):
+        data = {'start': {'dateTime': '2024-07-30T09:00:00-04:00'}, 'end': {'dateTime': '2024-07-30T10:00:00-04:00'}}
+        self.assertIs(resolve_times(data, ZONE, NOW), data)
+        self.assertIsNone(resolve_times(None, ZONE, NOW))
+
+    def test_to_spec(self):
+        self.assertEqual(to_spec('2024-07-30T09:00:00-04:00'), {'date': '2024-07-30', 'time': '09:00'})
+        self.assertEqual(to_spec(''), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+import socketio
+from reply_channel import ReplyChannel
+
+
+class TestReplyChannel(unittest.TestCase):
+
+    # python -m unittest tests/test_reply_channel.py
+    def setUp(self):
+        self.server = socketio.Server(async_mode='threading')
+        self.sids = [self.server.manager.connect(f'eio-{n}', '/') for n in range(3)]
+        self.sent = []
+        self.server._send_eio_packet = lambda eio_sid, packet: self.sent.append((eio_sid, packet.data))
+
+    def test_only_the_sender_receives(self):
+        channel = ReplyChannel(self.server.emit, self.sids[1])
+
+        self.assertTrue(channel.send('receiver', {'message': 'Event Created!'}))
+        self.assertEqual(self.sent, [('eio-1', '2["receiver",{"message":"Event Created!"}]')])
+        self.assertEqual(channel.sent, 1)
+
+    def test_drops_without_a_room(self):
+        channel = ReplyChannel(self.server.emit, None)
+
+        self.assertFalse(channel.send('receiver', {'message': 'Event Created!'}))
+        self.assertEqual(self.sent, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
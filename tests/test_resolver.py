@@ -0,0 +1,66 @@
+import json
+import unittest
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+from resolver import mentioned_date, resolve_candidate, score_candidates
+
+
+NOW = datetime(2024, 7, 29, 21, 30, tzinfo=ZoneInfo('America/Los_Angeles'))  # a Monday evening
+
+
+def event(event_id, title, start):
+    return SimpleNamespace(event_id=event_id, title=title, start=start)
+
+
+def meet(meet_id, summary, start, attendees):
+    return SimpleNamespace(meet_id=meet_id, summary=summary, start=start,
+                           attendees=json.dumps([{"email": email} for email in attendees]))
+
+
+class TestResolver(unittest.TestCase):
+
+    # python -m unittest tests/test_resolver.py
+    def test_mentioned_date(self):
+        self.assertEqual(mentioned_date("move it to tomorrow", NOW), date(2024, 7, 30))
+        self.assertEqual(mentioned_date("cancel friday's lunch", NOW), date(2024, 8, 2))
+        self.assertEqual(mentioned_date("my event on Aug 5th", NOW), date(2024, 8, 5))
+        self.assertEqual(mentioned_date("the Jul 26 retro", NOW), date(2024, 7, 26))
+        self.assertEqual(mentioned_date("monday's standup", NOW), date(2024, 7, 29))
+        self.assertIsNone(mentioned_date("cancel my lunch", NOW))
+
+    def test_dates_compare_in_users_zone(self):
+        # 04:00 UTC on the 30th is still the 29th in Los Angeles, the 29th's is the 28th
+        events = [event('a', 'Team standup', datetime(2024, 7, 30, 4, 0, tzinfo=timezone.utc)),
+                  event('b', 'Team standup', datetime(2024, 7, 29, 4, 0, tzinfo=timezone.utc))]
+        self.assertEqual(score_candidates("cancel today's standup", events, 'title', now=NOW)[0][1].event_id, 'a')
+
+    def test_clear_title_winner(self):
+        events = [event('a', 'Dentist appointment', '2024-07-30T09:00:00-04:00'),
+                  event('b', 'Team lunch', '2024-07-30T12:00:00-04:00')]
+        self.assertEqual(resolve_candidate("cancel my dentist appointment", events, 'title', 'event_id',
+                                           now=NOW), ('a', []))
+
+    def test_date_breaks_tie(self):
+        events = [event('a', 'Team standup', '2024-07-30T09:00:00-04:00'),
+                  event('b', 'Team standup', '2024-08-02T09:00:00-04:00')]
+        self.assertEqual(resolve_candidate("cancel friday's standup", events, 'title', 'event_id',
+                                           now=NOW)[0], 'b')
+
+    def test_attendees_break_tie(self):
+        meets = [meet('a', 'Sync', '2024-07-30T09:00:00', ['sam@example.com']),
+                 meet('b', 'Sync', '2024-07-30T09:00:00', ['brooke@example.com'])]
+        self.assertEqual(resolve_candidate("move my sync with brooke@example.com", meets, 'summary', 'meet_id',
+                                           now=NOW)[0], 'b')
+
+    def test_ambiguous_returns_compact_shortlist(self):
+        events = [event(str(i), 'Team standup', '2024-07-30T09:00:00') for i in range(10)]
+        event_id, shortlist = resolve_candidate("cancel my standup", events, 'title', 'event_id', top_k=3,
+                                                now=NOW)
+        self.assertIsNone(event_id)
+        self.assertEqual(len(shortlist), 3)
+        self.assertEqual(set(shortlist[0]), {'event_id', 'title', 'start'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import json
+import unittest
+from schemas import EmailPayload, EventPayload, MeetingPayload, merge_repair, repair_messages, strict_schema, \
+    validate_payload
+
+
+def walk(node):
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from walk(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from walk(item)
+
+
+EVENT = {'summary': 'Standup', 'description': 'Daily standup',
+         'start': {'date': None, 'weekday': 'Monday', 'day_offset': None, 'time': '09:00'},
+         'end': {'date': None, 'weekday': None, 'day_offset': None, 'time': None, 'duration_minutes': 15},
+         'reminders': {'useDefault': True}, 'error': None}
+
+
+class TestSchemas(unittest.TestCase):
+
+    # python -m unittest tests/test_schemas.py
+    def test_strict_schema(self):
+        schema = strict_schema(MeetingPayload)
+        self.assertTrue(schema['strict'])
+        objects = [node for node in walk(schema['schema']) if 'properties' in node]
+        self.assertGreater(len(objects), 3)
+        for node in objects:
+            self.assertEqual(node['required'], list(node['properties']))
+            self.assertFalse(node['additionalProperties'])
+        # Patterns and lengths are checked locally instead
+        self.assertNotIn('pattern', json.dumps(schema))
+        self.assertNotIn('minLength', json.dumps(schema))
+        self.assertIn('from', strict_schema(EmailPayload)['schema']['properties'])
+
+    def test_validate_drops_nulls(self):
+        payload, errors = validate_payload(EventPayload, EVENT)
+        self.assertEqual(errors, {})
+        self.assertEqual(payload['start'], {'weekday': 'monday', 'time': '09:00'})
+        self.assertEqual(payload['end'], {'duration_minutes': 15})
+        self.assertNotIn('error', payload)
+
+    def test_validate_reports_top_level_fields(self):
+        data = dict(EVENT, summary='', start={'date': '2024-02-30'})
+        payload, errors = validate_payload(EventPayload, data)
+        self.assertIsNone(payload)
+        self.assertEqual(set(errors), {'summary', 'start'})
+        self.assertEqual(validate_payload(EventPayload, {'error': 'invalid'}), ({'error': 'invalid'}, {}))
+        self.assertEqual(set(validate_payload(EventPayload, None)[1]), {'__root__'})
+
+    def test_email_recipients(self):
+        email = {'from': 'ada@example.com', 'to': ['grace@example.com', 'alan@example.com'], 'cc': [],
+                 'subject': 'Standup', 'body': 'See you at 9.'}
+        self.assertEqual(validate_payload(EmailPayload, email)[0]['to'], 'grace@example.com, alan@example.com')
+        self.assertEqual(set(validate_payload(EmailPayload, dict(email, to='grace'))[1]), {'to'})
+
+    def test_repair_resends_only_invalid_fields(self):
+        messages = [{'role': 'system', 'content': 'Return the event as json.'}, {'role': 'user', 'content': 'x'}]
+        data = dict(EVENT, summary='')
+        errors = validate_payload(EventPayload, data)[1]
+        repair = repair_messages(messages, json.dumps(data), errors)
+        self.assertEqual(repair[:2], messages)
+        self.assertEqual(repair[2]['role'], 'assistant')
+        self.assertIn('"summary"', repair[3]['content'])
+        self.assertNotIn('"start"', repair[3]['content'])
+
+        payload, errors = validate_payload(EventPayload, merge_repair(data, {'summary': 'Standup', 'extra': 1}, errors))
+        self.assertEqual(errors, {})
+        self.assertEqual(payload['summary'], 'Standup')
+        # An answer that wasn't an object is replaced as a whole
+        self.assertEqual(merge_repair(None, EVENT, {'__root__': 'invalid'}), EVENT)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from flask import Flask
+from db import db, Events, Emails
+from search import install_search_index, search_candidates, tokenize_prompt
+
+
+def make_event(user_id, title, description=''):
+    return Events(user_id=user_id, title=title, description=description or title, start='2024-07-30T09:00:00',
+                  end='2024-07-30T09:30:00', event_id=title.lower().replace(' ', '-'), event_dictionary='{}',
+                  link='')
+
+
+class TestSearch(unittest.TestCase):
+
+    # python -m unittest tests/test_search.py
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        install_search_index(db.engine)
+        db.session.add_all([
+            make_event(1, 'Dentist appointment', 'Cleaning at Dr. Smith'),
+            make_event(1, 'Team standup', 'Daily standup with the platform team'),
+            make_event(1, 'Standups retro'),
+            make_event(2, 'Dentist appointment'),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_tokenize_prompt(self):
+        self.assertEqual(tokenize_prompt("Please cancel my dentist appointment on Friday"), ['dentist', 'friday'])
+
+    def test_ranked_and_scoped_to_user(self):
+        results = search_candidates(Events, 1, "move my standup to 10am")
+        self.assertCountEqual([e.title for e in results], ['Team standup', 'Standups retro'])
+        self.assertEqual([e.user_id for e in search_candidates(Events, 2, "dentist")], [2])
+
+    def test_index_follows_updates_and_deletes(self):
+        event = Events.query.filter_by(title='Dentist appointment', user_id=1).first()
+        event.title = 'Orthodontist'
+        event.description = 'Braces check'
+        db.session.commit()
+        self.assertEqual(search_candidates(Events, 1, "dentist"), [])
+        self.assertEqual(len(search_candidates(Events, 1, "orthodontist")), 1)
+
+        db.session.delete(event)
+        db.session.commit()
+        self.assertEqual(search_candidates(Events, 1, "orthodontist"), [])
+
+    def test_no_keywords(self):
+        self.assertEqual(search_candidates(Emails, 1, "send my email"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
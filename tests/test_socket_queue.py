@@ -0,0 +1,48 @@
+import time
+import unittest
+import socketio
+from socket_queue import MemoryBroker, MemoryManager, make_client_manager
+
+
+class TestSocketQueue(unittest.TestCase):
+
+    # python -m unittest tests/test_socket_queue.py
+    def setUp(self):
+        broker = MemoryBroker()
+        self.server_a = socketio.Server(async_mode='threading', client_manager=MemoryManager(broker))
+        self.server_b = socketio.Server(async_mode='threading', client_manager=MemoryManager(broker))
+        # Starts each server's listener on the broker
+        self.server_a.manager.initialize()
+        self.server_b.manager.initialize()
+        self.sent = []
+        self.server_a._send_eio_packet = lambda eio_sid, eio_packet: self.sent.append((eio_sid, eio_packet.data))
+
+    def wait_for(self, count, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while len(self.sent) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.sent
+
+    def test_emits_reach_clients_on_other_servers(self):
+        # A client connected to worker A, in its user room
+        sid = self.server_a.manager.connect('eio-1', '/')
+        self.server_a.manager.enter_room(sid, '/', 'user:1')
+
+        # Worker B addresses the socket's room and the user's room without knowing the client
+        self.server_b.emit('receiver', {'message': 'to the socket'}, to=sid)
+        self.server_b.emit('dashboard-diff', [], to='user:1')
+        self.server_b.emit('dashboard-diff', [], to='user:2')
+
+        self.assertEqual(self.wait_for(2), [('eio-1', '2["receiver",{"message":"to the socket"}]'),
+                                            ('eio-1', '2["dashboard-diff",[]]')])
+        time.sleep(0.05)
+        self.assertEqual(len(self.sent), 2)
+
+    def test_make_client_manager(self):
+        self.assertIsNone(make_client_manager(None))
+        self.assertIsInstance(make_client_manager('memory://'), MemoryManager)
+        self.assertEqual(make_client_manager('redis://localhost:6379/0').name, 'redis')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import json
+import threading
+import unittest
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from google.oauth2.credentials import Credentials
+from token_refresher import TokenRefresher, expires_within, refresh_token_json, token_expiry
+
+
+NOW = datetime(2024, 7, 30, 12, 0, 0)
+
+
+class FakeTokenEndpoint(BaseHTTPRequestHandler):
+    """
+    Stands in for https://oauth2.googleapis.com/token
+    """
+    calls = 0
+
+    def do_POST(self):
+        FakeTokenEndpoint.calls += 1
+        self.rfile.read(int(self.headers['Content-Length']))
+        body = json.dumps({"access_token": f"fresh-{FakeTokenEndpoint.calls}", "expires_in": 3600}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SyncQueue:
+    def submit(self, key, fn, *args):
+        fn(*args)
+
+
+def token(expiry):
+    return json.dumps({"token": "stale", "refresh_token": "refresh", "client_id": "id", "client_secret": "secret",
+                       "expiry": expiry.isoformat() + "Z"})
+
+
+class TestTokenRefresher(unittest.TestCase):
+
+    # python -m unittest tests/test_token_refresher.py
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), FakeTokenEndpoint)
+        cls.token_uri = f"http://127.0.0.1:{cls.server.server_port}/token"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def test_token_expiry(self):
+        self.assertEqual(token_expiry(token(NOW)), NOW)
+        self.assertIsNone(token_expiry('{"token": "x"}'))
+        self.assertIsNone(token_expiry('not json'))
+
+    def test_expires_within(self):
+        self.assertTrue(expires_within(Credentials('x', expiry=NOW + timedelta(minutes=4)), 300, now=NOW))
+        self.assertFalse(expires_within(Credentials('x', expiry=NOW + timedelta(hours=1)), 300, now=NOW))
+        self.assertFalse(expires_within(Credentials('x'), 300, now=NOW))
+
+    def test_due_soonest_first(self):
+        refresher = TokenRefresher(None, None, None, window=300, batch_size=2, clock=lambda: NOW)
+        tokens = [(1, token(NOW + timedelta(minutes=4))), (2, token(NOW + timedelta(hours=1))),
+                  (3, token(NOW - timedelta(minutes=1))), (4, token(NOW + timedelta(minutes=1)))]
+        self.assertEqual(refresher.due(tokens), [3, 4])
+
+    def test_refresh_against_fake_endpoint(self):
+        creds = refresh_token_json(token(NOW), self.token_uri)
+        self.assertTrue(creds.token.startswith('fresh-'))
+        self.assertTrue(creds.valid)
+
+    def test_tick_refreshes_and_saves(self):
+        stored = {1: token(NOW), 2: token(NOW + timedelta(days=1))}
+
+        def refresh_user(user_id):
+            stored[user_id] = refresh_token_json(stored[user_id], self.token_uri).to_json()
+
+        refresher = TokenRefresher(lambda: list(stored.items()), refresh_user, SyncQueue(), clock=lambda: NOW)
+        self.assertEqual(refresher.tick(), [1])
+        self.assertTrue(json.loads(stored[1])['token'].startswith('fresh-'))
+        self.assertEqual(json.loads(stored[2])['token'], 'stale')
+        self.assertEqual(refresher.stats, {"refreshed": 1, "failed": 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
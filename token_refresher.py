@@ -0,0 +1,102 @@
+import json
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+
+def utcnow():
+    # google-auth keeps expiry as naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def token_expiry(token_json: str):
+    """
+    Reads the expiry out of a stored Users.token, None if it has none.
+    """
+    try:
+        expiry = json.loads(token_json).get("expiry")
+        return datetime.fromisoformat(expiry.rstrip("Z")) if expiry else None
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def expires_within(creds, seconds, now=None) -> bool:
+    """
+    True when the credentials have expired or will within seconds.
+    """
+    return creds.expiry is not None and creds.expiry <= (now or utcnow()) + timedelta(seconds=seconds)
+
+
+def refresh_token_json(token_json: str, token_uri: str = None, request=None) -> Credentials:
+    """
+    Refreshes a stored token and returns the new credentials. token_uri
+    overrides Google's token endpoint, e.g. with a local fake in tests.
+    """
+    creds = Credentials.from_authorized_user_info(json.loads(token_json))
+    if token_uri:
+        creds = creds.with_token_uri(token_uri)
+    creds.refresh(request or Request())
+    return creds
+
+
+class TokenRefresher:
+    """
+    Periodically refreshes stored tokens shortly before they expire, so
+    prompts almost never have to refresh inline. Due tokens are handed to
+    a JobQueue in batches, which bounds how many refresh at once.
+    """
+
+    def __init__(self, load_tokens, refresh_user, queue, window=300, interval=60, batch_size=50,
+                 sleep=time.sleep, clock=utcnow):
+        self.load_tokens = load_tokens  # -> [(user_id, token_json)]
+        self.refresh_user = refresh_user
+        self.queue = queue
+        self.window = timedelta(seconds=window)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.sleep = sleep
+        self.clock = clock
+        self.in_flight = set()
+        self.running = False
+        self.stats = {"refreshed": 0, "failed": 0}
+
+    def due(self, tokens) -> list:
+        deadline = self.clock() + self.window
+        due = []
+        for user_id, token_json in tokens:
+            expiry = token_expiry(token_json)
+            if expiry and expiry <= deadline and user_id not in self.in_flight:
+                due.append((expiry, user_id))
+        # Soonest to expire first
+        return [user_id for _, user_id in sorted(due)][:self.batch_size]
+
+    def tick(self) -> list:
+        batch = self.due(self.load_tokens())
+        for user_id in batch:
+            self.in_flight.add(user_id)
+            self.queue.submit(user_id, self._refresh, user_id)
+        return batch
+
+    def _refresh(self, user_id):
+        try:
+            self.refresh_user(user_id)
+            self.stats["refreshed"] += 1
+        except Exception as e:
+            self.stats["failed"] += 1
+            print(f"Failed to refresh token for user {user_id}: {e}", file=sys.stderr)
+        finally:
+            self.in_flight.discard(user_id)
+
+    def run(self):
+        self.running = True
+        while self.running:
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Token refresh tick failed: {e}", file=sys.stderr)
+            self.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
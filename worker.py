@@ -0,0 +1,14 @@
+# Runs the token refresher and the Google sync loops in one process of their own, so
+# they run once however many web workers there are (started with BACKGROUND_TASKS=false).
+# Patched before anything imports socket or ssl, as gunicorn's gevent workers do.
+from gevent import monkey
+
+monkey.patch_all()
+
+from app import app, socketio, start_background_tasks  # noqa: E402
+
+if __name__ == "__main__":
+    if not app.config['BACKGROUND_TASKS']:
+        start_background_tasks()
+    while True:
+        socketio.sleep(3600)